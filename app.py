@@ -2,21 +2,34 @@
 
 import os
 import json
-import requests
-import pickle
+import time
+import hashlib
+import hmac
+import functools
+import threading
 import numpy as np
 import pandas as pd
 import pandas_ta as ta
-from flask import Flask, jsonify, request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import Flask, Response, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import LargeBinary, func, DateTime, String, Integer, Float
+from sqlalchemy import LargeBinary, func, DateTime, String, Integer, Float, Text, Boolean, Index
 import firebase_admin
 from firebase_admin import credentials, messaging
 from dotenv import load_dotenv
 
-from data_manager import download_historical_data
-from feature_engineer import add_features_to_data
-from train_model import FEATURES_LIST
+from data_manager import TTLCache, download_historical_data_cached, download_live_bars, ohlcv_cache
+from feature_engineer import add_features_to_data, IncrementalFeatureState
+from train_model import FEATURES_LIST, has_level_models, predict_price_levels
+from model_registry import ArtifactRegistry
+from asset_registry import load_assets
+from database import upgrade_schema
+from series_payload import SeriesQueryError, parse_series_query, format_dates, encode_series, query_cache_key
+from metrics import metrics, timed, instrument_engine, start_request_timings, finish_request_timings, format_server_timing, submit_with_context
+from intervals import SIGNAL_INTERVAL, get_interval_profile, interval_prefix
+from quote_client import create_quote_client_from_env
+from settings_cache import SettingsCache, SettingsValidationError
+from shared_cache import create_shared_cache_from_env, share_artifact
 
 load_dotenv()
 app = Flask(__name__)
@@ -63,149 +76,397 @@ class Settings(db.Model):
     btc_sl_multiplier = db.Column(Float, default=1.5)
     gold_entry_threshold = db.Column(Float, default=5.0)
     gold_sl_multiplier = db.Column(Float, default=1.5)
+    # Zeilenversion: wird bei jedem UPDATE erhöht, Worker prüfen nur diese Spalte
+    version = db.Column(Integer, nullable=True, default=1)
+    __mapper_args__ = {'version_id_col': version}
 
 class TrainedModel(db.Model):
     id = db.Column(Integer, primary_key=True); name = db.Column(String(80), unique=True, nullable=False); data = db.Column(LargeBinary, nullable=False); timestamp = db.Column(DateTime, server_default=func.now(), onupdate=func.now())
 class Device(db.Model):
     id = db.Column(Integer, primary_key=True); fcm_token = db.Column(String(255), unique=True, nullable=False); timestamp = db.Column(DateTime, server_default=func.now(), onupdate=func.now())
 class BacktestResult(db.Model):
-    id = db.Column(Integer, primary_key=True); asset_name = db.Column(String(50), nullable=False); date = db.Column(DateTime, nullable=False); balance = db.Column(Float, nullable=False)
+    __table_args__ = (Index('ix_backtest_result_asset_run_date', 'asset_name', 'run_id', 'date'),)
+    id = db.Column(Integer, primary_key=True); asset_name = db.Column(String(50), nullable=False); date = db.Column(DateTime, nullable=False); balance = db.Column(Float, nullable=False); run_id = db.Column(Integer, nullable=True)
+class BacktestRun(db.Model):
+    id = db.Column(Integer, primary_key=True); asset_name = db.Column(String(50), nullable=False, index=True); entry_threshold = db.Column(Float); sl_multiplier = db.Column(Float); final_balance = db.Column(Float); is_active = db.Column(Boolean, nullable=False, default=False); timestamp = db.Column(DateTime, server_default=func.now())
+class SignalSnapshot(db.Model):
+    id = db.Column(Integer, primary_key=True); version = db.Column(Integer, unique=True, nullable=False); payload = db.Column(Text, nullable=False); timestamp = db.Column(DateTime, server_default=func.now())
 
 # --- Globale Variablen & Helfer-Funktionen ---
-models = {}
-current_settings = {}
+def _on_models_changed(names):
+    # Neue Modelle -> Signal-Snapshot sofort neu berechnen
+    snapshot_refresh_requested.set()
+
+# Gemeinsamer Cache aller Worker (mmap unter /dev/shm): kompilierte Wälder und Live-Features liegen nur einmal im RAM
+shared_cache = create_shared_cache_from_env(os.environ)
+
+# Artefakte werden im Hintergrund nachgeladen, sobald sich TrainedModel.timestamp ändert (kein Redeploy nötig)
+models = ArtifactRegistry(app, db, TrainedModel, poll_seconds=float(os.environ.get('MODEL_POLL_SECONDS', 60)), on_change=_on_models_changed,
+                          share=functools.partial(share_artifact, shared_cache) if shared_cache else None)
+# Settings werden von allen Workern, dem Backtester und der Pipeline geschrieben: Versionsprüfung statt Import-Snapshot
+settings_cache = SettingsCache(app, db, Settings, check_seconds=float(os.environ.get('SETTINGS_CHECK_SECONDS', 0)))
+
 def load_artifacts_from_db():
-    global models
+    try:
+        models.refresh()
+        if len(models):
+            print(f"Erfolgreich {len(models)} Artefakte aus der DB geladen.")
+        else:
+            print("WARNUNG: Keine Modelle in der DB gefunden. Bitte Cron Job ausführen.")
+    except Exception as e:
+        print(f"FEHLER beim Laden der Artefakte aus der DB: {e}")
+
+# Tagesbars ändern sich höchstens einmal pro Tag: Features werden pro (Ticker, Periode, Intervall) gecacht
+feature_cache = TTLCache(ttl_seconds=int(os.environ.get('FEATURE_CACHE_TTL_SECONDS', 900)),
+                         max_entries=int(os.environ.get('FEATURE_CACHE_MAX_ENTRIES', 64)))
+
+# Inkrementeller Feature-Zustand pro (Ticker, Intervall): neue Bars werden fortgeschrieben statt die Historie neu zu rechnen
+live_feature_states = {}
+
+def _compute_live_features(ticker, interval):
+    # Live-Bars kommen aus einem Ringpuffer fester Größe, damit Intraday-Intervalle den Speicher nicht aufblähen
+    profile = get_interval_profile(interval)
+    raw_data = download_live_bars(ticker, interval, profile['live_buffer_bars'], profile['live_period'], profile['live_refresh_period'])
+    if raw_data is None or raw_data.empty: return None
+    key = (ticker, interval)
+    state = live_feature_states.get(key)
+    if state is None or state.last_timestamp not in raw_data.index:
+        state = live_feature_states[key] = IncrementalFeatureState.from_data(raw_data.iloc[:-1])
+        new_bars = raw_data.iloc[-1:]
+    else:
+        # Ab dem letzten bekannten Bar weiterrechnen (der letzte Bar kann sich intraday noch geändert haben)
+        new_bars = raw_data.loc[state.last_timestamp:]
+    features = None
+    with timed('features_incremental'):
+        for timestamp, row in zip(new_bars.index, new_bars.to_dict(orient='records')):
+            features = state.update(row, timestamp)
+    if features is None: return None
+    return pd.DataFrame([features], index=raw_data.index[-1:])[FEATURES_LIST].astype(profile['feature_dtype'])
+
+def _shared_live_features(ticker, interval):
+    # Ein Worker rechnet den Feature-Vektor, alle anderen lesen ihn aus dem Shared-Cache
+    def build():
+        features = _compute_live_features(ticker, interval)
+        if features is None: return None
+        index = features.index
+        return ({'values': features.to_numpy(), 'timestamps': (index.tz_convert('UTC') if index.tz is not None else index).asi8},
+                {'columns': list(features.columns), 'tz': str(index.tz) if index.tz is not None else None, 'index_name': index.name})
+    entry = shared_cache.get_or_build(f"features-{ticker}-{interval}", build, max_age_seconds=feature_cache.ttl_seconds)
+    if entry is None: return None
+    meta = entry['meta']
+    index = pd.DatetimeIndex(np.asarray(entry['arrays']['timestamps']).astype('datetime64[ns]'), name=meta['index_name'])
+    if meta['tz']: index = index.tz_localize('UTC').tz_convert(meta['tz'])
+    return pd.DataFrame(entry['arrays']['values'], index=index, columns=meta['columns'])
+
+def get_live_features_for_regression(ticker, interval=SIGNAL_INTERVAL):
+    load = _shared_live_features if shared_cache else _compute_live_features
+    latest_features_df = feature_cache.get_or_load((ticker, interval), lambda: load(ticker, interval))
+    return latest_features_df.copy() if latest_features_df is not None else None
+
+# --- Signal-Berechnung pro Asset (parallel mit Deadlines) ---
+SIGNAL_DEADLINE_SECONDS = float(os.environ.get('SIGNAL_DEADLINE_SECONDS', 10))
+signal_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('SIGNAL_WORKERS', 8)), thread_name_prefix="signals")
+# Gepoolte Verbindungen, Zusammenfassen gleichzeitiger Abfragen, Ratenlimit und Circuit Breaker (siehe quote_client)
+quote_client = create_quote_client_from_env(os.environ)
+
+def fetch_binance_price(symbol):
+    return quote_client.get_price('binance', symbol)
+
+def fetch_fmp_price(symbol):
+    return quote_client.get_price('fmp', symbol)
+
+@timed('upstream_price', source='ohlcv_cache')
+def fetch_last_close(ticker):
+    # Für Assets ohne Live-Quelle: letzter Schlusskurs aus dem OHLCV-Cache
+    data = download_historical_data_cached(ticker, period="3mo", interval="1d")
+    if data is None: raise ValueError(f"Kein Kurs für {ticker}.")
+    return float(data['Close'].iloc[-1])
+
+QUOTE_FETCHERS = {"binance": fetch_binance_price, "fmp": fetch_fmp_price}
+
+def _price_fetcher(asset):
+    quote = asset.get("quote") or {}
+    if quote.get("source") in QUOTE_FETCHERS: return functools.partial(QUOTE_FETCHERS[quote["source"]], quote["symbol"])
+    return functools.partial(fetch_last_close, asset["ticker"])
+
+SIGNAL_ASSETS = [{"key": asset["response_key"], "label": asset["label"], "prefix": asset["prefix"], "ticker": asset["ticker"], "fetch_price": _price_fetcher(asset)}
+                 for asset in load_assets()]
+
+def _result_before_deadline(future, deadline):
+    return future.result(timeout=max(0.0, deadline - time.monotonic()))
+
+def compute_asset_levels(asset):
+    prefix, label = interval_prefix(asset["prefix"], SIGNAL_INTERVAL), asset["label"]
+    # Ein fester Artefakt-Snapshot pro Berechnung, damit Low/High nie aus verschiedenen Versionen stammen
+    artifacts = models.snapshot()
+    if not has_level_models(artifacts, prefix):
+        return None, f"{label} Modelle nicht geladen. "
+    try:
+        latest_features_df = get_live_features_for_regression(asset["ticker"])
+        if latest_features_df is None:
+            return None, f"{label} Feature-Erstellung fehlgeschlagen. "
+        predicted_low, predicted_high = (values[0] for values in predict_price_levels(artifacts, prefix, latest_features_df))
+        atr_value = latest_features_df['ATRr_14'].iloc[0]
+        stop_loss = predicted_low - (atr_value * 1.5)
+        return {"entry": round(float(predicted_low), 2), "take_profit": round(float(predicted_high), 2), "stop_loss": round(float(stop_loss), 2)}, ""
+    except Exception as e:
+        return None, f"{label} Fehler: {e}. "
+
+# --- Signal-Snapshot ---
+# Einstieg/TP/SL ändern sich nur mit neuen Tagesbars oder Modellen: ein Hintergrund-Thread berechnet sie
+# periodisch als versionierten Snapshot (im Speicher + DB), /get_signals ergänzt nur noch den Live-Preis.
+SIGNAL_REFRESH_SECONDS = os.environ.get('SIGNAL_REFRESH_SECONDS')
+signal_snapshot = None
+snapshot_lock = threading.Lock()
+snapshot_refresh_requested = threading.Event()
+signal_refresher = None
+
+def signal_refresh_interval():
+    if SIGNAL_REFRESH_SECONDS: return float(SIGNAL_REFRESH_SECONDS)
+    return float(settings_cache.get().get('update_interval_minutes') or 15) * 60
+
+def compute_signal_snapshot():
+    # Gemeinsame Deadline wie in /get_signals: ein hängendes Asset verzögert den Snapshot nicht unbegrenzt.
+    # Bei Zeitüberschreitung bleiben die Werte des vorherigen Snapshots stehen (falls vorhanden).
+    deadline = time.monotonic() + SIGNAL_DEADLINE_SECONDS
+    futures = [submit_with_context(signal_executor, compute_asset_levels, asset) for asset in SIGNAL_ASSETS]
+    previous = (signal_snapshot or {}).get("signals", {})
+    results = []
+    for asset, future in zip(SIGNAL_ASSETS, futures):
+        try:
+            results.append(_result_before_deadline(future, deadline))
+        except FuturesTimeoutError:
+            results.append((previous.get(asset["key"]), f"{asset['label']} Zeitüberschreitung nach {SIGNAL_DEADLINE_SECONDS:g}s. "))
+    return {"signals": {asset["key"]: levels for asset, (levels, _) in zip(SIGNAL_ASSETS, results)},
+            "errors": {asset["key"]: error for asset, (_, error) in zip(SIGNAL_ASSETS, results) if error},
+            "generated_at": time.time()}
+
+def load_latest_snapshot_from_db():
+    with app.app_context():
+        row = SignalSnapshot.query.order_by(SignalSnapshot.version.desc()).first()
+        if not row: return None
+        return dict(json.loads(row.payload), version=row.version)
+
+def persist_signal_snapshot(snapshot):
     with app.app_context():
+        latest_version = db.session.query(func.max(SignalSnapshot.version)).scalar() or 0
+        version = max(latest_version, signal_snapshot["version"] if signal_snapshot else 0) + 1
+        db.session.add(SignalSnapshot(version=version, payload=json.dumps(snapshot)))
+        # Nur die letzten Snapshots aufbewahren
+        SignalSnapshot.query.filter(SignalSnapshot.version <= version - 50).delete()
+        db.session.commit()
+        return version
+
+def refresh_signal_snapshot(only_if_missing=False):
+    global signal_snapshot
+    with snapshot_lock:
+        if only_if_missing and signal_snapshot is not None: return signal_snapshot
+        snapshot = compute_signal_snapshot()
+        try:
+            version = persist_signal_snapshot(snapshot)
+        except Exception as e:
+            print(f"FEHLER beim Speichern des Signal-Snapshots: {e}")
+            version = (signal_snapshot["version"] if signal_snapshot else 0) + 1
+        signal_snapshot = dict(snapshot, version=version)
+        return signal_snapshot
+
+def get_signal_snapshot():
+    if signal_snapshot is None: return refresh_signal_snapshot(only_if_missing=True)
+    # Ohne Hintergrund-Thread wird ein veralteter Snapshot im Request erneuert
+    if signal_refresher is None and time.time() - signal_snapshot.get("generated_at", 0) >= signal_refresh_interval():
+        return refresh_signal_snapshot()
+    return signal_snapshot
+
+def _signal_refresher_loop():
+    global signal_snapshot
+    while True:
         try:
-            db_models = TrainedModel.query.all()
-            for m in db_models:
-                models[m.name] = pickle.loads(m.data)
-            if models:
-                print(f"Erfolgreich {len(models)} Artefakte aus der DB geladen.")
+            # Hat ein anderer Worker bereits einen frischen Snapshot geschrieben, wird dieser übernommen
+            latest = None if snapshot_refresh_requested.is_set() else load_latest_snapshot_from_db()
+            if latest and time.time() - latest.get("generated_at", 0) < signal_refresh_interval():
+                if signal_snapshot is None or latest["version"] > signal_snapshot["version"]: signal_snapshot = latest
             else:
-                print("WARNUNG: Keine Modelle in der DB gefunden. Bitte Cron Job ausführen.")
+                snapshot_refresh_requested.clear()
+                refresh_signal_snapshot()
         except Exception as e:
-            print(f"FEHLER beim Laden der Artefakte aus der DB: {e}")
+            print(f"FEHLER im Signal-Refresher: {e}")
+        age = time.time() - (signal_snapshot or {}).get("generated_at", 0)
+        snapshot_refresh_requested.wait(max(1.0, signal_refresh_interval() - age))
 
-def load_settings_from_db():
-    with app.app_context():
-        settings = Settings.query.first()
-        if not settings:
-            settings = Settings()
-            db.session.add(settings)
-            db.session.commit()
-        return {c.name: getattr(settings, c.name) for c in settings.__table__.columns if c.name != 'id'}
-
-def save_settings(new_settings):
-    with app.app_context():
-        s = Settings.query.first()
-        if s:
-            for k, v in new_settings.items():
-                if hasattr(s, k):
-                    setattr(s, k, v)
-            db.session.commit()
-
-def get_live_features_for_regression(ticker):
-    raw_data = download_historical_data(ticker, period="3mo", interval="1d")
-    if raw_data is None: return None
-    featured_data = add_features_to_data(raw_data)
-    if featured_data is None or not all(col in featured_data.columns for col in FEATURES_LIST): return None
-    return featured_data[FEATURES_LIST].tail(1)
+def start_signal_refresher():
+    global signal_refresher
+    if os.environ.get('SIGNAL_REFRESHER_ENABLED', '1') == '0': return None
+    signal_refresher = threading.Thread(target=_signal_refresher_loop, name="signal-refresher", daemon=True)
+    signal_refresher.start()
+    return signal_refresher
+
+# --- Instrumentierung: Latenz pro Route, optional als Server-Timing-Header (SERVER_TIMING_ENABLED=1) ---
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '0') == '1'
+
+@app.before_request
+def _start_request_metrics():
+    request.environ['krypto.metrics'] = (time.perf_counter(), start_request_timings())
+
+@app.after_request
+def _finish_request_metrics(response):
+    started, token = request.environ.pop('krypto.metrics', (None, None))
+    if started is None: return response
+    elapsed = time.perf_counter() - started
+    timings = finish_request_timings(token)
+    endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    metrics.observe('http_request', elapsed, endpoint=endpoint)
+    metrics.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    if SERVER_TIMING_ENABLED: response.headers['Server-Timing'] = format_server_timing(timings, elapsed)
+    return response
 
 # --- App-Start ---
 with app.app_context():
+    instrument_engine(db.engine)
     db.create_all()
-    current_settings = load_settings_from_db()
+    upgrade_schema(db.engine, [BacktestResult.__table__, BacktestRun.__table__, Settings.__table__])
+    settings_cache.get()
 load_artifacts_from_db()
+models.start_polling()
+start_signal_refresher()
 
 # --- API-Routen ---
 @app.route('/')
 def home(): return "Krypto Helfer 2.0 ist live!"
 
+# Vorkodierte (und gzip-komprimierte) Antworten pro (Endpunkt, Ticker, Datenversion, Query)
+payload_cache = TTLCache(ttl_seconds=int(os.environ.get('PAYLOAD_CACHE_TTL_SECONDS', 900)),
+                         max_entries=int(os.environ.get('PAYLOAD_CACHE_MAX_ENTRIES', 128)))
+
+def series_response(payload, data_version):
+    use_gzip = payload['gzip'] is not None and 'gzip' in request.accept_encodings
+    http_response = Response(payload['gzip'] if use_gzip else payload['body'], mimetype='application/json')
+    http_response.headers['Vary'] = 'Accept-Encoding'
+    http_response.headers['X-Data-Version'] = str(data_version)
+    if use_gzip: http_response.headers['Content-Encoding'] = 'gzip'
+    http_response.set_etag(payload['etag'] + ('-gz' if use_gzip else ''))
+    return http_response.make_conditional(request)
+
+def _encode_chart_payload(data, query, date_unit='D'):
+    data['SMA_10'] = data['Adj Close'].rolling(window=10).mean()
+    data['SMA_50'] = data['Adj Close'].rolling(window=50).mean()
+    data['RSI_14'] = ta.rsi(data['Adj Close'], length=14)
+    data.dropna(inplace=True)
+    if data.empty: return None
+    columns = {'price': data['Adj Close'], 'sma_short': data['SMA_10'], 'sma_long': data['SMA_50'], 'rsi': data['RSI_14']}
+    return encode_series('Date', format_dates(data.index, date_unit), columns, query)
+
 @app.route('/get_chart_data/<ticker_symbol>')
 def get_chart_data(ticker_symbol):
     try:
-        data = download_historical_data(ticker_symbol, period="6mo", interval="1d")
+        query = parse_series_query(request.args)
+        interval = request.args.get('interval', SIGNAL_INTERVAL)
+        get_interval_profile(interval)
+    except (SeriesQueryError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        data = download_historical_data_cached(ticker_symbol, period=get_interval_profile(interval)['chart_period'], interval=interval)
         if data is None: return jsonify({"error": f"Keine Rohdaten für {ticker_symbol}."}), 404
-        data['SMA_10'] = data['Adj Close'].rolling(window=10).mean()
-        data['SMA_50'] = data['Adj Close'].rolling(window=50).mean()
-        data['RSI_14'] = ta.rsi(data['Adj Close'], length=14)
-        data.dropna(inplace=True)
-        if data.empty: return jsonify({"error": f"Zu wenig Daten für Chart für {ticker_symbol}."}), 500
-        chart_columns = ['Adj Close', 'SMA_10', 'SMA_50', 'RSI_14']
-        chart_data = data[chart_columns].copy()
-        chart_data.rename(columns={'Adj Close': 'price', 'SMA_10': 'sma_short', 'SMA_50': 'sma_long', 'RSI_14': 'rsi'}, inplace=True)
-        chart_data.reset_index(inplace=True); chart_data['Date'] = chart_data['Date'].dt.strftime('%Y-%m-%d')
-        return jsonify(chart_data.to_dict(orient="records"))
+        # Datenversion: Intervall, Anzahl Bars, letzter Zeitstempel und letzter Kurs (der laufende Bar ändert sich intraday)
+        data_version = f"{interval}-{len(data)}-{data.index[-1].value}-{float(data['Adj Close'].iloc[-1])!r}"
+        date_unit = get_interval_profile(interval)['date_unit']
+        payload = payload_cache.get_or_load(('chart', ticker_symbol, data_version) + query_cache_key(query), lambda: _encode_chart_payload(data, query, date_unit))
+        if payload is None: return jsonify({"error": f"Zu wenig Daten für Chart für {ticker_symbol}."}), 500
+        return series_response(payload, data_version)
     except Exception as e:
         print(f"Kritischer Fehler bei /get_chart_data für {ticker_symbol}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify({"ohlcv": ohlcv_cache.stats(), "features": feature_cache.stats(), "payloads": payload_cache.stats(), "quotes": quote_client.stats(),
+                    "settings": settings_cache.stats(), "shared": shared_cache.stats() if shared_cache else None})
+
+def _encode_backtest_payload(ticker_symbol, active_run_id, query):
+    results = db.session.query(BacktestResult.date, BacktestResult.balance).filter(
+        BacktestResult.asset_name == ticker_symbol,
+        BacktestResult.run_id == active_run_id if active_run_id is not None else BacktestResult.run_id.is_(None)
+    ).order_by(BacktestResult.date).all()
+    if not results: return None
+    dates, balances = zip(*results)
+    # Backtest-Läufe werden für SIGNAL_INTERVAL gespeichert (siehe backtester)
+    return encode_series('date', format_dates(pd.DatetimeIndex(dates), get_interval_profile(SIGNAL_INTERVAL)['date_unit']), {'balance': balances}, query)
+
 @app.route('/get_backtest_results/<ticker_symbol>')
 def get_backtest_results(ticker_symbol):
     try:
-        results = BacktestResult.query.filter_by(asset_name=ticker_symbol).order_by(BacktestResult.date).all()
-        if not results: return jsonify({"error": f"Keine Backtest-Daten für {ticker_symbol}."}), 404
-        data = [{"date": r.date.strftime('%Y-%m-%d'), "balance": r.balance} for r in results]
-        return jsonify(data)
+        query = parse_series_query(request.args)
+    except SeriesQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        # Aktiven Lauf lesen (Index auf asset_name, run_id, date); ohne Lauf den Altbestand ohne run_id
+        active_run_id = db.session.query(BacktestRun.id).filter_by(asset_name=ticker_symbol, is_active=True).order_by(BacktestRun.id.desc()).limit(1).scalar()
+        if active_run_id is not None: data_version = f"run-{active_run_id}"
+        else:
+            legacy_count, legacy_max_id = db.session.query(func.count(BacktestResult.id), func.max(BacktestResult.id)).filter(
+                BacktestResult.asset_name == ticker_symbol, BacktestResult.run_id.is_(None)).one()
+            data_version = f"legacy-{legacy_count}-{legacy_max_id}"
+        payload = payload_cache.get_or_load(('backtest', ticker_symbol, data_version) + query_cache_key(query),
+                                            lambda: _encode_backtest_payload(ticker_symbol, active_run_id, query))
+        if payload is None: return jsonify({"error": f"Keine Backtest-Daten für {ticker_symbol}."}), 404
+        return series_response(payload, data_version)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/get_signals')
 def get_signals():
-    global current_settings
-    bitcoin_data, gold_data, error_msg = {}, {}, ""
-    btc_keys = ['btc_low_model', 'btc_low_scaler', 'btc_high_model', 'btc_high_scaler']
-    if all(k in models for k in ['btc_low_model', 'btc_low_scaler', 'btc_high_model', 'btc_high_scaler']):
-        try:
-            current_price = float(requests.get("https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT").json()['price'])
-            latest_features_df = get_live_features_for_regression("BTC-USD")
-            if latest_features_df is not None:
-                predicted_low = models['btc_low_model'].predict(models['btc_low_scaler'].transform(latest_features_df))[0]
-                predicted_high = models['btc_high_model'].predict(models['btc_high_scaler'].transform(latest_features_df))[0]
-                atr_value = latest_features_df['ATRr_14'].iloc[0]
-                stop_loss = predicted_low - (atr_value * 1.5)
-                bitcoin_data = {"price": round(current_price, 2), "entry": round(predicted_low, 2), "take_profit": round(predicted_high, 2), "stop_loss": round(stop_loss, 2)}
-            else:
-                error_msg += "BTC Feature-Erstellung fehlgeschlagen. "
-        except Exception as e:
-            error_msg += f"BTC Fehler: {e}. "; bitcoin_data={"price":"Fehler"}
-    else:
-        error_msg += "BTC Modelle nicht geladen. "
-    
-    gold_keys = ['gold_low_model', 'gold_low_scaler', 'gold_high_model', 'gold_high_scaler']
-    if all(k in models for k in ['gold_low_model', 'gold_low_scaler', 'gold_high_model', 'gold_high_scaler']):
+    snapshot = get_signal_snapshot()
+    deadline = time.monotonic() + SIGNAL_DEADLINE_SECONDS
+    # Nur der Live-Preis wird pro Request geholt, für alle Assets gleichzeitig
+    price_futures = {asset["key"]: submit_with_context(signal_executor, asset["fetch_price"]) for asset in SIGNAL_ASSETS if snapshot["signals"].get(asset["key"])}
+
+    response, error_msg = {}, ""
+    for asset in SIGNAL_ASSETS:
+        levels = snapshot["signals"].get(asset["key"])
+        if not levels:
+            response[asset["key"]] = {}; error_msg += snapshot["errors"].get(asset["key"], "")
+            continue
         try:
-            FMP_API_KEY = os.environ.get('FMP_API_KEY')
-            current_price = float(requests.get(f'https://financialmodelingprep.com/api/v3/quote/XAUUSD?apikey={FMP_API_KEY}').json()[0]['price'])
-            latest_features_df = get_live_features_for_regression("GC=F")
-            if latest_features_df is not None:
-                # KORREKTUR: Eigene Vorhersagen für Gold berechnen
-                predicted_low_gold = models['gold_low_model'].predict(models['gold_low_scaler'].transform(latest_features_df))[0]
-                predicted_high_gold = models['gold_high_model'].predict(models['gold_high_scaler'].transform(latest_features_df))[0]
-                
-                # KORREKTUR: Eigene Variable für Stop-Loss verwenden
-                atr_value = latest_features_df['ATRr_14'].iloc[0]
-                stop_loss_gold = predicted_low_gold - (atr_value * 1.5)
-                
-                gold_data = {"price": round(current_price, 2), "entry": round(predicted_low_gold, 2), "take_profit": round(predicted_high_gold, 2), "stop_loss": round(stop_loss_gold, 2)}
-            else:
-                error_msg += "Gold Feature-Erstellung fehlgeschlagen. "
+            current_price = _result_before_deadline(price_futures[asset["key"]], deadline)
+            response[asset["key"]] = dict(levels, price=round(current_price, 2))
+        except FuturesTimeoutError:
+            response[asset["key"]] = {"price": "Fehler"}; error_msg += f"{asset['label']} Zeitüberschreitung nach {SIGNAL_DEADLINE_SECONDS:g}s. "
         except Exception as e:
-            error_msg += f"Gold Fehler: {e}. "; gold_data={"price":"Fehler"}
-    else:
-        error_msg += "Gold Modelle nicht geladen. "
+            response[asset["key"]] = {"price": "Fehler"}; error_msg += f"{asset['label']} Fehler: {e}. "
     
-    response = {"bitcoin": bitcoin_data, "gold": gold_data, "settings": current_settings}
+    response["settings"] = settings_cache.get()
     if error_msg: response["global_error"] = error_msg.strip()
-    return jsonify(response)
+    http_response = jsonify(response)
+    http_response.headers['X-Signal-Snapshot-Version'] = str(snapshot["version"])
+    http_response.set_etag(hashlib.md5(http_response.get_data()).hexdigest())
+    return http_response.make_conditional(request)
     
+@app.route('/reload_models', methods=['POST'])
+def reload_models():
+    # Leichtgewichtige Benachrichtigung der Trainings-Pipeline statt eines kompletten Redeploys
+    reload_token = os.environ.get('MODEL_RELOAD_TOKEN')
+    # Ohne konfiguriertes Token ist der Endpunkt gesperrt; die Modelle kommen dann nur über das Polling
+    if not reload_token:
+        return jsonify({"status": "error", "message": "Nachladen deaktiviert: MODEL_RELOAD_TOKEN ist nicht gesetzt."}), 403
+    if not hmac.compare_digest(request.headers.get('X-Reload-Token', '').encode('utf-8'), reload_token.encode('utf-8')):
+        return jsonify({"status": "error", "message": "Ungültiges Token."}), 403
+    models.request_refresh()
+    return jsonify({"status": "success", "versions": models.versions()}), 202
+
+@app.route('/models')
+def list_models():
+    return jsonify({"versions": models.versions(), "manifests": models.manifests()})
+
 @app.route('/save_settings', methods=['POST'])
 def save_app_settings():
-    global current_settings; data = request.get_json()
-    if data: current_settings.update(data); save_settings(current_settings); return jsonify({"status": "success"})
-    return jsonify({"status": "error"}), 400
+    try:
+        settings = settings_cache.update(request.get_json(silent=True))
+    except SettingsValidationError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "settings": settings})
 
 @app.route('/register_device', methods=['POST'])
 def register_device():
@@ -0,0 +1,153 @@
+import io
+import os
+import re
+import json
+import zlib
+import stat
+import struct
+import pickle
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import joblib
+
+# Blob-Format: MAGIC | 4 Byte Header-Länge | JSON-Manifest | zlib(joblib-Dump)
+# Ältere Einträge (reines pickle.dumps) werden weiterhin gelesen.
+ARTIFACT_MAGIC = b"KSA1"
+ARTIFACT_CACHE_DIR = os.environ.get('ARTIFACT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'krypto-artifacts'))
+
+def ensure_private_dir(path):
+    # Cache-Verzeichnisse enthalten Pickles: nur der eigene Benutzer darf dort schreiben (0700, keine Symlinks)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"Cache-Verzeichnis {path} gehört nicht dem aktuellen Benutzer.")
+    if info.st_mode & 0o077: os.chmod(path, 0o700)
+    return path
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+def pack_artifact(name, artifact, features=None, training_window=None, compress_level=6):
+    buffer = io.BytesIO()
+    joblib.dump(artifact, buffer)
+    raw = buffer.getvalue()
+    sha256 = hashlib.sha256(raw).hexdigest()
+    payload = zlib.compress(raw, compress_level)
+    manifest = {
+        "name": name,
+        "version": sha256[:12],
+        "type": type(artifact).__name__,
+        "size": len(raw),
+        "compressed_size": len(payload),
+        "sha256": sha256,
+        "features": list(features) if features is not None else None,
+        "training_window": [str(t) for t in training_window] if training_window is not None else None,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    header = json.dumps(manifest).encode('utf-8')
+    return ARTIFACT_MAGIC + struct.pack('>I', len(header)) + header + payload
+
+def _split_blob(blob):
+    header_length = struct.unpack('>I', blob[4:8])[0]
+    manifest = json.loads(bytes(blob[8:8 + header_length]).decode('utf-8'))
+    return manifest, blob[8 + header_length:]
+
+def read_manifest(blob):
+    blob = bytes(blob)
+    if not blob.startswith(ARTIFACT_MAGIC): return None
+    return _split_blob(blob)[0]
+
+def _decompress_verified(manifest, payload):
+    raw = zlib.decompress(payload)
+    if hashlib.sha256(raw).hexdigest() != manifest["sha256"]:
+        raise ValueError(f"Prüfsumme für Artefakt '{manifest['name']}' stimmt nicht.")
+    return raw
+
+def unpack_artifact(blob, cache_path=None, mmap_mode='r'):
+    blob = bytes(blob)
+    if not blob.startswith(ARTIFACT_MAGIC): return pickle.loads(blob)
+    manifest, payload = _split_blob(blob)
+    raw = _decompress_verified(manifest, payload)
+    if cache_path is None: return joblib.load(io.BytesIO(raw))
+    # Entpackte Datei lokal ablegen, damit die Arrays per mmap geladen (und zwischen Prozessen geteilt) werden
+    ensure_private_dir(os.path.dirname(cache_path))
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f: f.write(raw)
+    os.replace(tmp_path, cache_path)
+    with open(f"{tmp_path}.json", 'w') as f: json.dump(manifest, f)
+    os.replace(f"{tmp_path}.json", f"{cache_path}.json")
+    return joblib.load(cache_path, mmap_mode=mmap_mode)
+
+def version_digest(version_key):
+    return hashlib.sha1(repr(version_key).encode('utf-8')).hexdigest()[:16]
+
+def cache_path_for(name, version_key, cache_dir=None):
+    return os.path.join(cache_dir or ARTIFACT_CACHE_DIR, f"{name}-{version_digest(version_key)}.joblib")
+
+def prune_superseded(name, cache_path):
+    # Ältere Versionen desselben Artefakts löschen; nur ältere, damit ein Worker mit veraltetem Stand keine neuere Datei entfernt.
+    # Offene mmap-Sichten bleiben bis zum Schließen gültig.
+    cache_dir, current = os.path.split(cache_path)
+    pattern = re.compile(re.escape(name) + r'-[0-9a-f]{16}\.joblib(\.json)?$')
+    current_mtime = os.stat(cache_path).st_mtime
+    for file_name in os.listdir(cache_dir):
+        if not pattern.match(file_name) or file_name in (current, f"{current}.json"): continue
+        path = os.path.join(cache_dir, file_name)
+        try:
+            if os.stat(path).st_mtime < current_mtime: os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class LazyArtifact:
+    # Lädt ein Artefakt erst beim ersten Zugriff: zuerst aus dem lokalen Cache (mmap), sonst aus der DB.
+    # Mit `share` (siehe shared_cache.share_artifact) kommt es stattdessen aus dem prozessübergreifenden Shared-Cache.
+    def __init__(self, name, version_key, fetch_blob, cache_dir=None, share=None):
+        self.name = name
+        self.version_key = version_key
+        self.fetch_blob = fetch_blob
+        self.cache_path = cache_path_for(name, version_key, cache_dir)
+        self.share = share
+        self.manifest = None
+        self._artifact = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._artifact is not None
+
+    def get(self):
+        if self._artifact is not None: return self._artifact
+        with self._lock:
+            if self._artifact is None:
+                self._artifact = self.share(self) if self.share is not None else self.load_unshared()
+        return self._artifact
+
+    def load_unshared(self):
+        cache_path = self.cache_path
+        try:
+            ensure_private_dir(os.path.dirname(cache_path))
+        except OSError as e:
+            print(f"Artefakt-Cache nicht nutzbar, lade '{self.name}' ohne Cache-Datei: {e}")
+            cache_path = None
+        if cache_path and os.path.exists(cache_path) and os.path.exists(f"{cache_path}.json"):
+            try:
+                with open(f"{cache_path}.json") as f: manifest = json.load(f)
+                # joblib.load entpickelt: die Datei muss erst die Prüfsumme aus dem Manifest bestehen
+                if manifest.get('name') != self.name or _file_sha256(cache_path) != manifest.get('sha256'):
+                    raise ValueError("Prüfsumme stimmt nicht.")
+                self.manifest = manifest
+                return joblib.load(cache_path, mmap_mode='r')
+            except Exception as e:
+                print(f"Cache-Datei für '{self.name}' unbrauchbar, lade aus DB: {e}")
+        blob = bytes(self.fetch_blob(self.name))
+        self.manifest = read_manifest(blob)
+        if cache_path is None or not self.manifest: return unpack_artifact(blob)
+        artifact = unpack_artifact(blob, cache_path=cache_path)
+        prune_superseded(self.name, cache_path)
+        return artifact
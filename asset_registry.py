@@ -0,0 +1,27 @@
+import os
+import json
+
+# Deklaratives Asset-Register: welche Ticker trainiert, gebacktestet und ausgeliefert werden.
+# Standard ist assets.json neben diesem Modul, per ASSET_REGISTRY_PATH überschreibbar.
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets.json')
+
+def _normalize_asset(entry):
+    if 'ticker' not in entry or 'name' not in entry:
+        raise ValueError(f"Asset-Eintrag braucht 'name' und 'ticker': {entry}")
+    asset = dict(entry)
+    asset.setdefault('prefix', asset['name'].lower().replace(' ', '_'))
+    asset.setdefault('label', asset['name'])
+    asset.setdefault('response_key', asset['prefix'])
+    asset.setdefault('last_signal_key', f"last_{asset['prefix']}_signal")
+    asset.setdefault('quote', None)
+    return asset
+
+def load_assets(path=None):
+    path = path or os.environ.get('ASSET_REGISTRY_PATH', DEFAULT_REGISTRY_PATH)
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    assets = [_normalize_asset(entry) for entry in entries]
+    prefixes = [asset['prefix'] for asset in assets]
+    if len(set(prefixes)) != len(prefixes):
+        raise ValueError(f"Doppelte Asset-Präfixe im Register {path}.")
+    return assets
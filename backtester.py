@@ -1,18 +1,30 @@
 # backtester.py (Finale Version - Speichert beste Parameter in DB)
 
 import os
-import pickle
+import time
+import argparse
+import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 load_dotenv()
 
 from flask import Flask
+import numpy as np
 import pandas as pd
+from sqlalchemy import insert
 
 # Importiere jetzt auch Settings aus unserer zentralen DB-Datei
-from database import db, TrainedModel, BacktestResult, Settings
+from database import db, TrainedModel, BacktestResult, BacktestRun, Settings, upgrade_schema
 from data_manager import download_historical_data
 from feature_engineer import add_features_to_data
-from train_model import FEATURES_LIST
+import train_model
+from train_model import FEATURES_LIST, combined_model_key, level_model_keys
+from artifact_store import unpack_artifact
+from asset_registry import load_assets
+from walk_forward import build_feature_matrix, run_walk_forward, print_walk_forward_report, add_walk_forward_arguments, walk_forward_options
+from intervals import DEFAULT_INTERVAL, SIGNAL_INTERVAL, get_interval_profile, interval_prefix
+from metrics import metrics, instrument_engine
 
 # --- Setup ---
 app = Flask(__name__)
@@ -20,85 +32,208 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+def load_backtest_models(model_prefix):
+    # Kombiniertes Low/High-Artefakt bevorzugen, sonst die vier getrennten Artefakte laden
+    combined = TrainedModel.query.filter_by(name=combined_model_key(model_prefix)).first()
+    if combined: return {combined.name: unpack_artifact(combined.data)}
+    models = {}
+    for key in level_model_keys(model_prefix):
+        artifact = TrainedModel.query.filter_by(name=key).first()
+        if not artifact: print(f"FEHLER: Artefakt '{key}' nicht gefunden."); return None
+        models[key] = unpack_artifact(artifact.data)
+    return models
+
+def predict_price_levels(models, model_prefix, featured_data):
+    # Ein einziger transform/predict-Aufruf pro Modell für alle Tage statt einer Vorhersage pro Bar
+    return train_model.predict_price_levels(models, model_prefix, featured_data[FEATURES_LIST])
+
+def simulate_trades(open_prices, high_prices, low_prices, atr_values, predicted_low, predicted_high,
+                    initial_capital=100.0, entry_threshold_percent=5.0, sl_atr_multiplier=1.5):
+    # Zustandsautomat über reine NumPy-Arrays; liefert Endkapital und Kontostand je Tag (ohne den letzten Tag)
+    opens, highs, lows = np.asarray(open_prices, dtype=float).tolist(), np.asarray(high_prices, dtype=float).tolist(), np.asarray(low_prices, dtype=float).tolist()
+    atrs, pred_lows, pred_highs = np.asarray(atr_values, dtype=float).tolist(), np.asarray(predicted_low, dtype=float).tolist(), np.asarray(predicted_high, dtype=float).tolist()
+
+    capital = initial_capital
+    in_trade = False
+    entry_price, take_profit_target, stop_loss_target = 0, 0, 0
+    balances = np.empty(max(len(opens) - 1, 0))
+
+    for i in range(len(opens) - 1):
+        if in_trade:
+            if lows[i+1] <= stop_loss_target:
+                capital *= (1 + ((stop_loss_target / entry_price) - 1)); in_trade = False
+            elif highs[i+1] >= take_profit_target:
+                capital *= (1 + ((take_profit_target / entry_price) - 1)); in_trade = False
+
+        if not in_trade:
+            predicted_low_i, predicted_high_i = pred_lows[i], pred_highs[i]
+            if predicted_low_i > 0 and ((predicted_high_i / predicted_low_i) - 1) * 100 > entry_threshold_percent:
+                in_trade = True; entry_price = opens[i+1]
+                take_profit_target = predicted_high_i
+                stop_loss_target = predicted_low_i - (atrs[i] * sl_atr_multiplier)
+
+        balances[i] = capital
+
+    return capital, balances
+
+def prepare_backtest_inputs(ticker, model_prefix, period=None, interval=DEFAULT_INTERVAL):
+    # Lädt Modelle, Daten und Vorhersagen einmal pro Asset; alle Parameter-Kombinationen teilen sich diese Arrays
+    profile = get_interval_profile(interval)
+    model_prefix = interval_prefix(model_prefix, interval)
+    with app.app_context():
+        models = load_backtest_models(model_prefix)
+        if models is None: return None
+        
+        historical_data = download_historical_data(ticker, period=period or profile['training_period'], interval=interval)
+        featured_data = add_features_to_data(historical_data, dtype=profile['feature_dtype'])
+        if featured_data is None: return None
+
+        predicted_low, predicted_high = predict_price_levels(models, model_prefix, featured_data)
+        return {
+            'dates': featured_data.index[:-1],
+            'index': featured_data.index, 'close': featured_data['Close'].to_numpy(dtype=float),
+            'arrays': (featured_data['Open'].to_numpy(dtype=float), featured_data['High'].to_numpy(dtype=float), featured_data['Low'].to_numpy(dtype=float),
+                       featured_data['ATRr_14'].to_numpy(dtype=float), np.asarray(predicted_low, dtype=float), np.asarray(predicted_high, dtype=float))
+        }
+
+def prepare_walk_forward_inputs(ticker, period=None, interval=DEFAULT_INTERVAL, **walk_forward_kwargs):
+    # Vorhersagen nur aus Modellen, die vor dem jeweiligen Testfenster trainiert wurden (kein Look-Ahead)
+    profile = get_interval_profile(interval)
+    historical_data = download_historical_data(ticker, period=period or profile['training_period'], interval=interval)
+    matrix = build_feature_matrix(historical_data, horizon_bars=profile['target_horizon_bars'], dtype=profile['feature_dtype']) if historical_data is not None else None
+    if matrix is None: return None
+    report = run_walk_forward(matrix, forest_params=profile['forest_params'], **walk_forward_kwargs)
+    if report is None: return None
+    featured_data = matrix['featured'].loc[report['predictions'].index]
+    return {
+        'dates': featured_data.index[:-1],
+        'index': featured_data.index, 'close': featured_data['Close'].to_numpy(dtype=float),
+        'arrays': (featured_data['Open'].to_numpy(dtype=float), featured_data['High'].to_numpy(dtype=float), featured_data['Low'].to_numpy(dtype=float),
+                   featured_data['ATRr_14'].to_numpy(dtype=float), report['predictions']['future_7d_low'].to_numpy(), report['predictions']['future_7d_high'].to_numpy()),
+        'walk_forward': report
+    }
+
+def build_portfolio_history(dates, balances):
+    return [{'date': date, 'balance': balance} for date, balance in zip(dates, balances.tolist())]
+
 def run_backtest_simulation(ticker, model_prefix, initial_capital=100.0, 
                             entry_threshold_percent=5.0, 
                             sl_atr_multiplier=1.5):
     
     print(f"\n--- Starte Backtest für {ticker} | Einstieg: >{entry_threshold_percent}% | SL: {sl_atr_multiplier}x ATR ---")
 
-    with app.app_context():
-        models = {}
-        required_keys = [f"{model_prefix}_low_model", f"{model_prefix}_low_scaler", f"{model_prefix}_high_model", f"{model_prefix}_high_scaler"]
-        for key in required_keys:
-            artifact = TrainedModel.query.filter_by(name=key).first()
-            if not artifact: print(f"FEHLER: Artefakt '{key}' nicht gefunden."); return 0.0, []
-            models[key] = pickle.loads(artifact.data)
-        
-        historical_data = download_historical_data(ticker, period="2y")
-        featured_data = add_features_to_data(historical_data)
-        if featured_data is None: return 0.0, []
-
-        capital = initial_capital
-        in_trade = False
-        entry_price, take_profit_target, stop_loss_target = 0, 0, 0
-        portfolio_history = []
-
-        for i in range(len(featured_data) - 1):
-            current_day = featured_data.iloc[i]
-            next_day = featured_data.iloc[i+1]
-            
-            if in_trade:
-                if next_day['Low'] <= stop_loss_target:
-                    capital *= (1 + ((stop_loss_target / entry_price) - 1)); in_trade = False
-                elif next_day['High'] >= take_profit_target:
-                    capital *= (1 + ((take_profit_target / entry_price) - 1)); in_trade = False
-
-            if not in_trade:
-                features_df = pd.DataFrame([current_day[FEATURES_LIST]])
-                predicted_low = models[f'{model_prefix}_low_model'].predict(models[f'{model_prefix}_low_scaler'].transform(features_df))[0]
-                predicted_high = models[f'{model_prefix}_high_model'].predict(models[f'{model_prefix}_high_scaler'].transform(features_df))[0]
-                
-                if predicted_low > 0 and ((predicted_high / predicted_low) - 1) * 100 > entry_threshold_percent:
-                    in_trade = True; entry_price = next_day['Open']
-                    take_profit_target = predicted_high
-                    stop_loss_target = predicted_low - (current_day['ATRr_14'] * sl_atr_multiplier)
-            
-            portfolio_history.append({'date': current_day.name, 'balance': capital})
-        
-        print(f"--> Testlauf beendet. Endkapital: {capital:.2f}")
-        return capital, portfolio_history
+    inputs = prepare_backtest_inputs(ticker, model_prefix)
+    if inputs is None: return 0.0, []
+
+    capital, balances = simulate_trades(*inputs['arrays'], initial_capital, entry_threshold_percent, sl_atr_multiplier)
+    portfolio_history = build_portfolio_history(inputs['dates'], balances)
+    
+    print(f"--> Testlauf beendet. Endkapital: {capital:.2f}")
+    return capital, portfolio_history
+
+# --- Persistenz ---
+def save_backtest_run(asset_name, dates, balances, entry_threshold=None, sl_multiplier=None, final_balance=None, keep_runs=3):
+    # Anhängen und Umschalten: neue Kurve per executemany schreiben, dann den aktiven Lauf wechseln
+    run = BacktestRun(asset_name=asset_name, entry_threshold=entry_threshold, sl_multiplier=sl_multiplier, final_balance=final_balance, is_active=False)
+    db.session.add(run)
+    db.session.flush()
+    rows = [{'asset_name': asset_name, 'run_id': run.id, 'date': date, 'balance': balance}
+            for date, balance in zip(pd.DatetimeIndex(dates).to_pydatetime(), np.asarray(balances, dtype=float).tolist())]
+    if rows: db.session.execute(insert(BacktestResult), rows)
+    BacktestRun.query.filter(BacktestRun.asset_name == asset_name, BacktestRun.id != run.id).update({'is_active': False})
+    run.is_active = True
+    db.session.commit()
+
+    # Alte Läufe (und Altbestand ohne run_id) aufräumen, nachdem der neue Lauf aktiv ist
+    old_run_ids = [r.id for r in BacktestRun.query.filter_by(asset_name=asset_name).order_by(BacktestRun.id.desc()).offset(keep_runs)]
+    if old_run_ids:
+        BacktestResult.query.filter(BacktestResult.run_id.in_(old_run_ids)).delete(synchronize_session=False)
+        BacktestRun.query.filter(BacktestRun.id.in_(old_run_ids)).delete(synchronize_session=False)
+    BacktestResult.query.filter(BacktestResult.asset_name == asset_name, BacktestResult.run_id.is_(None)).delete(synchronize_session=False)
+    db.session.commit()
+    return run.id
+
+# --- Parameter-Sweep ---
+_sweep_arrays = None
+
+def _init_sweep_worker(arrays):
+    # Wird einmal pro Worker-Prozess aufgerufen, damit die Arrays nicht pro Zelle übertragen werden
+    global _sweep_arrays
+    _sweep_arrays = arrays
+
+def _run_sweep_cell(params, initial_capital=100.0):
+    threshold, multiplier = params
+    capital, _ = simulate_trades(*_sweep_arrays, initial_capital, threshold, multiplier)
+    return threshold, multiplier, capital
+
+def run_parameter_sweep(inputs, entry_thresholds, sl_multipliers, initial_capital=100.0, max_workers=None):
+    grid = list(itertools.product(entry_thresholds, sl_multipliers))
+    max_workers = max_workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    if max_workers <= 1 or len(grid) <= 1:
+        _init_sweep_worker(inputs['arrays'])
+        cells = [_run_sweep_cell(params, initial_capital) for params in grid]
+    else:
+        chunksize = max(1, len(grid) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker, initargs=(inputs['arrays'],)) as executor:
+            cells = list(executor.map(functools.partial(_run_sweep_cell, initial_capital=initial_capital), grid, chunksize=chunksize))
+    elapsed = time.perf_counter() - start_time
+
+    ranked = sorted(({'params': {'Einstieg': threshold, 'SL': multiplier}, 'result': capital} for threshold, multiplier, capital in cells),
+                    key=lambda x: x['result'], reverse=True)
+    return ranked, elapsed
+
+def print_sweep_table(asset_name, ranked, elapsed, top=10):
+    cells_per_second = len(ranked) / elapsed if elapsed > 0 else float('inf')
+    print(f"\n{asset_name}: {len(ranked)} Kombinationen in {elapsed:.3f}s ({cells_per_second:,.0f} Zellen/s)")
+    print(f"{'Rang':>4}  {'Einstieg %':>10}  {'SL x ATR':>8}  {'Endkapital':>10}")
+    for rank, run in enumerate(ranked[:top], start=1):
+        print(f"{rank:>4}  {run['params']['Einstieg']:>10}  {run['params']['SL']:>8}  {run['result']:>10.2f}")
+
+def parse_grid(value):
+    return [float(v) for v in value.split(',') if v.strip()]
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Strategie-Labor: Parameter-Sweep über Einstiegsschwelle und Stop-Loss")
+    parser.add_argument('--entry-thresholds', type=parse_grid, default=[3, 5, 7])
+    parser.add_argument('--sl-multipliers', type=parse_grid, default=[1.0, 1.5, 2.0])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--walk-forward', action='store_true', help="Out-of-Sample-Vorhersagen aus Walk-Forward-Folds statt der gespeicherten Modelle")
+    parser.add_argument('--interval', default=DEFAULT_INTERVAL, help="Bar-Intervall (1d, 1h, 15m)")
+    add_walk_forward_arguments(parser)
+    args = parser.parse_args()
+    get_interval_profile(args.interval)
+
     with app.app_context():
+        instrument_engine(db.engine)
         db.create_all()
+        upgrade_schema(db.engine, [BacktestResult.__table__, BacktestRun.__table__, Settings.__table__])
 
     # --- DAS STRATEGIE-LABOR ---
-    assets_to_test = {
-        "BTC": {"ticker": "BTC-USD", "prefix": "btc"},
-        "Gold": {"ticker": "GC=F", "prefix": "gold"}
-    }
-    
-    entry_thresholds = [3, 5, 7]
-    sl_multipliers = [1.0, 1.5, 2.0]
+    assets_to_test = {asset["name"]: asset for asset in load_assets()}
     
     # Führe die Forschung für jedes Asset durch
     for asset_name, asset_details in assets_to_test.items():
         print("\n" + "="*40 + f" {asset_name.upper()} FORSCHUNG START " + "="*40)
-        results = []
-        for threshold in entry_thresholds:
-            for multiplier in sl_multipliers:
-                final_capital, history = run_backtest_simulation(
-                    ticker=asset_details["ticker"], 
-                    model_prefix=asset_details["prefix"],
-                    entry_threshold_percent=threshold,
-                    sl_atr_multiplier=multiplier
-                )
-                if final_capital > 0:
-                    results.append({'params': {'Einstieg': threshold, 'SL': multiplier}, 'result': final_capital, 'history': history})
+        if args.walk_forward:
+            inputs = prepare_walk_forward_inputs(asset_details["ticker"], interval=args.interval, **walk_forward_options(args))
+            if inputs is not None: print_walk_forward_report(asset_name, inputs['walk_forward'])
+        else:
+            inputs = prepare_backtest_inputs(asset_details["ticker"], asset_details["prefix"], interval=args.interval)
+        if inputs is None:
+            print(f"FEHLER: Keine Backtest-Daten für {asset_name}."); continue
+
+        ranked, elapsed = run_parameter_sweep(inputs, args.entry_thresholds, args.sl_multipliers, max_workers=args.workers)
+        print_sweep_table(asset_name, ranked, elapsed, top=args.top)
+        results = [run for run in ranked if run['result'] > 0]
         
-        # Finde und speichere die beste Strategie für dieses Asset
-        if results:
-            best_run = max(results, key=lambda x: x['result'])
+        # Finde und speichere die beste Strategie für dieses Asset (nur für das Intervall, das die App ausliefert)
+        if results and args.interval != SIGNAL_INTERVAL:
+            print(f"\nBester {asset_name} End-Kontostand ({args.interval}): {results[0]['result']:.2f} - nicht gespeichert (App nutzt {SIGNAL_INTERVAL}).")
+        elif results:
+            best_run = results[0]
+            _, best_balances = simulate_trades(*inputs['arrays'], 100.0, best_run['params']['Einstieg'], best_run['params']['SL'])
             print(f"\nBester {asset_name} End-Kontostand: {best_run['result']:.2f}")
             print(f"Beste {asset_name} Strategie-Parameter: {best_run['params']}")
             
@@ -116,10 +251,8 @@ if __name__ == '__main__':
                 print(f"Beste Strategie-Parameter für {asset_name} in DB gespeichert.")
 
                 # Speichere die beste Historie für den Chart in der DB
-                BacktestResult.query.filter_by(asset_name=asset_details["ticker"]).delete()
-                for record in best_run['history']:
-                    db.session.add(BacktestResult(asset_name=asset_details["ticker"], date=record['date'], balance=record['balance']))
-                db.session.commit()
-                print(f"Beste {asset_name} Backtest-Historie in DB gespeichert.")
+                run_id = save_backtest_run(asset_details["ticker"], inputs['dates'], best_balances, best_run['params']['Einstieg'], best_run['params']['SL'], best_run['result'])
+                print(f"Beste {asset_name} Backtest-Historie in DB gespeichert (Lauf {run_id}).")
     
-    print("\n\nFORSCHUNG ABGESCHLOSSEN!")
\ No newline at end of file
+    print("\n\nFORSCHUNG ABGESCHLOSSEN!")
+    print("\nZeiten pro Stufe:\n" + metrics.summary())
@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import time
+import fcntl
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from intervals import DEFAULT_INTERVAL, INTERVAL_PROFILES
+
+# Lokaler, spaltenorientierter OHLCV-Speicher: pro Ticker/Intervall eine Binärdatei je Spalte
+# (float64) plus eine Zeitstempel-Datei (int64, ns UTC). Dateien werden nur angehängt bzw. der
+# letzte (laufende) Bar an Ort und Stelle überschrieben, so bleiben np.memmap-Sichten gültig.
+# Ältere Historie (Backfill) ersetzt die Dateien atomar; bestehende Sichten behalten die alte Datei.
+BAR_COLUMNS = ['Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+_PERIOD_PATTERN = re.compile(r'^(\d+)(d|wk|mo|y)$')
+
+def period_to_offset(period):
+    match = _PERIOD_PATTERN.match(period)
+    if not match: return None
+    amount, unit = int(match.group(1)), match.group(2)
+    return {'d': pd.DateOffset(days=amount), 'wk': pd.DateOffset(weeks=amount),
+            'mo': pd.DateOffset(months=amount), 'y': pd.DateOffset(years=amount)}[unit]
+
+def _column_filename(column):
+    return column.replace(' ', '_') + '.f8'
+
+class BarRangeError(ValueError):
+    # Angeforderter Zeitraum reicht weiter zurück als der Speicher abdeckt und kann nicht nachgeladen werden
+    pass
+
+class BarStore:
+    def __init__(self, root, fixture_dir=None, offline=False, initial_period="2y", sync_interval_seconds=300):
+        self.root = root
+        self.fixture_dir = fixture_dir
+        self.offline = offline
+        self.initial_period = initial_period
+        self.sync_interval_seconds = sync_interval_seconds
+
+    # --- Pfade & Metadaten ---
+    def _key_dir(self, ticker, interval):
+        safe_ticker = re.sub(r'[^A-Za-z0-9_.-]', '_', ticker)
+        return os.path.join(self.root, safe_ticker, interval)
+
+    def _read_meta(self, key_dir):
+        path = os.path.join(key_dir, 'meta.json')
+        if not os.path.exists(path): return {}
+        with open(path) as f: return json.load(f)
+
+    def _write_meta(self, key_dir, meta):
+        tmp_path = os.path.join(key_dir, f'meta.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f: json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(key_dir, 'meta.json'))
+
+    @contextmanager
+    def _locked(self, key_dir, exclusive):
+        os.makedirs(key_dir, exist_ok=True)
+        with open(os.path.join(key_dir, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try: yield
+            finally: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _bar_count(self, key_dir):
+        # Die Zeitstempel-Datei wird zuletzt geschrieben und bestimmt damit die gültige Länge
+        path = os.path.join(key_dir, 'timestamps.i8')
+        return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+    # --- Schreiben ---
+    def _write_bars(self, key_dir, frame):
+        frame = frame.sort_index()
+        frame = frame[~frame.index.duplicated(keep='last')]
+        if frame.empty: return 0
+        index = frame.index
+        meta = self._read_meta(key_dir)
+        if 'tz' not in meta: meta['tz'] = str(index.tz) if index.tz is not None else None; meta['index_name'] = index.name or 'Date'
+        timestamps = (index.tz_convert('UTC') if index.tz is not None else index).asi8
+
+        count = self._bar_count(key_dir)
+        last_timestamp = self._timestamps(key_dir, count)[-1] if count else None
+        if last_timestamp is not None:
+            # Append-only: ältere Bars werden ignoriert, der letzte gespeicherte Bar darf aktualisiert werden
+            keep = timestamps >= last_timestamp
+            frame, timestamps = frame[keep], timestamps[keep]
+            if len(timestamps) == 0: return 0
+        offset = count - 1 if last_timestamp is not None and timestamps[0] == last_timestamp else count
+
+        for column in BAR_COLUMNS:
+            values = frame[column].to_numpy(dtype=np.float64) if column in frame.columns else np.full(len(frame), np.nan)
+            self._write_at(os.path.join(key_dir, _column_filename(column)), offset, values)
+        self._write_at(os.path.join(key_dir, 'timestamps.i8'), offset, timestamps.astype(np.int64))
+        meta['synced_at'] = time.time()
+        self._write_meta(key_dir, meta)
+        return offset + len(timestamps) - count
+
+    def _prepend_bars(self, key_dir, frame):
+        # Backfill: Bars vor dem ersten gespeicherten Zeitstempel voranstellen, jede Datei wird neu geschrieben und ersetzt
+        frame = frame.sort_index()
+        frame = frame[~frame.index.duplicated(keep='last')]
+        count = self._bar_count(key_dir)
+        if frame.empty or count == 0: return 0
+        index = frame.index
+        timestamps = (index.tz_convert('UTC') if index.tz is not None else index).asi8
+        keep = timestamps < self._timestamps(key_dir, count)[0]
+        frame, timestamps = frame[keep], timestamps[keep]
+        if len(timestamps) == 0: return 0
+        for column in BAR_COLUMNS:
+            values = frame[column].to_numpy(dtype=np.float64) if column in frame.columns else np.full(len(frame), np.nan)
+            path = os.path.join(key_dir, _column_filename(column))
+            self._replace_file(path, np.concatenate([values, np.fromfile(path, dtype=np.float64, count=count)]))
+        path = os.path.join(key_dir, 'timestamps.i8')
+        self._replace_file(path, np.concatenate([timestamps.astype(np.int64), np.fromfile(path, dtype=np.int64, count=count)]))
+        return len(timestamps)
+
+    @staticmethod
+    def _replace_file(path, values):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f: f.write(np.ascontiguousarray(values).tobytes())
+        os.replace(tmp_path, path)
+
+    def _mark_covered(self, key_dir, start_ns):
+        # Frühester Zeitpunkt, ab dem der Speicher die Historie vollständig enthält (ns UTC)
+        meta = self._read_meta(key_dir)
+        meta['covered_from'] = min(int(start_ns), meta.get('covered_from', int(start_ns)))
+        self._write_meta(key_dir, meta)
+
+    def _covered_from(self, key_dir, count, meta):
+        return meta.get('covered_from', int(self._timestamps(key_dir, count)[0]))
+
+    def _initial_period(self, interval):
+        # Intraday-Intervalle: yfinance liefert nur begrenzte Historie, daher Zeitraum aus dem Intervall-Profil
+        return self.initial_period if interval == DEFAULT_INTERVAL else INTERVAL_PROFILES.get(interval, {}).get('training_period', self.initial_period)
+
+    def _mark_initial_coverage(self, key_dir, interval):
+        # Ein Erstimport deckt den Startzeitraum bis zum letzten Bar ab (wie read_frame ihn für `period` berechnet)
+        count = self._bar_count(key_dir)
+        if count == 0: return
+        timestamps = self._timestamps(key_dir, count)
+        offset = period_to_offset(self._initial_period(interval))
+        start_ns = (pd.Timestamp(int(timestamps[-1]), unit='ns') - offset).value if offset is not None else int(timestamps[0])
+        self._mark_covered(key_dir, min(start_ns, int(timestamps[0])))
+
+    @staticmethod
+    def _write_at(path, offset, values):
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(offset * 8)
+            f.write(np.ascontiguousarray(values).tobytes())
+
+    def import_frame(self, ticker, interval, frame):
+        key_dir = self._key_dir(ticker, interval)
+        with self._locked(key_dir, exclusive=True):
+            return self._write_bars(key_dir, frame)
+
+    def import_csv(self, ticker, interval, path):
+        frame = pd.read_csv(path, index_col=0, parse_dates=True)
+        return self.import_frame(ticker, interval, frame)
+
+    # --- Synchronisation ---
+    def sync(self, ticker, interval="1d", force=False, timeout=10):
+        key_dir = self._key_dir(ticker, interval)
+        with self._locked(key_dir, exclusive=True):
+            count = self._bar_count(key_dir)
+            if count == 0 and self.fixture_dir:
+                fixture_path = os.path.join(self.fixture_dir, f"{os.path.basename(os.path.dirname(key_dir))}_{interval}.csv")
+                if os.path.exists(fixture_path):
+                    added = self._write_bars(key_dir, pd.read_csv(fixture_path, index_col=0, parse_dates=True))
+                    self._mark_initial_coverage(key_dir, interval)
+                    return added
+            if self.offline: return 0
+            meta = self._read_meta(key_dir)
+            if not force and count and time.time() - meta.get('synced_at', 0) < self.sync_interval_seconds: return 0
+
+            import yfinance as yf
+            if count:
+                # Nur Bars ab dem letzten gespeicherten Zeitstempel nachladen
+                start = pd.Timestamp(self._timestamps(key_dir, count)[-1], unit='ns')
+                data = yf.download(ticker, start=start.strftime('%Y-%m-%d'), interval=interval, progress=False, auto_adjust=False, timeout=timeout)
+            else:
+                data = yf.download(ticker, period=self._initial_period(interval), interval=interval, progress=False, auto_adjust=False, timeout=timeout)
+            if data is None or data.empty:
+                meta['synced_at'] = time.time(); self._write_meta(key_dir, meta)
+                return 0
+            if isinstance(data.columns, pd.MultiIndex):
+                data.columns = data.columns.get_level_values(0)
+            added = self._write_bars(key_dir, data)
+            if not count: self._mark_initial_coverage(key_dir, interval)
+            return added
+
+    def backfill(self, ticker, interval, start, timeout=10):
+        # Lädt Bars vor dem abgedeckten Zeitraum nach; liefert upstream nichts, gilt der Zeitraum trotzdem als abgedeckt
+        key_dir = self._key_dir(ticker, interval)
+        with self._locked(key_dir, exclusive=True):
+            count = self._bar_count(key_dir)
+            if count == 0: return 0
+            meta = self._read_meta(key_dir)
+            start_ns = self._to_utc_ns(start, meta)
+            if start_ns >= self._covered_from(key_dir, count, meta): return 0
+            if self.offline:
+                raise BarRangeError(f"Bar-Speicher für {ticker} ({interval}) beginnt bei {pd.Timestamp(self._covered_from(key_dir, count, meta), unit='ns')}, "
+                                    f"angefordert ab {pd.Timestamp(start_ns, unit='ns')}; offline kein Nachladen möglich.")
+
+            import yfinance as yf
+            first = pd.Timestamp(int(self._timestamps(key_dir, count)[0]), unit='ns')
+            data = yf.download(ticker, start=pd.Timestamp(start_ns, unit='ns').strftime('%Y-%m-%d'), end=(first + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+                               interval=interval, progress=False, auto_adjust=False, timeout=timeout)
+            added = 0
+            if data is not None and not data.empty:
+                if isinstance(data.columns, pd.MultiIndex):
+                    data.columns = data.columns.get_level_values(0)
+                added = self._prepend_bars(key_dir, data)
+            self._mark_covered(key_dir, start_ns)
+            return added
+
+    # --- Lesen ---
+    def _timestamps(self, key_dir, count):
+        return np.memmap(os.path.join(key_dir, 'timestamps.i8'), dtype=np.int64, mode='r', shape=(count,))
+
+    def read_arrays(self, ticker, interval="1d", start=None, end=None):
+        # Liefert Zero-Copy-Slices (np.memmap) für den Zeitraum [start, end]
+        key_dir = self._key_dir(ticker, interval)
+        with self._locked(key_dir, exclusive=False):
+            count = self._bar_count(key_dir)
+            if count == 0: return None
+            meta = self._read_meta(key_dir)
+            timestamps = self._timestamps(key_dir, count)
+            columns = {column: np.memmap(os.path.join(key_dir, _column_filename(column)), dtype=np.float64, mode='r', shape=(count,))
+                       for column in BAR_COLUMNS}
+        lo = 0 if start is None else int(np.searchsorted(timestamps, self._to_utc_ns(start, meta), side='left'))
+        hi = count if end is None else int(np.searchsorted(timestamps, self._to_utc_ns(end, meta), side='right'))
+        return {'timestamps': timestamps[lo:hi], 'columns': {column: values[lo:hi] for column, values in columns.items()}, 'meta': meta}
+
+    @staticmethod
+    def _to_utc_ns(value, meta):
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None: timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        elif meta.get('tz'): timestamp = timestamp.tz_localize(meta['tz']).tz_convert('UTC').tz_localize(None)
+        return timestamp.value
+
+    def read_frame(self, ticker, interval="1d", start=None, end=None, period=None, timeout=10):
+        if period is not None and start is None:
+            arrays = self.read_arrays(ticker, interval)
+            if arrays is None or len(arrays['timestamps']) == 0: return None
+            offset = period_to_offset(period)
+            if offset is not None:
+                last = pd.Timestamp(int(arrays['timestamps'][-1]), unit='ns')
+                if arrays['meta'].get('tz'): last = last.tz_localize('UTC')
+                start = last - offset
+        if start is not None:
+            # Nicht stillschweigend auf den gespeicherten Bereich kürzen: fehlende Historie nachladen (offline: BarRangeError)
+            self.backfill(ticker, interval, start, timeout=timeout)
+        arrays = self.read_arrays(ticker, interval, start, end)
+        if arrays is None or len(arrays['timestamps']) == 0: return None
+        meta = arrays['meta']
+        index = pd.DatetimeIndex(np.asarray(arrays['timestamps']).astype('datetime64[ns]'), name=meta.get('index_name', 'Date'))
+        if meta.get('tz'): index = index.tz_localize('UTC').tz_convert(meta['tz'])
+        return pd.DataFrame({column: np.array(values) for column, values in arrays['columns'].items()}, index=index)
+
+_default_store = None
+
+def get_default_store():
+    # Aktiv, sobald BAR_STORE_DIR (oder ein Fixture-Verzeichnis) konfiguriert ist
+    global _default_store
+    root = os.environ.get('BAR_STORE_DIR')
+    fixture_dir = os.environ.get('BAR_STORE_FIXTURE_DIR')
+    if not root and not fixture_dir: return None
+    if _default_store is None:
+        # Reiner Fixture-Betrieb: frischer temporärer Speicher pro Prozess, damit Läufe reproduzierbar bleiben
+        _default_store = BarStore(root or tempfile.mkdtemp(prefix='krypto-bars-'), fixture_dir=fixture_dir,
+                                  offline=os.environ.get('BAR_STORE_OFFLINE', '1' if fixture_dir and not root else '0') == '1',
+                                  initial_period=os.environ.get('BAR_STORE_INITIAL_PERIOD', '2y'),
+                                  sync_interval_seconds=float(os.environ.get('BAR_STORE_SYNC_SECONDS', 300)))
+    return _default_store
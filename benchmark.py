@@ -0,0 +1,181 @@
+# benchmark.py - Offline-Benchmarks für die Signal-Pipeline (Fixtures + lokale SQLite-DB, kein Netzwerk)
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BASE_DIR, 'fixtures')
+THRESHOLDS_PATH = os.path.join(BASE_DIR, 'benchmark_thresholds.json')
+BUNDLED_ARTIFACTS = ['trained_btc_model.joblib', 'trained_gold_model.joblib', 'btc_scaler.joblib', 'gold_scaler.joblib']
+
+def configure_offline_environment(work_dir):
+    # Muss vor dem Import von app/backtester passieren: DB, Bar-Speicher und Asset-Register zeigen auf lokale Dateien
+    from asset_registry import load_assets
+    from quote_client import start_stub_quote_server
+    assets = load_assets()
+    # Binance/FMP werden durch einen lokalen Stub-Server ersetzt, damit der Quote-Client mitgemessen wird
+    _, quote_url = start_stub_quote_server({asset["quote"]["symbol"]: 100.0 for asset in assets if asset["quote"]})
+    registry_path = os.path.join(work_dir, 'assets.json')
+    with open(registry_path, 'w', encoding='utf-8') as f: json.dump(assets, f)
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}",
+        'ASSET_REGISTRY_PATH': registry_path,
+        'BAR_STORE_DIR': os.path.join(work_dir, 'bars'),
+        'BAR_STORE_FIXTURE_DIR': FIXTURE_DIR,
+        'BAR_STORE_OFFLINE': '1',
+        'ARTIFACT_CACHE_DIR': os.path.join(work_dir, 'artifacts'),
+        'SHARED_CACHE_DIR': os.path.join(work_dir, 'shared'),
+        'SIGNAL_REFRESHER_ENABLED': '0',
+        'MODEL_POLL_SECONDS': '0',
+        'NOTIFICATION_BACKEND': 'fake',
+        'BINANCE_API_URL': quote_url,
+        'FMP_API_URL': quote_url,
+    })
+    return assets
+
+def measure(func, repeats, warmup=1):
+    for _ in range(warmup): func()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    return {"runs": repeats, "median_ms": round(statistics.median(durations), 3), "min_ms": round(durations[0], 3),
+            "p95_ms": round(durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))], 3)}
+
+def seed_models(app_module, assets, raw_frames):
+    # Die mitgelieferten *.joblib-Dateien sind 5-Feature-Klassifikatoren; für die Regressions-Pipeline
+    # werden die Level-Modelle einmalig aus den Fixtures trainiert und wie in der Pipeline gepackt gespeichert.
+    from train_model import train_asset
+    with app_module.app.app_context():
+        for asset in assets:
+            result = train_asset(asset, raw_frames[asset["ticker"]], 'multi', n_jobs=1)
+            for name, packed_artifact in result["artifacts"].items():
+                app_module.db.session.add(app_module.TrainedModel(name=name, data=packed_artifact))
+        app_module.db.session.commit()
+    app_module.models.refresh()
+
+def run_benchmarks(assets, repeats, train_repeats):
+    import data_manager
+    from data_manager import download_historical_data
+    from feature_engineer import add_features_to_data, create_regression_targets
+    from train_model import train_regression_model
+    from artifact_store import pack_artifact, unpack_artifact
+    import joblib
+
+    raw_frames = {asset["ticker"]: download_historical_data(asset["ticker"], period="2y") for asset in assets}
+    missing = [ticker for ticker, frame in raw_frames.items() if frame is None]
+    if missing: raise SystemExit(f"Fixtures fehlen für: {', '.join(missing)} (in {FIXTURE_DIR})")
+
+    import app as app_module
+    import backtester
+    seed_models(app_module, assets, raw_frames)
+
+    primary = assets[0]
+    raw = raw_frames[primary["ticker"]]
+    featured = add_features_to_data(raw)
+    final_data = create_regression_targets(featured)
+    client = app_module.app.test_client()
+
+    results = {}
+    results["add_features_to_data"] = measure(lambda: add_features_to_data(raw), repeats)
+    results["create_regression_targets"] = measure(lambda: create_regression_targets(featured), repeats)
+    results["train_regression_model"] = measure(lambda: train_regression_model(final_data, 'future_7d_low', n_jobs=1), train_repeats, warmup=0)
+    results["run_backtest_simulation"] = measure(lambda: backtester.run_backtest_simulation(primary["ticker"], primary["prefix"]), max(1, repeats // 5))
+
+    bundled = [name for name in BUNDLED_ARTIFACTS if os.path.exists(os.path.join(BASE_DIR, name))]
+    if bundled:
+        blobs = [pack_artifact(name, joblib.load(os.path.join(BASE_DIR, name))) for name in bundled]
+        results["artifact_unpack"] = measure(lambda: [unpack_artifact(blob) for blob in blobs], repeats)
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200: raise RuntimeError(f"{url} -> HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def signals_cold():
+        # Snapshot, Feature-Cache, Live-Zustände und geteilte Features verwerfen: misst Bars, Features, Scaler und Forest im Request
+        app_module.signal_snapshot = None
+        app_module.feature_cache.invalidate()
+        app_module.live_feature_states.clear()
+        data_manager.live_buffers.clear()
+        if app_module.shared_cache: app_module.shared_cache.invalidate('features-')
+        get('/get_signals')
+
+    def chart_cold():
+        app_module.payload_cache.invalidate()
+        get(f"/get_chart_data/{primary['ticker']}")
+
+    results["get_signals_cold"] = measure(signals_cold, repeats)
+    results["get_signals_warm"] = measure(lambda: get('/get_signals'), repeats * 5)
+    results["get_chart_data_cold"] = measure(chart_cold, repeats)
+    results["get_chart_data_warm"] = measure(lambda: get(f"/get_chart_data/{primary['ticker']}"), repeats * 5)
+    return results
+
+def check_thresholds(results, thresholds, baseline=None, tolerance=1.25):
+    failures = []
+    for name, limit in thresholds.items():
+        if name not in results: continue
+        if results[name]["median_ms"] > limit["max_median_ms"]:
+            failures.append(f"{name}: Median {results[name]['median_ms']:.2f} ms > Grenze {limit['max_median_ms']} ms")
+    for name, previous in (baseline or {}).items():
+        if name in results and results[name]["median_ms"] > previous["median_ms"] * tolerance:
+            failures.append(f"{name}: Median {results[name]['median_ms']:.2f} ms > {tolerance:g}x Baseline ({previous['median_ms']:.2f} ms)")
+    return failures
+
+def record_fixtures(assets, period="2y"):
+    # Einmalig mit Netzwerk: echte Bars per yfinance als CSV-Fixtures ablegen
+    import re
+    import yfinance as yf
+    import pandas as pd
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for asset in assets:
+        data = yf.download(asset["ticker"], period=period, interval="1d", progress=False, auto_adjust=False)
+        if isinstance(data.columns, pd.MultiIndex): data.columns = data.columns.get_level_values(0)
+        path = os.path.join(FIXTURE_DIR, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', asset['ticker'])}_1d.csv")
+        data.to_csv(path)
+        print(f"{asset['ticker']}: {len(data)} Bars -> {path}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline-Benchmarks für Features, Training, Backtest und API")
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--train-repeats', type=int, default=3)
+    parser.add_argument('--output', help="Ergebnisse zusätzlich als JSON-Datei schreiben")
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--baseline', help="Frühere Ergebnis-Datei; Verlangsamungen über --tolerance schlagen fehl")
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--record', action='store_true', help="Fixtures per yfinance neu aufzeichnen (braucht Netzwerk)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BASE_DIR)
+    if args.record:
+        from asset_registry import load_assets
+        record_fixtures(load_assets()); sys.exit(0)
+
+    work_dir = tempfile.mkdtemp(prefix='krypto-bench-')
+    try:
+        assets = configure_offline_environment(work_dir)
+        results = run_benchmarks(assets, args.repeats, args.train_repeats)
+
+        with open(args.thresholds, encoding='utf-8') as f: thresholds = json.load(f)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f: baseline = json.load(f)["results"]
+        failures = check_thresholds(results, thresholds, baseline, args.tolerance)
+        report = {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                  "repeats": args.repeats, "results": results, "failures": failures}
+        output = json.dumps(report, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f: f.write(output)
+        sys.exit(1 if failures else 0)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,9 +1,98 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
 import yfinance as yf
+import numpy as np
 import pandas as pd
 
-def download_historical_data(ticker_symbol, period="1y", interval="1d"):
+from bar_store import get_default_store
+from metrics import timed
+
+class TTLCache:
+    # Kleiner In-Process-Cache mit Ablaufzeit, LRU-Verdrängung und Single-Flight:
+    # gleichzeitige Misses für denselben Schlüssel lösen nur einen Ladevorgang aus.
+    def __init__(self, ttl_seconds=900, max_entries=64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+                is_leader = True
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock: self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            # Fehlgeschlagene Ladevorgänge (None) werden nicht gecacht
+            if value is not None:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None: self._entries.clear()
+            else: self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced, "evictions": self.evictions, "ttl_seconds": self.ttl_seconds}
+
+ohlcv_cache = TTLCache(ttl_seconds=int(os.environ.get('OHLCV_CACHE_TTL_SECONDS', 900)),
+                       max_entries=int(os.environ.get('OHLCV_CACHE_MAX_ENTRIES', 64)))
+
+def _read_from_bar_store(store, ticker_symbol, period, interval, timeout):
     try:
-        data = yf.download(ticker_symbol, period=period, interval=interval, progress=False, auto_adjust=False)
+        with timed('bar_store_sync'): store.sync(ticker_symbol, interval=interval, timeout=timeout)
+    except Exception as e:
+        print(f"Fehler bei Sync des Bar-Speichers für {ticker_symbol}, nutze vorhandene Daten: {e}")
+    with timed('bar_store_read'): data = store.read_frame(ticker_symbol, interval=interval, period=period, timeout=timeout)
+    if data is None or data.empty:
+        print(f"Keine Daten für {ticker_symbol} gefunden.")
+        return None
+    return data
+
+def download_historical_data(ticker_symbol, period="1y", interval="1d", timeout=10):
+    # Mit BAR_STORE_DIR/BAR_STORE_FIXTURE_DIR kommen die Bars aus dem lokalen Speicher (inkrementeller Sync)
+    store = get_default_store()
+    if store is not None: return _read_from_bar_store(store, ticker_symbol, period, interval, timeout)
+    try:
+        with timed('yfinance_download'):
+            data = yf.download(ticker_symbol, period=period, interval=interval, progress=False, auto_adjust=False, timeout=timeout)
         if data.empty:
             print(f"Keine Daten für {ticker_symbol} gefunden.")
             return None
@@ -12,4 +101,80 @@ def download_historical_data(ticker_symbol, period="1y", interval="1d"):
         return data
     except Exception as e:
         print(f"Fehler bei Daten-Download für {ticker_symbol}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def download_historical_data_cached(ticker_symbol, period="1y", interval="1d"):
+    data = ohlcv_cache.get_or_load((ticker_symbol, period, interval),
+                                   lambda: download_historical_data(ticker_symbol, period=period, interval=interval))
+    # Kopie zurückgeben, damit Aufrufer den gecachten Frame nicht verändern
+    return data.copy() if data is not None else None
+
+class LiveBarBuffer:
+    # Ringpuffer fester Größe für die jüngsten Bars eines (Ticker, Intervall): neue Bars werden angehängt,
+    # ein aktualisierter laufender Bar überschreibt seinen Platz. Der Speicher wächst nie über `capacity` Bars.
+    def __init__(self, capacity, columns=('Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume')):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self._values = np.full((capacity, len(self.columns)), np.nan)
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._start = 0
+        self._size = 0
+        self.tz = None
+        self.index_name = 'Date'
+        self._lock = threading.Lock()
+
+    def __len__(self): return self._size
+
+    @property
+    def last_timestamp(self):
+        return int(self._timestamps[(self._start + self._size - 1) % self.capacity]) if self._size else None
+
+    def extend(self, frame):
+        # Liefert False, wenn zwischen Puffer und neuen Bars eine Lücke liegt (dann muss neu befüllt werden)
+        if frame is None or frame.empty: return True
+        index = frame.index
+        timestamps = (index.tz_convert('UTC') if index.tz is not None else index).asi8
+        with self._lock:
+            last = self.last_timestamp
+            if last is not None and timestamps[0] > last: return False
+            if self._size == 0: self.tz, self.index_name = index.tz, index.name or 'Date'
+            values = frame.reindex(columns=self.columns).to_numpy(dtype=np.float64)
+            keep = timestamps >= last if last is not None else np.ones(len(timestamps), dtype=bool)
+            for timestamp, row in zip(timestamps[keep], values[keep]):
+                if timestamp == self.last_timestamp: position = (self._start + self._size - 1) % self.capacity
+                elif self._size < self.capacity: position = (self._start + self._size) % self.capacity; self._size += 1
+                else: position = self._start; self._start = (self._start + 1) % self.capacity
+                self._values[position], self._timestamps[position] = row, timestamp
+        return True
+
+    def reset(self):
+        with self._lock: self._start, self._size = 0, 0
+
+    def to_frame(self):
+        with self._lock:
+            order = (self._start + np.arange(self._size)) % self.capacity
+            values, timestamps = self._values[order].copy(), self._timestamps[order].copy()
+        index = pd.DatetimeIndex(timestamps.astype('datetime64[ns]'), name=self.index_name)
+        if self.tz is not None: index = index.tz_localize('UTC').tz_convert(self.tz)
+        return pd.DataFrame(values, index=index, columns=self.columns)
+
+live_buffers = {}
+live_buffers_lock = threading.Lock()
+
+def download_live_bars(ticker_symbol, interval, capacity, live_period, refresh_period):
+    # Live-Bars über einen Ringpuffer: nach dem ersten vollen Download wird nur noch das kurze
+    # refresh_period nachgeladen. Bei Lücken (z. B. nach längerer Pause) wird der Puffer neu befüllt.
+    with live_buffers_lock:
+        buffer = live_buffers.get((ticker_symbol, interval))
+        if buffer is None or buffer.capacity != capacity:
+            buffer = live_buffers[(ticker_symbol, interval)] = LiveBarBuffer(capacity)
+    if len(buffer):
+        recent = download_historical_data_cached(ticker_symbol, period=refresh_period, interval=interval)
+        if recent is None: return buffer.to_frame()
+        if buffer.extend(recent): return buffer.to_frame()
+        print(f"Lücke im Live-Puffer für {ticker_symbol} ({interval}), lade {live_period} neu.")
+        buffer.reset()
+    data = download_historical_data_cached(ticker_symbol, period=live_period, interval=interval)
+    if data is None: return None
+    buffer.extend(data.iloc[-capacity:])
+    return buffer.to_frame()
\ No newline at end of file
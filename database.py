@@ -1,7 +1,7 @@
 # lib/database.py (Finale Version mit Backtest-Tabelle)
 
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import LargeBinary, func, DateTime, String, Integer, Float # Importiere zusätzliche Typen
+from sqlalchemy import LargeBinary, func, DateTime, String, Integer, Float, Text, Boolean, Index, inspect, text # Importiere zusätzliche Typen
 
 db = SQLAlchemy()
 
@@ -17,6 +17,9 @@ class Settings(db.Model):
     btc_sl_multiplier = db.Column(Float, default=1.5)
     gold_entry_threshold = db.Column(Float, default=5.0)
     gold_sl_multiplier = db.Column(Float, default=1.5)
+    # Zeilenversion: wird bei jedem UPDATE erhöht, laufende App-Worker prüfen nur diese Spalte
+    version = db.Column(Integer, nullable=True, default=1)
+    __mapper_args__ = {'version_id_col': version}
 
 class TrainedModel(db.Model):
     __tablename__ = 'trained_model'
@@ -34,7 +37,47 @@ class Device(db.Model):
 # NEU: Die Tabelle für unsere Backtest-Ergebnisse
 class BacktestResult(db.Model):
     __tablename__ = 'backtest_result'
+    __table_args__ = (Index('ix_backtest_result_asset_run_date', 'asset_name', 'run_id', 'date'),)
     id = db.Column(Integer, primary_key=True)
     asset_name = db.Column(String(50), nullable=False)
     date = db.Column(DateTime, nullable=False)
-    balance = db.Column(Float, nullable=False)
\ No newline at end of file
+    balance = db.Column(Float, nullable=False)
+    run_id = db.Column(Integer, nullable=True)  # NULL = Altbestand vor der Einführung von Backtest-Läufen
+
+# Ein Backtest-Lauf pro Asset und Sweep; die Kurve wird angehängt und danach per is_active umgeschaltet
+class BacktestRun(db.Model):
+    __tablename__ = 'backtest_run'
+    id = db.Column(Integer, primary_key=True)
+    asset_name = db.Column(String(50), nullable=False, index=True)
+    entry_threshold = db.Column(Float)
+    sl_multiplier = db.Column(Float)
+    final_balance = db.Column(Float)
+    is_active = db.Column(Boolean, nullable=False, default=False)
+    timestamp = db.Column(DateTime, server_default=func.now())
+
+# Versionierte Signal-Snapshots (Einstieg/TP/SL pro Asset), geschrieben vom Refresher in app.py
+class SignalSnapshot(db.Model):
+    __tablename__ = 'signal_snapshot'
+    id = db.Column(Integer, primary_key=True)
+    version = db.Column(Integer, unique=True, nullable=False)
+    payload = db.Column(Text, nullable=False)
+    timestamp = db.Column(DateTime, server_default=func.now())
+
+def upgrade_schema(engine, tables):
+    # db.create_all() legt nur fehlende Tabellen an; neue (nullable) Spalten und Indizes
+    # bestehender Tabellen werden hier nachgezogen
+    inspector = inspect(engine)
+    for table in tables:
+        if not inspector.has_table(table.name): continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing_columns and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    # Bestehende Zeilen bekommen den Standardwert (z. B. Settings.version, sonst scheitert das versionierte UPDATE)
+                    if column.default is not None and column.default.is_scalar:
+                        connection.execute(text(f'UPDATE {table.name} SET {column.name} = :value WHERE {column.name} IS NULL'), {'value': column.default.arg})
+                    print(f"Spalte {table.name}.{column.name} ergänzt.")
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
\ No newline at end of file
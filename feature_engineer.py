@@ -1,8 +1,15 @@
+import math
+import sys
+from collections import deque
+
 import pandas as pd
 import numpy as np
 import pandas_ta as ta
 
-def add_features_to_data(data):
+from metrics import timed
+
+@timed('add_features')
+def add_features_to_data(data, dtype=None):
     if data is None or data.empty: return None
     if not all(c in data.columns for c in ['High', 'Low', 'Close', 'Adj Close']):
         print("FEHLER: Notwendige Spalten für Feature-Erstellung nicht gefunden.")
@@ -24,12 +31,228 @@ def add_features_to_data(data):
         df[f'RSI_14_lag_{i}'] = df['RSI_14'].shift(i)
 
     df.dropna(inplace=True)
+    # Intraday-Frames (20-100x mehr Bars) werden als float32 gehalten, um den Speicher zu halbieren
+    if dtype is not None: df = df.astype(dtype)
     return df
 
-def create_regression_targets(data, future_days=7):
+def create_regression_targets(data, future_days=7, horizon_bars=None):
+    # horizon_bars: Horizont in Bars des Intervalls (z.B. 168 bei 1h); die Spaltennamen bleiben future_7d_*
     if data is None: return None
     df = data.copy()
-    df[f'future_{future_days}d_low'] = df['Low'].iloc[::-1].rolling(window=future_days).min().iloc[::-1].shift(-future_days)
-    df[f'future_{future_days}d_high'] = df['High'].iloc[::-1].rolling(window=future_days).max().iloc[::-1].shift(-future_days)
+    window = horizon_bars or future_days
+    df[f'future_{future_days}d_low'] = df['Low'].iloc[::-1].rolling(window=window).min().iloc[::-1].shift(-window)
+    df[f'future_{future_days}d_high'] = df['High'].iloc[::-1].rolling(window=window).max().iloc[::-1].shift(-window)
     df.dropna(inplace=True)
-    return df
\ No newline at end of file
+    return df
+
+def target_lookahead_bars(future_days=7, horizon_bars=None):
+    # Ziel in Zeile i = Min/Max der Bars i+w .. i+2w-1 (rolling über w, dann shift(-w)): die letzte Bar liegt 2w-1 voraus
+    window = horizon_bars or future_days
+    return 2 * window - 1
+
+
+# --- Inkrementelle Feature-Berechnung ---
+# Die Zustandsklassen bilden die Rechenschritte von pandas (rolling().mean(), ewm().mean())
+# und pandas_ta (rma, ema mit SMA-Start) Schritt für Schritt nach, damit ein neuer Bar in O(1)
+# dieselben Werte liefert wie add_features_to_data über die gesamte Historie.
+
+class _RollingMeanState:
+    # Entspricht pandas roll_mean (Kahan-Summation mit getrennter Kompensation für Add/Remove)
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs, self.neg_ct = 0, 0
+        self.sum_x, self.compensation_add, self.compensation_remove = 0.0, 0.0, 0.0
+        self.num_consecutive_same_value, self.prev_value = 0, math.nan
+
+    def update(self, value):
+        self.values.append(value)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(value)
+        if self.nobs < self.window or self.nobs == 0: return math.nan
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs: result = self.prev_value
+        elif self.neg_ct == 0 and result < 0: result = 0.0
+        elif self.neg_ct == self.nobs and result > 0: result = 0.0
+        return result
+
+    def _add(self, value):
+        if value != value: return
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0: self.neg_ct += 1
+        if value == self.prev_value: self.num_consecutive_same_value += 1
+        else: self.num_consecutive_same_value = 1
+        self.prev_value = value
+
+    def _remove(self, value):
+        if value != value: return
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0: self.neg_ct -= 1
+
+    def snapshot(self):
+        # Skalare plus der Wert, den das nächste update() vorne aus dem Fenster schiebt
+        return (len(self.values), self.values[0] if self.values else None, self.nobs, self.neg_ct, self.sum_x,
+                self.compensation_add, self.compensation_remove, self.num_consecutive_same_value, self.prev_value)
+
+    def restore(self, snapshot):
+        length, first, *scalars = snapshot
+        self.values.pop()
+        if len(self.values) < length: self.values.appendleft(first)
+        (self.nobs, self.neg_ct, self.sum_x, self.compensation_add, self.compensation_remove,
+         self.num_consecutive_same_value, self.prev_value) = scalars
+
+class _EWMState:
+    # Entspricht pandas ewm(...).mean() mit ignore_na=False
+    def __init__(self, alpha, adjust, min_periods=0):
+        self.new_wt = 1.0 if adjust else alpha
+        self.old_wt_factor = 1.0 - alpha
+        self.adjust = adjust
+        self.min_periods = max(min_periods, 1)
+        self.weighted = math.nan
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, value):
+        is_observation = value == value
+        self.nobs += is_observation
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                if self.weighted != value:
+                    self.weighted = self.old_wt * self.weighted + self.new_wt * value
+                    self.weighted /= (self.old_wt + self.new_wt)
+                if self.adjust: self.old_wt += self.new_wt
+                else: self.old_wt = 1.0
+        elif is_observation:
+            self.weighted = value
+        return self.weighted if self.nobs >= self.min_periods else math.nan
+
+    def snapshot(self):
+        return self.weighted, self.old_wt, self.nobs
+
+    def restore(self, snapshot):
+        self.weighted, self.old_wt, self.nobs = snapshot
+
+class _RMAState(_EWMState):
+    # pandas_ta rma: ewm(alpha=1/length, min_periods=length), adjust=True
+    def __init__(self, length):
+        super().__init__(alpha=1.0 / length, adjust=True, min_periods=length)
+
+class _EMAState:
+    # pandas_ta ema: die ersten `length` Werte werden zum SMA-Startwert, danach ewm(span=length, adjust=False)
+    def __init__(self, length):
+        self.length = length
+        self.seed_values = []
+        self.ewm = _EWMState(alpha=2.0 / (length + 1), adjust=False)
+
+    def update(self, value):
+        if self.seed_values is not None:
+            self.seed_values.append(value)
+            if len(self.seed_values) < self.length: return self.ewm.update(math.nan)
+            seed = np.asarray(self.seed_values, dtype=float)
+            value = float(np.nansum(seed) / np.count_nonzero(~np.isnan(seed)))
+            self.seed_values = None
+        return self.ewm.update(value)
+
+    def snapshot(self):
+        return self.seed_values, len(self.seed_values) if self.seed_values is not None else 0, self.ewm.snapshot()
+
+    def restore(self, snapshot):
+        seed_values, length, ewm = snapshot
+        if seed_values is not None: del seed_values[length:]
+        self.seed_values = seed_values
+        self.ewm.restore(ewm)
+
+class IncrementalFeatureState:
+    # Hält den Rolling-/EMA-Zustand aller Feature-Spalten und aktualisiert sie pro neuem OHLCV-Bar in O(1)
+    def __init__(self):
+        self.prev_price, self.prev_close = math.nan, math.nan
+        self.sma_10, self.sma_50 = _RollingMeanState(10), _RollingMeanState(50)
+        self.rsi_positive, self.rsi_negative = _RMAState(14), _RMAState(14)
+        self.macd_fast, self.macd_slow = _EMAState(12), _EMAState(26)
+        self.macd_signal = None
+        self.atr = _RMAState(14)
+        self.return_lags, self.rsi_lags = deque([math.nan] * 3, maxlen=3), deque([math.nan] * 3, maxlen=3)
+        self.last_timestamp = None
+        self.bars_seen = 0
+        self._before_last_update = None
+
+    @classmethod
+    def from_data(cls, data):
+        state = cls()
+        records = data.to_dict(orient='records')
+        for row in records[:-1]:
+            state.update(row)
+        if records: state.update(records[-1], data.index[-1])
+        return state
+
+    def _states(self):
+        return self.sma_10, self.sma_50, self.rsi_positive, self.rsi_negative, self.macd_fast, self.macd_slow, self.atr
+
+    def _snapshot(self):
+        # Nur was ein update() verändert: Skalare, die Fensterzustände und die Werte, die aus den Lag-Deques fallen
+        return (self.prev_price, self.prev_close, self.last_timestamp, self.bars_seen, self.return_lags[0], self.rsi_lags[0],
+                self.macd_signal, self.macd_signal.snapshot() if self.macd_signal is not None else None,
+                [state.snapshot() for state in self._states()])
+
+    def _restore(self, snapshot):
+        (self.prev_price, self.prev_close, self.last_timestamp, self.bars_seen, return_lag, rsi_lag,
+         self.macd_signal, macd_signal, states) = snapshot
+        self.return_lags.pop(); self.return_lags.appendleft(return_lag)
+        self.rsi_lags.pop(); self.rsi_lags.appendleft(rsi_lag)
+        if self.macd_signal is not None: self.macd_signal.restore(macd_signal)
+        for state, state_snapshot in zip(self._states(), states): state.restore(state_snapshot)
+
+    def update(self, row, timestamp=None):
+        # Gleicher Zeitstempel wie zuletzt = der laufende Bar wurde aktualisiert: vorherigen Zustand wiederherstellen
+        if timestamp is not None and timestamp == self.last_timestamp and self._before_last_update is not None:
+            self._restore(self._before_last_update)
+        self._before_last_update = None
+        if timestamp is not None: self._before_last_update = self._snapshot()
+
+        price, high, low, close = float(row['Adj Close']), float(row['High']), float(row['Low']), float(row['Close'])
+        daily_return = price / self.prev_price - 1 if self.prev_price == self.prev_price else math.nan
+
+        sma_10, sma_50 = self.sma_10.update(price), self.sma_50.update(price)
+
+        change = price - self.prev_price
+        rsi_positive = self.rsi_positive.update(max(change, 0.0) if change == change else math.nan)
+        rsi_negative = self.rsi_negative.update(min(change, 0.0) if change == change else math.nan)
+        # Flache Kurse: 0/0 ergibt wie in pandas_ta NaN statt ZeroDivisionError
+        rsi_denominator = rsi_positive + abs(rsi_negative)
+        rsi = 100 * rsi_positive / rsi_denominator if rsi_denominator != 0 else math.nan
+
+        macd = self.macd_fast.update(price) - self.macd_slow.update(price)
+        if self.macd_signal is None and macd == macd: self.macd_signal = _EMAState(9)
+        macd_signal = self.macd_signal.update(macd) if self.macd_signal is not None else math.nan
+
+        high_low_range = high - low
+        if high_low_range == 0: high_low_range += sys.float_info.epsilon
+        true_range = max(abs(high_low_range), abs(high - self.prev_close), abs(self.prev_close - low)) if self.prev_close == self.prev_close else math.nan
+        atr = self.atr.update(true_range)
+
+        features = {
+            'daily_return': daily_return, 'SMA_10': sma_10, 'SMA_50': sma_50, 'sma_signal': 1 if sma_10 > sma_50 else 0,
+            'RSI_14': rsi, 'MACD_12_26_9': macd, 'MACDh_12_26_9': macd - macd_signal, 'MACDs_12_26_9': macd_signal, 'ATRr_14': atr,
+        }
+        for i in range(1, 4):
+            features[f'daily_return_lag_{i}'] = self.return_lags[-i]
+            features[f'RSI_14_lag_{i}'] = self.rsi_lags[-i]
+
+        self.return_lags.append(daily_return); self.rsi_lags.append(rsi)
+        self.prev_price, self.prev_close = price, close
+        self.last_timestamp = timestamp
+        self.bars_seen += 1
+
+        # Wie dropna() in add_features_to_data: unvollständige Zeilen liefern kein Feature-Set
+        if any(v != v for v in features.values()) or any(isinstance(v, float) and v != v for v in row.values()): return None
+        return features
\ No newline at end of file
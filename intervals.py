@@ -0,0 +1,27 @@
+import os
+
+# Einstellungen pro Bar-Intervall. Indikatoren (SMA 10/50, RSI 14, ...) rechnen weiterhin in Bars,
+# der Zielhorizont bleibt "7 Tage" und wird in Bars des Intervalls umgerechnet.
+# yfinance liefert 1h-Bars höchstens 730 Tage und 15m-Bars höchstens 60 Tage zurück.
+# date_unit: Genauigkeit der Zeitstempel in Chart-/Backtest-Antworten (Intraday mit Uhrzeit).
+INTERVAL_PROFILES = {
+    '1d': {'training_period': '2y', 'live_period': '3mo', 'live_refresh_period': '5d', 'chart_period': '6mo', 'date_unit': 'D',
+           'live_buffer_bars': 256, 'target_horizon_bars': 7, 'feature_dtype': 'float64', 'forest_params': {}},
+    '1h': {'training_period': '730d', 'live_period': '30d', 'live_refresh_period': '2d', 'chart_period': '30d', 'date_unit': 'm',
+           'live_buffer_bars': 1024, 'target_horizon_bars': 7 * 24, 'feature_dtype': 'float32',
+           'forest_params': {'min_samples_leaf': 5, 'max_samples': 0.5}},
+    '15m': {'training_period': '60d', 'live_period': '10d', 'live_refresh_period': '1d', 'chart_period': '5d', 'date_unit': 'm',
+            'live_buffer_bars': 2048, 'target_horizon_bars': 7 * 24 * 4, 'feature_dtype': 'float32',
+            'forest_params': {'min_samples_leaf': 10, 'max_samples': 0.5, 'max_depth': 24}},
+}
+DEFAULT_INTERVAL = '1d'
+SIGNAL_INTERVAL = os.environ.get('SIGNAL_INTERVAL', DEFAULT_INTERVAL)
+
+def get_interval_profile(interval=DEFAULT_INTERVAL):
+    if interval not in INTERVAL_PROFILES:
+        raise ValueError(f"Nicht unterstütztes Intervall '{interval}' (erlaubt: {', '.join(INTERVAL_PROFILES)}).")
+    return dict(INTERVAL_PROFILES[interval], interval=interval)
+
+def interval_prefix(prefix, interval=DEFAULT_INTERVAL):
+    # Tagesmodelle behalten ihre bisherigen Namen, Intraday-Modelle bekommen das Intervall als Suffix (btc_1h_...)
+    return prefix if interval == DEFAULT_INTERVAL else f"{prefix}_{interval}"
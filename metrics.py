@@ -0,0 +1,135 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Prozessweite Latenz-Histogramme und Zähler für die teuren Stufen (Download, Features, Scaler, Forest,
+# Upstream-Preise, DB). Ausgabe im Prometheus-Textformat über /metrics; zusätzlich werden die Zeiten
+# eines Requests für den Server-Timing-Header gesammelt.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self, prefix='krypto'):
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None: histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            with self._lock: timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timed(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc('stage_errors_total', stage=stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {key: (h.buckets, list(h.counts), h.total, h.count) for key, h in self._histograms.items()}
+            return histograms, dict(self._counters)
+
+    def render_prometheus(self):
+        histograms, counters = self.snapshot()
+        lines = [f"# TYPE {self.prefix}_stage_seconds histogram"]
+        for (stage, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            base_labels = [('stage', stage)] + list(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.prefix}_stage_seconds_bucket{_format_labels(base_labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.prefix}_stage_seconds_sum{_format_labels(base_labels)} {total!r}")
+            lines.append(f"{self.prefix}_stage_seconds_count{_format_labels(base_labels)} {count}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name: lines.append(f"{self.prefix}_{name}{_format_labels(list(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        histograms, _ = self.snapshot()
+        totals = {}
+        for (stage, _), (_, _, total, count) in histograms.items():
+            stage_total, stage_count = totals.get(stage, (0.0, 0))
+            totals[stage] = (stage_total + total, stage_count + count)
+        return "\n".join(f"{stage:<24} {count:>6}x  {total:>9.3f}s  (Ø {total / count * 1000:.1f} ms)"
+                         for stage, (total, count) in sorted(totals.items(), key=lambda item: -item[1][0]) if count)
+
+def _format_labels(labels):
+    if not labels: return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+metrics = MetricsRegistry()
+timed = metrics.timed
+
+# --- Zeiten pro Request (Server-Timing) ---
+def start_request_timings():
+    return _request_timings.set({})
+
+def finish_request_timings(token):
+    timings = _request_timings.get()
+    _request_timings.reset(token)
+    return timings or {}
+
+def format_server_timing(timings, total_seconds=None):
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    if total_seconds is not None: entries.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    # Thread-Pools übernehmen den contextvars-Kontext nicht automatisch; so landen die Zeiten im Request
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+# --- SQLAlchemy ---
+def instrument_engine(engine):
+    from sqlalchemy import event
+    if getattr(engine, '_krypto_metrics', False): return
+    engine._krypto_metrics = True
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_start'].pop()
+        metrics.observe('db_query', time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start'): conn.info['query_start'].pop()
+        metrics.inc('db_query_errors_total')
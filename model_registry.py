@@ -0,0 +1,125 @@
+import threading
+
+from sqlalchemy import func
+
+from artifact_store import LazyArtifact
+
+class ArtifactView:
+    # Unveränderliche Sicht auf einen Registry-Stand; Artefakte werden erst beim Zugriff geladen
+    def __init__(self, handles):
+        self._handles = handles
+
+    def __getitem__(self, name): return self._handles[name].get()
+    def __contains__(self, name): return name in self._handles
+    def __len__(self): return len(self._handles)
+    def __iter__(self): return iter(self._handles)
+    def get(self, name, default=None): return self[name] if name in self._handles else default
+    def keys(self): return self._handles.keys()
+
+class ArtifactRegistry:
+    # Versionierte Sicht auf die TrainedModel-Tabelle: pollt nur (name, timestamp, Größe),
+    # tauscht bei Änderungen die Artefakt-Handles atomar aus und lädt Artefakte erst bei Bedarf.
+    def __init__(self, app, db, model_class, poll_seconds=60, on_change=None, cache_dir=None, share=None):
+        self.app = app
+        self.db = db
+        self.model_class = model_class
+        self.poll_seconds = poll_seconds
+        self.on_change = on_change
+        self.cache_dir = cache_dir
+        self.share = share
+        self._view = ArtifactView({})
+        self._versions = {}
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._once_lock = threading.Lock()
+        self._once_running = False
+        self._once_pending = False
+        self.reloads = 0
+
+    # --- Lesender Zugriff (immer auf dem aktuell gültigen Snapshot) ---
+    def snapshot(self):
+        return self._view
+
+    def __getitem__(self, name): return self._view[name]
+    def __contains__(self, name): return name in self._view
+    def __len__(self): return len(self._view)
+    def get(self, name, default=None): return self._view.get(name, default)
+    def keys(self): return self._view.keys()
+
+    def versions(self):
+        return {name: str(version[0]) for name, version in self._versions.items()}
+
+    def manifests(self):
+        return {name: handle.manifest for name, handle in self._view._handles.items() if handle.loaded}
+
+    # --- Aktualisierung ---
+    def _load_versions(self):
+        m = self.model_class
+        rows = self.db.session.query(m.name, m.timestamp, func.length(m.data)).all()
+        return {name: (timestamp, size) for name, timestamp, size in rows}
+
+    def _fetch_blob(self, name):
+        with self.app.app_context():
+            return self.db.session.query(self.model_class.data).filter_by(name=name).scalar()
+
+    def refresh(self):
+        with self._refresh_lock, self.app.app_context():
+            versions = self._load_versions()
+            handles = self._view._handles
+            changed = [name for name, version in versions.items() if self._versions.get(name) != version]
+            removed = [name for name in handles if name not in versions]
+            if not changed and not removed: return []
+
+            initial_load = not self._versions
+            new_handles = {name: handle for name, handle in handles.items() if name not in removed}
+            for name in changed:
+                new_handles[name] = LazyArtifact(name, versions[name], self._fetch_blob, self.cache_dir, self.share)
+            # Bereits benutzte Artefakte werden vor dem Austausch vorgeladen, damit kein Request die Ladezeit trägt
+            for name in changed:
+                if name in handles and handles[name].loaded: new_handles[name].get()
+            # Atomarer Austausch: laufende Requests behalten ihren bisherigen Snapshot
+            self._view = ArtifactView(new_handles)
+            self._versions = {name: version for name, version in versions.items() if name in new_handles}
+            self.reloads += 1
+
+        updated = sorted(changed) + sorted(removed)
+        print(f"Artefakte aktualisiert ({len(changed)} neu/geändert, {len(removed)} entfernt): {', '.join(updated)}")
+        if self.on_change and not initial_load: self.on_change(updated)
+        return updated
+
+    def request_refresh(self):
+        if self._thread is not None: self._wakeup.set(); return
+        # Ohne Polling höchstens ein Nachlade-Thread: Anfragen während eines Laufs werden zu genau einem weiteren Durchgang zusammengefasst
+        with self._once_lock:
+            self._once_pending = True
+            if self._once_running: return
+            self._once_running = True
+        threading.Thread(target=self._refresh_once_loop, name="artifact-registry-once", daemon=True).start()
+
+    def _refresh_once_loop(self):
+        while True:
+            with self._once_lock:
+                if not self._once_pending:
+                    self._once_running = False
+                    return
+                self._once_pending = False
+            self._refresh_logged()
+
+    def _refresh_logged(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"FEHLER beim Nachladen der Artefakte: {e}")
+
+    def _poll_loop(self):
+        while True:
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            self._refresh_logged()
+
+    def start_polling(self):
+        if self._thread is None and self.poll_seconds > 0:
+            self._thread = threading.Thread(target=self._poll_loop, name="artifact-registry", daemon=True)
+            self._thread.start()
+        return self._thread
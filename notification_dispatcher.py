@@ -0,0 +1,132 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# FCM erlaubt höchstens 500 Tokens pro Multicast-Nachricht
+FCM_MAX_TOKENS_PER_BATCH = 500
+
+# Ergebnis pro Token: 'ok', 'invalid' (Token löschen), 'retry' (vorübergehender Fehler) oder 'failed' (Nachricht abgelehnt, nicht wiederholen)
+TOKEN_OK, TOKEN_INVALID, TOKEN_RETRY, TOKEN_FAILED = 'ok', 'invalid', 'retry', 'failed'
+
+class FirebaseMessagingBackend:
+    # Versand über firebase_admin.messaging; liefert den Status pro Token in Eingabereihenfolge
+    def send_batch(self, title, body, tokens):
+        from firebase_admin import messaging, exceptions
+        message = messaging.MulticastMessage(notification=messaging.Notification(title=title, body=body), tokens=tokens)
+        send = getattr(messaging, 'send_each_for_multicast', None) or messaging.send_multicast
+        response = send(message)
+        return [TOKEN_OK if r.success else self._classify(r.exception, messaging, exceptions) for r in response.responses]
+
+    @staticmethod
+    def _classify(error, messaging, exceptions):
+        # Nur diese Fehler besagen, dass das Token selbst nicht mehr gültig ist
+        if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)): return TOKEN_INVALID
+        # INVALID_ARGUMENT betrifft meist die Nachricht (Payload, Größe): nichts löschen, außer der Fehler nennt das Token
+        if isinstance(error, exceptions.InvalidArgumentError):
+            return TOKEN_INVALID if 'registration token' in str(error).lower() else TOKEN_FAILED
+        return TOKEN_RETRY
+
+class FakeMessagingBackend:
+    # Lokales Backend für Tests: merkt sich alle Batches, simuliert Latenz, ungültige Tokens und Ausfälle
+    def __init__(self, invalid_tokens=(), flaky_tokens=(), failing_batches=0, latency_seconds=0.0):
+        self.invalid_tokens = set(invalid_tokens)
+        self.flaky_tokens = set(flaky_tokens)
+        self.failing_batches = failing_batches
+        self.latency_seconds = latency_seconds
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def send_batch(self, title, body, tokens):
+        if len(tokens) > FCM_MAX_TOKENS_PER_BATCH: raise ValueError(f"Zu viele Tokens in einem Batch: {len(tokens)}")
+        if self.latency_seconds: time.sleep(self.latency_seconds)
+        with self._lock:
+            if self.failing_batches > 0:
+                self.failing_batches -= 1
+                raise ConnectionError("Simulierter Ausfall des Messaging-Backends")
+            self.batches.append((title, body, list(tokens)))
+            results = []
+            for token in tokens:
+                if token in self.invalid_tokens: results.append(TOKEN_INVALID)
+                elif token in self.flaky_tokens: self.flaky_tokens.discard(token); results.append(TOKEN_RETRY)
+                else: results.append(TOKEN_OK)
+        return results
+
+class NotificationDispatcher:
+    # Sendet Token-Batches parallel, wiederholt vorübergehende Fehler mit exponentiellem Backoff
+    # und sammelt ungültige Tokens, damit sie aus der Device-Tabelle entfernt werden können.
+    def __init__(self, backend, max_workers=4, max_retries=3, backoff_seconds=0.5, max_in_flight=None):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_in_flight = max_in_flight or max_workers * 2
+
+    def _send_with_retry(self, title, body, tokens):
+        sent, failed, invalid, pending = 0, 0, [], list(tokens)
+        for attempt in range(self.max_retries + 1):
+            if attempt: time.sleep(self.backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random() * 0.25))
+            try:
+                results = self.backend.send_batch(title, body, pending)
+            except Exception as e:
+                print(f"Fehler beim Senden eines Batches ({len(pending)} Tokens, Versuch {attempt + 1}): {e}")
+                continue
+            retry = []
+            for token, status in zip(pending, results):
+                if status == TOKEN_OK: sent += 1
+                elif status == TOKEN_INVALID: invalid.append(token)
+                elif status == TOKEN_FAILED: failed += 1
+                else: retry.append(token)
+            pending = retry
+            if not pending: break
+        return sent, invalid, failed + len(pending)
+
+    def dispatch(self, title, body, token_batches):
+        # token_batches wird im aufrufenden Thread gelesen (DB-Session), nur der Versand läuft parallel
+        stats = {"sent": 0, "failed": 0, "invalid_tokens": [], "batches": 0}
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        lock = threading.Lock()
+        start_time = time.perf_counter()
+
+        def send(tokens):
+            try:
+                sent, invalid, failed = self._send_with_retry(title, body, tokens)
+                with lock:
+                    stats["sent"] += sent; stats["failed"] += failed; stats["invalid_tokens"].extend(invalid)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fcm") as executor:
+            for tokens in token_batches:
+                if not tokens: continue
+                slots.acquire()
+                stats["batches"] += 1
+                executor.submit(send, tokens)
+
+        stats["elapsed_seconds"] = time.perf_counter() - start_time
+        stats["per_second"] = stats["sent"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] > 0 else 0.0
+        return stats
+
+def iter_token_batches(session, device_class, batch_size=FCM_MAX_TOKENS_PER_BATCH):
+    # Keyset-Paginierung über die Device-Tabelle: es liegen nie alle Tokens gleichzeitig im Speicher
+    batch_size = min(batch_size, FCM_MAX_TOKENS_PER_BATCH)
+    last_id = 0
+    while True:
+        rows = session.query(device_class.id, device_class.fcm_token).filter(device_class.id > last_id).order_by(device_class.id).limit(batch_size).all()
+        if not rows: return
+        last_id = rows[-1][0]
+        yield [token for _, token in rows]
+
+def prune_invalid_tokens(session, device_class, tokens, chunk_size=500):
+    removed = 0
+    for i in range(0, len(tokens), chunk_size):
+        removed += session.query(device_class).filter(device_class.fcm_token.in_(tokens[i:i + chunk_size])).delete(synchronize_session=False)
+    session.commit()
+    return removed
+
+def create_dispatcher_from_env(environ):
+    # NOTIFICATION_BACKEND=fake schaltet auf das lokale Test-Backend um
+    backend = FakeMessagingBackend() if environ.get('NOTIFICATION_BACKEND') == 'fake' else FirebaseMessagingBackend()
+    return NotificationDispatcher(backend, max_workers=int(environ.get('NOTIFICATION_WORKERS', 4)),
+                                  max_retries=int(environ.get('NOTIFICATION_MAX_RETRIES', 3)),
+                                  backoff_seconds=float(environ.get('NOTIFICATION_BACKOFF_SECONDS', 0.5)))
@@ -0,0 +1,147 @@
+# portfolio_backtester.py - Portfolio-Backtest mit gemeinsamem Kapital über alle Assets
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backtester import app, db, prepare_backtest_inputs, prepare_walk_forward_inputs, save_backtest_run
+from database import Settings, BacktestResult, BacktestRun, upgrade_schema
+from asset_registry import load_assets
+from walk_forward import add_walk_forward_arguments, walk_forward_options
+from intervals import DEFAULT_INTERVAL
+
+DEFAULT_ENTRY_THRESHOLD = 5.0
+DEFAULT_SL_MULTIPLIER = 1.5
+PORTFOLIO_ASSET_NAME = 'PORTFOLIO'
+
+def align_assets(inputs_by_asset):
+    # Alle Assets auf einen gemeinsamen Datumsindex; fehlende Bars (z.B. Wochenenden bei Gold) sind NaN
+    fields = ['open', 'high', 'low', 'atr', 'pred_low', 'pred_high']
+    frames = {field: {} for field in fields + ['close']}
+    for name, inputs in inputs_by_asset.items():
+        for field, values in zip(fields, inputs['arrays']):
+            frames[field][name] = pd.Series(values, index=inputs['index'])
+        frames['close'][name] = pd.Series(inputs['close'], index=inputs['index'])
+    aligned = {field: pd.DataFrame(series) for field, series in frames.items()}
+    index = aligned['open'].index.sort_values()
+    aligned = {field: frame.reindex(index) for field, frame in aligned.items()}
+
+    valid = aligned['open'].notna().to_numpy()
+    # Entscheidungen nutzen die Werte des vorherigen Bars desselben Assets (wie im Einzel-Backtest)
+    previous = {field: aligned[field].ffill().shift(1).to_numpy(dtype=float) for field in ('pred_low', 'pred_high', 'atr')}
+    return {'index': index, 'assets': list(inputs_by_asset), 'valid': valid,
+            'open': aligned['open'].to_numpy(dtype=float), 'high': aligned['high'].to_numpy(dtype=float),
+            'low': aligned['low'].to_numpy(dtype=float), 'close': aligned['close'].ffill().fillna(0.0).to_numpy(dtype=float),
+            'prev_pred_low': previous['pred_low'], 'prev_pred_high': previous['pred_high'], 'prev_atr': previous['atr']}
+
+def simulate_portfolio(aligned, entry_thresholds, sl_multipliers, initial_capital=100.0,
+                       position_fraction=1.0, max_positions=None, fee_percent=0.0):
+    # Zeitschritte laufen sequenziell, alle Assets eines Schritts werden gemeinsam als Vektor ausgewertet
+    opens, highs, lows, closes, valid = aligned['open'], aligned['high'], aligned['low'], aligned['close'], aligned['valid']
+    prev_low, prev_high, prev_atr = aligned['prev_pred_low'], aligned['prev_pred_high'], aligned['prev_atr']
+    n_steps, n_assets = opens.shape
+    entry_thresholds = np.broadcast_to(np.asarray(entry_thresholds, dtype=float), (n_assets,))
+    sl_multipliers = np.broadcast_to(np.asarray(sl_multipliers, dtype=float), (n_assets,))
+    max_positions = max_positions or n_assets
+    fee = fee_percent / 100.0
+
+    # Vorab für alle Schritte: erwartete Spanne und Einstiegssignal aus dem vorherigen Bar
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected_move = np.where(prev_low > 0, (prev_high / prev_low - 1) * 100, -np.inf)
+    signals = valid & (expected_move > entry_thresholds) & np.isfinite(opens)
+    stop_levels = prev_low - prev_atr * sl_multipliers
+
+    cash = float(initial_capital)
+    units = np.zeros(n_assets)
+    in_position = np.zeros(n_assets, dtype=bool)
+    take_profit, stop_loss = np.zeros(n_assets), np.zeros(n_assets)
+    equity = np.empty(max(n_steps - 1, 0))
+    trades = 0
+
+    for t in range(1, n_steps):
+        # 1) Ausstiege auf Bar t: erst Stop-Loss, dann Take-Profit
+        if in_position.any():
+            hit_stop = in_position & (lows[t] <= stop_loss)
+            hit_take = in_position & ~hit_stop & (highs[t] >= take_profit)
+            exit_price = np.where(hit_stop, stop_loss, take_profit)
+            closing = hit_stop | hit_take
+            if closing.any():
+                cash += float(np.sum(units[closing] * exit_price[closing])) * (1 - fee)
+                units[closing] = 0.0
+                in_position &= ~closing
+
+        # 2) Einstiege zum Eröffnungskurs von Bar t, Größe als Anteil am aktuellen Portfolio-Wert
+        candidates = np.flatnonzero(signals[t] & ~in_position)
+        free_slots = max_positions - int(in_position.sum())
+        if len(candidates) and free_slots > 0 and cash > 0:
+            candidates = candidates[np.argsort(-expected_move[t, candidates], kind='stable')][:free_slots]
+            portfolio_value = cash + float(np.sum(units * np.where(valid[t], opens[t], closes[t - 1])))
+            allocations = np.full(len(candidates), portfolio_value * position_fraction)
+            spent_before = np.cumsum(allocations) - allocations
+            allocations = np.clip(cash - spent_before, 0.0, allocations)
+            candidates, allocations = candidates[allocations > 0], allocations[allocations > 0]
+            units[candidates] = allocations * (1 - fee) / opens[t, candidates]
+            take_profit[candidates] = prev_high[t, candidates]
+            stop_loss[candidates] = stop_levels[t, candidates]
+            in_position[candidates] = True
+            cash -= float(allocations.sum())
+            trades += len(candidates)
+
+        equity[t - 1] = cash + float(np.sum(units * closes[t]))
+
+    final_value = cash + float(np.sum(units * closes[-1])) if n_steps else cash
+    return {'dates': aligned['index'][:-1], 'equity': equity, 'final_value': final_value, 'cash': cash, 'trades': trades,
+            'open_positions': [aligned['assets'][i] for i in np.flatnonzero(in_position)]}
+
+def thresholds_from_settings(assets, settings):
+    # Spalten wie btc_entry_threshold / gold_sl_multiplier; Assets ohne eigene Spalte nutzen die Standardwerte
+    entry = [getattr(settings, f"{asset['prefix']}_entry_threshold", None) if settings else None for asset in assets]
+    stop = [getattr(settings, f"{asset['prefix']}_sl_multiplier", None) if settings else None for asset in assets]
+    return ([DEFAULT_ENTRY_THRESHOLD if value is None else value for value in entry],
+            [DEFAULT_SL_MULTIPLIER if value is None else value for value in stop])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Portfolio-Backtest mit gemeinsamem Kapital und Parametern aus Settings")
+    parser.add_argument('--capital', type=float, default=100.0)
+    parser.add_argument('--position-fraction', type=float, default=0.5, help="Anteil des Portfolio-Werts pro neuer Position")
+    parser.add_argument('--max-positions', type=int, default=None)
+    parser.add_argument('--fee-percent', type=float, default=0.0)
+    parser.add_argument('--save', action='store_true', help=f"Kurve als '{PORTFOLIO_ASSET_NAME}' in der DB speichern")
+    parser.add_argument('--walk-forward', action='store_true')
+    parser.add_argument('--interval', default=DEFAULT_INTERVAL)
+    add_walk_forward_arguments(parser)
+    args = parser.parse_args()
+
+    assets = load_assets()
+    with app.app_context():
+        # Ältere Datenbanken zuerst auf das aktuelle Schema heben (u.a. Settings.version), dann lesen
+        db.create_all()
+        upgrade_schema(db.engine, [BacktestResult.__table__, BacktestRun.__table__, Settings.__table__])
+        settings = Settings.query.first()
+    entry_thresholds, sl_multipliers = thresholds_from_settings(assets, settings)
+
+    inputs_by_asset, used = {}, []
+    for asset, entry, stop in zip(assets, entry_thresholds, sl_multipliers):
+        if args.walk_forward: inputs = prepare_walk_forward_inputs(asset["ticker"], interval=args.interval, **walk_forward_options(args))
+        else: inputs = prepare_backtest_inputs(asset["ticker"], asset["prefix"], interval=args.interval)
+        if inputs is None: print(f"FEHLER: Keine Backtest-Daten für {asset['name']}, Asset wird übersprungen."); continue
+        inputs_by_asset[asset["name"]] = inputs; used.append((entry, stop))
+    if not inputs_by_asset: raise SystemExit("Keine Assets mit Backtest-Daten.")
+
+    start_time = time.perf_counter()
+    aligned = align_assets(inputs_by_asset)
+    result = simulate_portfolio(aligned, [entry for entry, _ in used], [stop for _, stop in used], args.capital,
+                                args.position_fraction, args.max_positions, args.fee_percent)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"\nPortfolio über {len(aligned['assets'])} Assets, {len(aligned['index'])} Bars in {elapsed:.3f}s")
+    for name, (entry, stop) in zip(aligned['assets'], used):
+        print(f"  {name}: Einstieg >{entry}% | SL {stop}x ATR")
+    print(f"Endwert: {result['final_value']:.2f} (Start {args.capital:.2f}), {result['trades']} Trades, offen: {', '.join(result['open_positions']) or '-'}")
+
+    if args.save:
+        with app.app_context():
+            run_id = save_backtest_run(PORTFOLIO_ASSET_NAME, result['dates'], result['equity'], final_balance=result['final_value'])
+        print(f"Portfolio-Kurve in DB gespeichert (Lauf {run_id}).")
@@ -0,0 +1,185 @@
+import time
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from data_manager import TTLCache
+from metrics import metrics, timed
+
+# Live-Kurse von Binance und FMP über einen gemeinsamen Client: Keep-Alive-Verbindungen aus einem Pool,
+# kurzes Zusammenfassen gleichzeitiger Abfragen, Token-Bucket pro Quelle (FMP-Kontingent), Circuit Breaker
+# und Rückfall auf den letzten bekannten Kurs. Basis-URLs sind per Umgebung auf einen lokalen Stub umstellbar.
+QUOTE_SOURCES = {
+    'binance': {'base_url': 'https://api.binance.com', 'url_env': 'BINANCE_API_URL', 'rate_env': 'BINANCE_RATE_PER_SECOND', 'rate': 10.0},
+    'fmp': {'base_url': 'https://financialmodelingprep.com', 'url_env': 'FMP_API_URL', 'rate_env': 'FMP_RATE_PER_SECOND', 'rate': 0.2},
+}
+
+class QuoteUnavailable(Exception):
+    pass
+
+class TokenBucket:
+    # Erlaubt im Mittel `rate_per_second` Abfragen, Spitzen bis `capacity`; Tokens werden reserviert, damit Wartende sich einreihen
+    def __init__(self, rate_per_second, capacity=None):
+        self.rate = rate_per_second
+        self.capacity = capacity or max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, max_wait_seconds=0.0):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > max_wait_seconds: return False
+            self._tokens -= 1
+        if wait: time.sleep(wait)
+        return True
+
+class CircuitBreaker:
+    # Nach `failure_threshold` Fehlern in Folge offen; nach `reset_seconds` darf genau eine Probe-Abfrage durch
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None: return 'closed'
+        return 'open' if time.monotonic() - self.opened_at < self.reset_seconds else 'half_open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None: return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._probing: return False
+            self._probing = True
+            return True
+
+    def release(self):
+        with self._lock: self._probing = False
+
+    def record_success(self):
+        with self._lock: self.failures, self.opened_at, self._probing = 0, None, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold: self.opened_at = time.monotonic()
+
+class QuoteClient:
+    def __init__(self, base_urls=None, rates=None, fmp_api_key=None, timeout=5.0, coalesce_seconds=2.0, max_stale_seconds=300.0,
+                 max_wait_seconds=0.5, pool_size=8, failure_threshold=5, reset_seconds=30.0):
+        self.base_urls = {source: (base_urls or {}).get(source) or config['base_url'] for source, config in QUOTE_SOURCES.items()}
+        self.fmp_api_key = fmp_api_key
+        self.timeout = timeout
+        self.max_stale_seconds = max_stale_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(QUOTE_SOURCES), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter); self.session.mount('http://', adapter)
+        self.buckets = {source: TokenBucket((rates or {}).get(source) or config['rate']) for source, config in QUOTE_SOURCES.items()}
+        self.breakers = {source: CircuitBreaker(failure_threshold, reset_seconds) for source in QUOTE_SOURCES}
+        # Gleichzeitige Abfragen desselben Symbols innerhalb von coalesce_seconds teilen sich einen Upstream-Aufruf
+        self.cache = TTLCache(ttl_seconds=coalesce_seconds, max_entries=256)
+        self._last_known = {}
+
+    def get_price(self, source, symbol):
+        if source not in QUOTE_SOURCES: raise ValueError(f"Unbekannte Kursquelle '{source}'.")
+        return self.cache.get_or_load((source, symbol), lambda: self._fetch_or_fallback(source, symbol))
+
+    def _request(self, source, symbol):
+        base_url = self.base_urls[source]
+        if source == 'binance':
+            response = self.session.get(f"{base_url}/api/v3/ticker/price", params={'symbol': symbol}, timeout=self.timeout)
+            response.raise_for_status()
+            return float(response.json()['price'])
+        response = self.session.get(f"{base_url}/api/v3/quote/{symbol}", params={'apikey': self.fmp_api_key}, timeout=self.timeout)
+        response.raise_for_status()
+        return float(response.json()[0]['price'])
+
+    def _fetch_or_fallback(self, source, symbol):
+        breaker = self.breakers[source]
+        if not breaker.allow(): return self._fallback(source, symbol, "Circuit Breaker offen")
+        if not self.buckets[source].try_acquire(self.max_wait_seconds):
+            breaker.release()
+            metrics.inc('quote_rate_limited', source=source)
+            return self._fallback(source, symbol, "Ratenlimit erreicht")
+        try:
+            with timed('upstream_price', source=source): price = self._request(source, symbol)
+        except Exception as e:
+            breaker.record_failure()
+            metrics.inc('quote_errors', source=source)
+            return self._fallback(source, symbol, e)
+        breaker.record_success()
+        self._last_known[(source, symbol)] = (price, time.time())
+        return price
+
+    def _fallback(self, source, symbol, reason):
+        last = self._last_known.get((source, symbol))
+        if last is None or time.time() - last[1] > self.max_stale_seconds:
+            raise QuoteUnavailable(f"Kein Kurs für {symbol} ({source}): {reason}")
+        metrics.inc('quote_fallbacks', source=source)
+        return last[0]
+
+    def stats(self):
+        now = time.time()
+        return {"coalescing": self.cache.stats(),
+                "breakers": {source: {"state": breaker.state, "failures": breaker.failures} for source, breaker in self.breakers.items()},
+                "last_known_age_seconds": {f"{source}:{symbol}": round(now - fetched_at, 1) for (source, symbol), (_, fetched_at) in self._last_known.items()}}
+
+def create_quote_client_from_env(environ):
+    return QuoteClient(base_urls={source: environ.get(config['url_env']) for source, config in QUOTE_SOURCES.items()},
+                       rates={source: float(environ[config['rate_env']]) for source, config in QUOTE_SOURCES.items() if environ.get(config['rate_env'])},
+                       fmp_api_key=environ.get('FMP_API_KEY'),
+                       timeout=float(environ.get('UPSTREAM_TIMEOUT_SECONDS', 5)),
+                       coalesce_seconds=float(environ.get('QUOTE_COALESCE_SECONDS', 2)),
+                       max_stale_seconds=float(environ.get('QUOTE_MAX_STALE_SECONDS', 300)),
+                       max_wait_seconds=float(environ.get('QUOTE_MAX_WAIT_SECONDS', 0.5)),
+                       pool_size=int(environ.get('QUOTE_POOL_SIZE', 8)),
+                       failure_threshold=int(environ.get('QUOTE_BREAKER_FAILURES', 5)),
+                       reset_seconds=float(environ.get('QUOTE_BREAKER_RESET_SECONDS', 30)))
+
+# --- Lokaler Stub-Server (Tests/Benchmarks): beantwortet Binance- und FMP-Kursabfragen aus einem Dict ---
+class _StubQuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock: server.requests += 1
+        if server.latency_seconds: time.sleep(server.latency_seconds)
+        parsed = urlparse(self.path)
+        if parsed.path == '/api/v3/ticker/price':
+            symbol = parse_qs(parsed.query).get('symbol', [''])[0]
+            payload = {'symbol': symbol, 'price': str(server.prices.get(symbol))}
+        elif parsed.path.startswith('/api/v3/quote/'):
+            symbol = parsed.path.rsplit('/', 1)[-1]
+            payload = [{'symbol': symbol, 'price': server.prices.get(symbol)}]
+        else:
+            symbol = None
+        status = 503 if server.failing else 404 if symbol not in server.prices else 200
+        body = json.dumps(payload if status == 200 else {'error': status}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_quote_server(prices, latency_seconds=0.0, host='127.0.0.1', port=0):
+    server = ThreadingHTTPServer((host, port), _StubQuoteHandler)
+    server.daemon_threads = True
+    server.prices, server.latency_seconds, server.failing = dict(prices), latency_seconds, False
+    server.requests, server.lock = 0, threading.Lock()
+    threading.Thread(target=server.serve_forever, name="stub-quotes", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 import json
-import pickle
 import requests
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -9,11 +9,16 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import LargeBinary, func
 import firebase_admin
-from firebase_admin import credentials, messaging
+from firebase_admin import credentials
 
 from data_manager import download_historical_data
-from feature_engineer import add_features_to_data, create_regression_targets
-from train_model import train_regression_model, FEATURES_LIST
+from train_model import train_asset, has_level_models, predict_price_levels
+from artifact_store import unpack_artifact
+from asset_registry import load_assets
+from notification_dispatcher import FirebaseMessagingBackend, create_dispatcher_from_env, iter_token_batches, prune_invalid_tokens
+from metrics import metrics, instrument_engine
+from database import upgrade_schema
+from intervals import DEFAULT_INTERVAL, SIGNAL_INTERVAL, get_interval_profile, interval_prefix
 
 app = Flask(__name__)
 
@@ -40,26 +45,23 @@ db = SQLAlchemy(app)
 
 class Settings(db.Model):
     id=db.Column(db.Integer, primary_key=True); update_interval_minutes=db.Column(db.Integer, default=15); last_btc_signal=db.Column(db.String(100), default='N/A'); last_gold_signal=db.Column(db.String(100), default='N/A')
+    version=db.Column(db.Integer, nullable=True, default=1); __mapper_args__ = {'version_id_col': version}
 class TrainedModel(db.Model):
     id=db.Column(db.Integer, primary_key=True); name=db.Column(db.String(80), unique=True, nullable=False); data=db.Column(LargeBinary, nullable=False); timestamp=db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
 class Device(db.Model):
     id=db.Column(db.Integer, primary_key=True); fcm_token=db.Column(db.String(255), unique=True, nullable=False); timestamp=db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
 
-def save_artifact_to_db(name, artifact):
-    with app.app_context():
-        pickled_artifact = pickle.dumps(artifact)
-        existing_artifact = TrainedModel.query.filter_by(name=name).first()
-        if existing_artifact: existing_artifact.data = pickled_artifact
-        else: db.session.add(TrainedModel(name=name, data=pickled_artifact))
-        db.session.commit()
-        print(f"'{name}' in DB gespeichert/aktualisiert.")
+notification_dispatcher = create_dispatcher_from_env(os.environ)
 
-def send_notification(title, body, tokens):
-    if not firebase_admin._apps: print("Firebase nicht initialisiert, kann keine Nachricht senden."); return
+def send_notification(title, body):
+    # Tokens werden in 500er-Batches aus der DB gelesen und parallel verschickt; ungültige Tokens werden gelöscht
+    if isinstance(notification_dispatcher.backend, FirebaseMessagingBackend) and not firebase_admin._apps:
+        print("Firebase nicht initialisiert, kann keine Nachricht senden."); return
     try:
-        message = messaging.MulticastMessage(notification=messaging.Notification(title=title, body=body), tokens=tokens)
-        response = messaging.send_multicast(message)
-        print(f'{response.success_count} Nachrichten erfolgreich gesendet.')
+        stats = notification_dispatcher.dispatch(title, body, iter_token_batches(db.session, Device))
+        removed = prune_invalid_tokens(db.session, Device, stats["invalid_tokens"]) if stats["invalid_tokens"] else 0
+        print(f'{stats["sent"]} Nachrichten erfolgreich gesendet ({stats["batches"]} Batches, {stats["per_second"]:.0f}/s), '
+              f'{stats["failed"]} fehlgeschlagen, {removed} ungültige Tokens entfernt.')
     except Exception as e: print(f"Fehler beim Senden der Benachrichtigung: {e}")
 
 def trigger_web_service_redeploy():
@@ -70,45 +72,97 @@ def trigger_web_service_redeploy():
         print("Redeployment erfolgreich ausgelöst!")
     except Exception as e: print(f"Fehler beim Aufruf des Deploy Hooks: {e}")
 
-def run_full_pipeline():
-    print("Starte die vollständige Regressions-Trainings-Pipeline...")
+def notify_model_reload():
+    # Die Web-Instanzen pollen TrainedModel ohnehin; der Aufruf verkürzt nur die Wartezeit bis zum Nachladen
+    reload_url = os.environ.get('WEB_SERVICE_RELOAD_URL')
+    if not reload_url: print("Reload URL nicht gefunden, Web-Service lädt Modelle beim nächsten Poll."); return
+    try:
+        headers = {'X-Reload-Token': os.environ.get('MODEL_RELOAD_TOKEN', '')}
+        response = requests.post(reload_url, headers=headers, timeout=10)
+        print(f"Modell-Reload angestoßen (HTTP {response.status_code}).")
+    except Exception as e: print(f"Fehler beim Anstoßen des Modell-Reloads: {e}")
+
+# --- Parallele Trainings-Pipeline ---
+def save_packed_artifact_to_db(name, packed_artifact):
+    existing_artifact = TrainedModel.query.filter_by(name=name).first()
+    if existing_artifact: existing_artifact.data = packed_artifact
+    else: db.session.add(TrainedModel(name=name, data=packed_artifact))
+    print(f"'{name}' in DB gespeichert/aktualisiert ({len(packed_artifact) / 1024:.0f} KB).")
+
+def train_assets_in_parallel(assets, training_mode, period=None, max_workers=None, max_concurrent_downloads=4, interval=DEFAULT_INTERVAL):
+    period = period or get_interval_profile(interval)['training_period']
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(assets)))
+    n_jobs = max(1, (os.cpu_count() or 1) // max_workers)
+    results = {}
+    # Downloads begrenzt parallel (I/O), Training in Worker-Prozessen (CPU); jedes Asset startet, sobald seine Daten da sind
+    with ThreadPoolExecutor(max_workers=max_concurrent_downloads) as download_pool, ProcessPoolExecutor(max_workers=max_workers) as training_pool:
+        downloads = {download_pool.submit(download_historical_data, asset["ticker"], period, interval): asset for asset in assets}
+        trainings = {}
+        for future in as_completed(downloads):
+            asset = downloads[future]
+            raw_data = future.result()
+            if raw_data is None: print(f"FEHLER: Keine Daten für {asset['name']}."); continue
+            print(f"--- {asset['name']}: {len(raw_data)} Bars geladen, Training gestartet ---")
+            trainings[training_pool.submit(train_asset, asset, raw_data, training_mode, n_jobs, interval)] = asset
+        for future in as_completed(trainings):
+            asset = trainings[future]
+            try:
+                results[asset["name"]] = future.result()
+                print(f"--- {asset['name']}: Training abgeschlossen ---")
+            except Exception as e:
+                print(f"FEHLER beim Training von {asset['name']}: {e}")
+    return results
+
+def run_full_pipeline(training_mode=None, assets=None, interval=None):
+    training_mode = training_mode or os.environ.get('TRAINING_MODE', 'multi')
+    interval = interval or os.environ.get('TRAINING_INTERVAL', DEFAULT_INTERVAL)
+    get_interval_profile(interval)
+    assets = assets or load_assets()
+    print(f"Starte die vollständige Regressions-Trainings-Pipeline (Modus: {training_mode}, Intervall: {interval}, {len(assets)} Assets)...")
+    results = train_assets_in_parallel(assets, training_mode, interval=interval,
+                                       max_workers=int(os.environ['TRAINING_WORKERS']) if os.environ.get('TRAINING_WORKERS') else None,
+                                       max_concurrent_downloads=int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', 4)))
     with app.app_context():
+        instrument_engine(db.engine)
         db.create_all()
-        asset_map = {"BTC": {"ticker": "BTC-USD", "low_model_name": "btc_low_model", "high_model_name": "btc_high_model", "low_scaler_name": "btc_low_scaler", "high_scaler_name": "btc_high_scaler", "last_signal_key": "last_btc_signal"},
-                     "Gold": {"ticker": "GC=F", "low_model_name": "gold_low_model", "high_model_name": "gold_high_model", "low_scaler_name": "gold_low_scaler", "high_scaler_name": "gold_high_scaler", "last_signal_key": "last_gold_signal"}}
-        
-        for asset_name, details in asset_map.items():
-            print(f"\n--- Verarbeite {asset_name} ---")
-            final_data = create_regression_targets(add_features_to_data(download_historical_data(details["ticker"], "2y")))
-            if final_data is not None:
-                low_model, low_scaler = train_regression_model(final_data, 'future_7d_low')
-                if low_model and low_scaler: save_artifact_to_db(details["low_model_name"], low_model); save_artifact_to_db(details["low_scaler_name"], low_scaler)
-                high_model, high_scaler = train_regression_model(final_data, 'future_7d_high')
-                if high_model and high_scaler: save_artifact_to_db(details["high_model_name"], high_model); save_artifact_to_db(details["high_scaler_name"], high_scaler)
+        upgrade_schema(db.engine, [Settings.__table__])
+        for result in results.values():
+            for name in result["obsolete"]: TrainedModel.query.filter_by(name=name).delete()
+            for name, packed_artifact in result["artifacts"].items(): save_packed_artifact_to_db(name, packed_artifact)
+        db.session.commit()
         
         settings = Settings.query.first()
         if not settings: settings = Settings(); db.session.add(settings); db.session.commit()
-        device_tokens = [device.fcm_token for device in Device.query.all()]
-        artifacts = TrainedModel.query.all()
-        artifact_map = {artifact.name: pickle.loads(artifact.data) for artifact in artifacts}
-        for asset_name, details in asset_map.items():
-            low_model = artifact_map.get(details["low_model_name"]); high_model = artifact_map.get(details["high_model_name"])
-            low_scaler = artifact_map.get(details["low_scaler_name"]); high_scaler = artifact_map.get(details["high_scaler_name"])
-            if not all([low_model, high_model, low_scaler, high_scaler]): continue
-            live_featured_data = add_features_to_data(download_historical_data(details["ticker"]))
-            if live_featured_data is None or not all(col in live_featured_data.columns for col in FEATURES_LIST): continue
-            latest_features_df = live_featured_data[FEATURES_LIST].tail(1)
-            predicted_low = low_model.predict(low_scaler.transform(latest_features_df))[0]
-            predicted_high = high_model.predict(high_scaler.transform(latest_features_df))[0]
+        has_devices = db.session.query(Device.id).first() is not None
+        artifact_map = None
+        # Signale und Benachrichtigungen nur für das Intervall, das auch die App ausliefert
+        for asset in (assets if interval == SIGNAL_INTERVAL else []):
+            prefix = interval_prefix(asset["prefix"], interval)
+            result = results.get(asset["name"])
+            if result is None or result["latest_features"] is None: continue
+            prediction = result.get("prediction")
+            if prediction is None:
+                # Training fehlgeschlagen: mit den vorhandenen Artefakten aus der DB weiterarbeiten
+                if artifact_map is None: artifact_map = {artifact.name: unpack_artifact(artifact.data) for artifact in TrainedModel.query.all()}
+                if not has_level_models(artifact_map, prefix): continue
+                prediction = tuple(values[0] for values in predict_price_levels(artifact_map, prefix, result["latest_features"]))
+            predicted_low, predicted_high = prediction
             new_signal_text = f"Einstieg: {predicted_low:.2f}, TP: {predicted_high:.2f}"
-            last_signal = getattr(settings, details["last_signal_key"])
-            if new_signal_text != last_signal and device_tokens:
-                title = f"Neues Preis-Ziel: {asset_name}"; body = f"Neues Ziel: Einstieg ca. {predicted_low:.2f}, TP ca. {predicted_high:.2f}"
-                send_notification(title, body, device_tokens)
-                setattr(settings, details["last_signal_key"], new_signal_text); db.session.commit()
+            if not hasattr(settings, asset["last_signal_key"]):
+                print(f"WARNUNG: Settings hat kein Feld '{asset['last_signal_key']}', Signal für {asset['name']} wird nicht gespeichert."); continue
+            last_signal = getattr(settings, asset["last_signal_key"])
+            if new_signal_text != last_signal and has_devices:
+                title = f"Neues Preis-Ziel: {asset['name']}"; body = f"Neues Ziel: Einstieg ca. {predicted_low:.2f}, TP ca. {predicted_high:.2f}"
+                send_notification(title, body)
+                setattr(settings, asset["last_signal_key"], new_signal_text); db.session.commit()
     
-    trigger_web_service_redeploy()
+    # Hot Reload statt Redeploy; der Deploy Hook bleibt nur als expliziter Fallback (MODEL_HOT_RELOAD=0)
+    if os.environ.get('MODEL_HOT_RELOAD', '1') == '0': trigger_web_service_redeploy()
+    else: notify_model_reload()
     print("\n\nPipeline erfolgreich durchgelaufen!")
+    # Download/Training laufen in Worker-Prozessen; hier erscheinen nur die Zeiten des Hauptprozesses
+    print("\nZeiten pro Stufe:\n" + metrics.summary())
+
 
 if __name__ == '__main__':
     run_full_pipeline()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import gzip
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Spaltenorientierte Serialisierung von Zeitreihen (Datum + Wertspalten) für die Chart-/Backtest-Endpunkte.
+# Datumsformatierung und Wertkonvertierung laufen vektorisiert über NumPy, die fertigen Bodies werden
+# einmal kodiert (und gzip-komprimiert) und können so pro Datenversion gecacht werden.
+PAYLOAD_FORMATS = ('records', 'columns')
+GZIP_MIN_BYTES = 1024
+
+class SeriesQueryError(ValueError):
+    pass
+
+def parse_series_query(args):
+    # Query-Parameter: format=records|columns, start/end=YYYY-MM-DD, offset/limit für Paginierung
+    fmt = args.get('format', 'records')
+    if fmt not in PAYLOAD_FORMATS: raise SeriesQueryError(f"Unbekanntes Format '{fmt}' (erlaubt: {', '.join(PAYLOAD_FORMATS)}).")
+    try:
+        start = pd.Timestamp(args['start']).strftime('%Y-%m-%d') if args.get('start') else None
+        end = pd.Timestamp(args['end']).strftime('%Y-%m-%d') if args.get('end') else None
+    except ValueError as e:
+        raise SeriesQueryError(f"Ungültiges Datum: {e}")
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args['limit']) if args.get('limit') else None
+    except ValueError:
+        raise SeriesQueryError("offset und limit müssen ganze Zahlen sein.")
+    if offset < 0 or (limit is not None and limit < 0): raise SeriesQueryError("offset und limit dürfen nicht negativ sein.")
+    return {'format': fmt, 'start': start, 'end': end, 'offset': offset, 'limit': limit}
+
+def format_dates(dates, unit='D'):
+    # Datumsstrings für alle Zeilen auf einmal (statt strftime pro Zeile); unit='m' für Intraday (YYYY-MM-DDTHH:MM)
+    values = np.asarray(pd.DatetimeIndex(dates).tz_localize(None) if getattr(dates, 'tz', None) is not None else dates, dtype='datetime64[ns]')
+    return np.datetime_as_string(values, unit=unit)
+
+def slice_series(date_strings, query):
+    # ISO-Datumsstrings sind lexikographisch sortierbar -> Bereich per searchsorted.
+    # Das Ende schließt den ganzen Tag ein: '~' sortiert hinter jedem 'THH:MM'-Zusatz.
+    lo = 0 if query['start'] is None else int(np.searchsorted(date_strings, query['start'], side='left'))
+    hi = len(date_strings) if query['end'] is None else int(np.searchsorted(date_strings, query['end'] + '~', side='right'))
+    lo = min(lo + query['offset'], hi)
+    if query['limit'] is not None: hi = min(hi, lo + query['limit'])
+    return slice(lo, hi)
+
+def encode_series(date_key, date_strings, columns, query):
+    window = slice_series(date_strings, query)
+    dates = date_strings[window].tolist()
+    values = {name: np.asarray(column, dtype=float)[window].tolist() for name, column in columns.items()}
+    if query['format'] == 'columns':
+        document = dict({date_key: dates}, **values)
+    else:
+        names = [date_key] + list(values)
+        document = [dict(zip(names, row)) for row in zip(dates, *values.values())]
+    body = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    return {
+        'body': body,
+        'gzip': gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None,
+        'etag': hashlib.md5(body).hexdigest(),
+        'rows': len(dates),
+    }
+
+def query_cache_key(query):
+    return (query['format'], query['start'], query['end'], query['offset'], query['limit'])
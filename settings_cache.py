@@ -0,0 +1,126 @@
+import math
+import time
+import threading
+
+from sqlalchemy import Integer, Float, String, select
+from sqlalchemy.orm.exc import StaleDataError
+
+# Von außen nicht schreibbar: Primärschlüssel und Zeilenversion (wird von SQLAlchemy bei jedem UPDATE erhöht)
+READ_ONLY_COLUMNS = ('id', 'version')
+
+# Untergrenzen pro Feld: (Name bzw. Suffix, Minimum, Minimum erlaubt). Asset-Spalten werden über ihr Suffix erkannt,
+# weil sie aus dem Asset-Register kommen ({prefix}_entry_threshold, {prefix}_sl_multiplier).
+FIELD_BOUNDS = (
+    ('update_interval_minutes', 1, True),
+    ('_entry_threshold', 0, False),
+    ('_sl_multiplier', 0, False),
+)
+
+class SettingsValidationError(ValueError):
+    pass
+
+def _coerce(column, value):
+    if value is None:
+        if column.nullable: return None
+        raise SettingsValidationError(f"Feld '{column.name}' darf nicht leer sein.")
+    if isinstance(value, bool): raise SettingsValidationError(f"Feld '{column.name}': Wahrheitswert nicht erlaubt.")
+    if isinstance(column.type, Integer):
+        if isinstance(value, float) and value.is_integer(): value = int(value)
+        if not isinstance(value, int): raise SettingsValidationError(f"Feld '{column.name}' erwartet eine ganze Zahl.")
+        return value
+    if isinstance(column.type, Float):
+        if not isinstance(value, (int, float)) or not math.isfinite(value): raise SettingsValidationError(f"Feld '{column.name}' erwartet eine Zahl.")
+        return float(value)
+    if isinstance(column.type, String):
+        if not isinstance(value, str): raise SettingsValidationError(f"Feld '{column.name}' erwartet einen Text.")
+        if column.type.length and len(value) > column.type.length:
+            raise SettingsValidationError(f"Feld '{column.name}' ist länger als {column.type.length} Zeichen.")
+        return value
+    raise SettingsValidationError(f"Feld '{column.name}' kann nicht gesetzt werden.")
+
+def _check_bounds(name, value):
+    if value is None: return value
+    for suffix, minimum, inclusive in FIELD_BOUNDS:
+        if name.endswith(suffix) and (value < minimum or (not inclusive and value == minimum)):
+            raise SettingsValidationError(f"Feld '{name}' muss {'mindestens' if inclusive else 'größer als'} {minimum} sein.")
+    return value
+
+def validate_settings_update(table, data):
+    # Nur bekannte Spalten mit passendem Typ; alles andere wird abgelehnt statt still übernommen
+    if not isinstance(data, dict) or not data: raise SettingsValidationError("Erwartet ein nicht-leeres JSON-Objekt.")
+    columns = {column.name: column for column in table.columns if column.name not in READ_ONLY_COLUMNS}
+    unknown = sorted(set(data) - set(columns))
+    if unknown: raise SettingsValidationError(f"Unbekannte oder schreibgeschützte Felder: {', '.join(unknown)}")
+    return {name: _check_bounds(name, _coerce(columns[name], value)) for name, value in data.items()}
+
+class SettingsCache:
+    # Read-Through-Cache für die Settings-Zeile: pro Zugriff nur ein `SELECT version` (höchstens alle check_seconds).
+    # Die ganze Zeile wird erst neu gelesen, wenn ein anderer Worker, der Backtester oder die Pipeline sie geändert hat.
+    def __init__(self, app, db, model_class, check_seconds=0.0):
+        self.app = app
+        self.db = db
+        self.model_class = model_class
+        self.check_seconds = check_seconds
+        self._settings = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._engine = None
+        self.reloads = 0
+
+    def _values(self, settings):
+        return {column.name: getattr(settings, column.name) for column in settings.__table__.columns if column.name not in READ_ONLY_COLUMNS}
+
+    def _first_row(self):
+        settings = self.model_class.query.order_by(self.model_class.id).first()
+        if not settings:
+            settings = self.model_class()
+            self.db.session.add(settings)
+            self.db.session.commit()
+        return settings
+
+    def _store(self, version, values):
+        with self._lock:
+            # Ein parallel geladener älterer Stand darf einen neueren nicht überschreiben
+            if self._version is None or version is None or version >= self._version:
+                self._version, self._settings = version, values
+            self._checked_at = time.monotonic()
+
+    def _current_version(self):
+        # Direkt über die Engine statt über die ORM-Session: die Prüfung läuft bei jedem Zugriff
+        if self._engine is None:
+            with self.app.app_context(): self._engine = self.db.engine
+        table = self.model_class.__table__
+        with self._engine.connect() as connection:
+            return connection.execute(select(table.c.version).order_by(table.c.id).limit(1)).scalar()
+
+    def get(self):
+        if self._settings is not None and time.monotonic() - self._checked_at < self.check_seconds: return dict(self._settings)
+        version = self._current_version()
+        if self._settings is None or version is None or version != self._version:
+            with self.app.app_context():
+                settings = self._first_row()
+                self._store(settings.version, self._values(settings))
+            self.reloads += 1
+        else:
+            self._checked_at = time.monotonic()
+        return dict(self._settings)
+
+    def update(self, changes, max_attempts=3):
+        changes = validate_settings_update(self.model_class.__table__, changes)
+        for attempt in range(max_attempts):
+            with self.app.app_context():
+                try:
+                    settings = self._first_row()
+                    for name, value in changes.items(): setattr(settings, name, value)
+                    self.db.session.commit()
+                except StaleDataError:
+                    # Zeile wurde zwischen Lesen und Schreiben von jemand anderem geändert: Änderungen erneut anwenden
+                    self.db.session.rollback()
+                    continue
+                self._store(settings.version, self._values(settings))
+            return dict(self._settings)
+        raise RuntimeError(f"Settings konnten nach {max_attempts} Versuchen nicht gespeichert werden.")
+
+    def stats(self):
+        return {"version": self._version, "reloads": self.reloads, "check_seconds": self.check_seconds}
\ No newline at end of file
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from artifact_store import ensure_private_dir, version_digest
+from tree_engine import TREE_ENGINE_ENABLED, COMPILED_FORMAT, CompiledForest, SharedForest, is_compilable_forest
+from train_model import MultiTargetLevelModel
+
+# Prozessübergreifender Array-Cache: ein Eintrag ist ein Verzeichnis mit .npy-Dateien plus meta.json, ein
+# Zeiger <key>.json verweist auf die aktuelle Version. Geschrieben wird einmal (unter Dateisperre), gelesen
+# per np.load(mmap_mode='r'). Unter /dev/shm (tmpfs) teilen sich alle gunicorn-Worker dieselben Speicherseiten.
+_KEY_PATTERN = re.compile(r'[^A-Za-z0-9_.=-]')
+
+def default_shared_cache_dir():
+    # Pro Datenbank ein eigener Namensraum, damit sich z. B. Staging und Produktion auf einem Host nicht mischen
+    namespace = hashlib.sha1((os.environ.get('DATABASE_URL') or '').encode('utf-8')).hexdigest()[:8]
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f'krypto-shared-{namespace}')
+
+class SharedArrayCache:
+    def __init__(self, root, keep_versions=2):
+        self.root = root
+        self.keep_versions = keep_versions
+        self._loaded = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        # Geladene Arrays steuern die Baum-Traversierung: nur der eigene Benutzer darf hier Dateien ablegen
+        ensure_private_dir(root)
+
+    def _safe_key(self, key):
+        return _KEY_PATTERN.sub('_', key)
+
+    @contextmanager
+    def locked(self, key):
+        with open(os.path.join(self.root, f"{self._safe_key(key)}.lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try: yield
+            finally: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, key):
+        pointer_path = os.path.join(self.root, f"{self._safe_key(key)}.json")
+        try:
+            with open(pointer_path) as f: pointer = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        with self._lock:
+            entry = self._loaded.get(key)
+            if entry is not None and entry['version'] == pointer['version']: return entry
+        entry_dir = os.path.join(self.root, pointer['version'])
+        try:
+            arrays = {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='r') for name in pointer['arrays']}
+        except FileNotFoundError:
+            # Version wurde zwischenzeitlich aufgeräumt: beim nächsten Zugriff gilt der neue Zeiger
+            return None
+        entry = {'version': pointer['version'], 'arrays': arrays, 'meta': pointer['meta']}
+        with self._lock: self._loaded[key] = entry
+        return entry
+
+    def publish(self, key, arrays, meta):
+        safe_key = self._safe_key(key)
+        version = f"{safe_key}.{time.time_ns()}.{os.getpid()}"
+        tmp_dir = os.path.join(self.root, f".{version}.tmp")
+        os.makedirs(tmp_dir)
+        for name, values in arrays.items(): np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(values))
+        os.rename(tmp_dir, os.path.join(self.root, version))
+        pointer = {'version': version, 'arrays': list(arrays), 'meta': meta}
+        tmp_path = os.path.join(self.root, f".{version}.json.tmp")
+        with open(tmp_path, 'w') as f: json.dump(pointer, f)
+        os.replace(tmp_path, os.path.join(self.root, f"{safe_key}.json"))
+        # Alte Versionen löschen; Worker mit offenen mmap-Sichten behalten ihre Seiten bis zum Schließen
+        versions = sorted(name for name in os.listdir(self.root) if name.startswith(f"{safe_key}.") and not name.endswith(('.json', '.lock')))
+        for name in versions[:-self.keep_versions]: shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        return self.load(key)
+
+    def get_or_build(self, key, build, max_age_seconds=None):
+        # Nur ein Prozess baut einen fehlenden/abgelaufenen Eintrag, alle anderen warten an der Sperre und lesen ihn dann
+        def fresh(entry):
+            return entry is not None and (max_age_seconds is None or time.time() - entry['meta'].get('built_at', 0) < max_age_seconds)
+        entry = self.load(key)
+        if fresh(entry): self.hits += 1; return entry
+        with self.locked(key):
+            entry = self.load(key)
+            if fresh(entry): self.hits += 1; return entry
+            built = build()
+            if built is None: return None
+            arrays, meta = built
+            self.builds += 1
+            return self.publish(key, arrays, dict(meta, built_at=time.time()))
+
+    def discard_stale(self, prefix):
+        # Einträge früherer Versionen (z. B. nach neuem Training) aus dem tmpfs entfernen. Die keep_versions zuletzt
+        # veröffentlichten Schlüssel bleiben, sonst bauen Worker mit älterem Registry-Stand sich gegenseitig weg.
+        # Sperrdateien bleiben liegen: ein Prozess könnte gerade auf sie warten.
+        prefix = self._safe_key(prefix)
+        pointers = []
+        for name in os.listdir(self.root):
+            if not name.startswith(prefix) or not name.endswith('.json'): continue
+            try: pointers.append((os.stat(os.path.join(self.root, name)).st_mtime_ns, name[:-len('.json')]))
+            except FileNotFoundError: pass
+        stale = [safe_key for _, safe_key in sorted(pointers)[:-self.keep_versions]]
+        for safe_key in stale:
+            try: os.remove(os.path.join(self.root, f"{safe_key}.json"))
+            except FileNotFoundError: pass
+        for name in os.listdir(self.root):
+            if any(name.startswith(f"{safe_key}.") for safe_key in stale) and not name.endswith(('.json', '.lock')):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        return stale
+
+    def invalidate(self, prefix=''):
+        # Alle Einträge mit diesem Präfix verwerfen (z. B. Benchmarks); Sperrdateien bleiben wie bei discard_stale
+        prefix = self._safe_key(prefix)
+        with self._lock: self._loaded = {key: entry for key, entry in self._loaded.items() if not self._safe_key(key).startswith(prefix)}
+        for name in os.listdir(self.root):
+            if not name.startswith(prefix) or name.endswith('.lock'): continue
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+            else:
+                try: os.remove(path)
+                except FileNotFoundError: pass
+    def stats(self):
+        return {"root": self.root, "entries": len(self._loaded), "hits": self.hits, "builds": self.builds}
+
+def create_shared_cache_from_env(environ):
+    if environ.get('SHARED_CACHE_ENABLED', '1') == '0': return None
+    root = environ.get('SHARED_CACHE_DIR') or default_shared_cache_dir()
+    try:
+        return SharedArrayCache(root)
+    except OSError as e:
+        print(f"Shared-Cache {root} nicht nutzbar, jeder Worker lädt selbst: {e}")
+        return None
+
+# --- Modelle: Wälder werden einmal kompiliert und von allen Workern als flache Arrays gelesen ---
+def shareable_model_arrays(artifact):
+    if isinstance(artifact, MultiTargetLevelModel) and is_compilable_forest(artifact.model):
+        arrays, meta = CompiledForest.from_sklearn(artifact.model, artifact.scaler).to_arrays()
+        return arrays, dict(meta, kind='level_model', targets=artifact.targets)
+    if is_compilable_forest(artifact):
+        # Getrennte Low/High-Artefakte: der Scaler bleibt ein eigenes (kleines) Artefakt und wird vorher angewendet
+        arrays, meta = CompiledForest.from_sklearn(artifact).to_arrays()
+        return arrays, dict(meta, kind='forest')
+    return None
+
+def model_from_shared(entry):
+    forest = SharedForest(CompiledForest.from_arrays(entry['arrays'], entry['meta']))
+    if entry['meta']['kind'] == 'level_model': return MultiTargetLevelModel(forest, None, entry['meta']['targets'])
+    return forest
+
+def share_artifact(cache, handle):
+    # Für ArtifactRegistry(share=...): liefert die geteilte Form, falls das Artefakt ein Wald ist, sonst das normale Artefakt
+    if not TREE_ENGINE_ENABLED: return handle.load_unshared()
+    local = {}
+    prefix = f"model-{handle.name}-"
+    key = f"{prefix}{version_digest(handle.version_key)}-f{COMPILED_FORMAT}"
+
+    def build():
+        artifact = local['artifact'] = handle.load_unshared()
+        shareable = shareable_model_arrays(artifact)
+        if shareable is None: return {}, {'shareable': False, 'manifest': handle.manifest}
+        arrays, meta = shareable
+        return arrays, dict(meta, shareable=True, manifest=handle.manifest)
+
+    entry = cache.get_or_build(key, build)
+    if 'artifact' in local: cache.discard_stale(prefix)
+    if not entry['meta']['shareable']: return local['artifact'] if 'artifact' in local else handle.load_unshared()
+    handle.manifest = entry['meta']['manifest']
+    return model_from_shared(entry)
\ No newline at end of file
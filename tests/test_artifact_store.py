@@ -0,0 +1,48 @@
+import os
+import stat
+
+import numpy as np
+
+from artifact_store import LazyArtifact, pack_artifact, read_manifest, unpack_artifact
+
+def _blob_source(blobs, calls):
+    def fetch_blob(name):
+        calls.append(name)
+        return blobs[name]
+    return fetch_blob
+
+def test_pack_round_trip():
+    blob = pack_artifact('scaler', {'mean': np.arange(4.0)}, features=['a', 'b'])
+    assert read_manifest(blob)['features'] == ['a', 'b']
+    np.testing.assert_array_equal(unpack_artifact(blob)['mean'], np.arange(4.0))
+
+def test_cache_dir_is_private(tmp_path):
+    cache_dir = tmp_path / 'artifacts'
+    cache_dir.mkdir(mode=0o755)
+    blobs, calls = {'model': pack_artifact('model', np.arange(3.0))}, []
+    LazyArtifact('model', ('v1', 1), _blob_source(blobs, calls), str(cache_dir)).get()
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+def test_tampered_cache_file_is_not_loaded(tmp_path):
+    blobs, calls = {'model': pack_artifact('model', np.arange(3.0))}, []
+    first = LazyArtifact('model', ('v1', 1), _blob_source(blobs, calls), str(tmp_path))
+    first.get()
+    with open(first.cache_path, 'r+b') as f:
+        f.seek(-8, os.SEEK_END); f.write(b'\x00' * 8)
+    second = LazyArtifact('model', ('v1', 1), _blob_source(blobs, calls), str(tmp_path))
+    np.testing.assert_array_equal(second.get(), np.arange(3.0))
+    assert calls == ['model', 'model']
+    # Ein unveränderter Cache wird ohne DB-Zugriff geladen
+    LazyArtifact('model', ('v1', 1), _blob_source(blobs, calls), str(tmp_path)).get()
+    assert calls == ['model', 'model']
+
+def test_superseded_versions_are_pruned(tmp_path):
+    blobs, calls = {'model': pack_artifact('model', np.arange(3.0)), 'model_1h': pack_artifact('model_1h', np.arange(2.0))}, []
+    old = LazyArtifact('model', ('v1', 1), _blob_source(blobs, calls), str(tmp_path))
+    old.get()
+    other = LazyArtifact('model_1h', ('v1', 1), _blob_source(blobs, calls), str(tmp_path))
+    other.get()
+    for path in (old.cache_path, f"{old.cache_path}.json"): os.utime(path, (1, 1))
+    new = LazyArtifact('model', ('v2', 1), _blob_source(blobs, calls), str(tmp_path))
+    new.get()
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) + suffix for p in (new.cache_path, other.cache_path) for suffix in ('', '.json'))
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+# backtester richtet beim Import eine Flask-App mit DATABASE_URL ein
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+import backtester
+import tree_engine
+from train_model import FEATURES_LIST
+
+def _featured_series(n_rows=250, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    data = pd.DataFrame(rng.normal(size=(n_rows, len(FEATURES_LIST))), columns=FEATURES_LIST, index=pd.date_range('2022-01-01', periods=n_rows, freq='D'))
+    data['Open'] = close * (1 + rng.normal(0, 0.005, n_rows))
+    data['High'] = np.maximum(data['Open'], close) * (1 + np.abs(rng.normal(0, 0.015, n_rows)))
+    data['Low'] = np.minimum(data['Open'], close) * (1 - np.abs(rng.normal(0, 0.015, n_rows)))
+    data['ATRr_14'] = close * np.abs(rng.normal(0.02, 0.005, n_rows))
+    # Modelle, deren vorhergesagte Spanne um die getesteten Einstiegsschwellen streut
+    models = {}
+    for side, sign in (('low', -1), ('high', 1)):
+        target = close * (1 + sign * np.abs(rng.normal(0.03, 0.02, n_rows)))
+        scaler = StandardScaler().fit(data[FEATURES_LIST])
+        models[f'btc_{side}_scaler'] = scaler
+        models[f'btc_{side}_model'] = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=seed).fit(scaler.transform(data[FEATURES_LIST]), target)
+    return data, models
+
+_reference_results = {}
+
+def _reference_simulation(featured_data, models, initial_capital, entry_threshold_percent, sl_atr_multiplier):
+    # Die ursprüngliche Schleife aus run_backtest_simulation: iloc pro Bar, eine Vorhersage pro Tag ohne offene Position
+    capital = initial_capital
+    in_trade = False
+    entry_price, take_profit_target, stop_loss_target = 0, 0, 0
+    portfolio_history = []
+    for i in range(len(featured_data) - 1):
+        current_day = featured_data.iloc[i]
+        next_day = featured_data.iloc[i+1]
+        if in_trade:
+            if next_day['Low'] <= stop_loss_target:
+                capital *= (1 + ((stop_loss_target / entry_price) - 1)); in_trade = False
+            elif next_day['High'] >= take_profit_target:
+                capital *= (1 + ((take_profit_target / entry_price) - 1)); in_trade = False
+        if not in_trade:
+            features_df = pd.DataFrame([current_day[FEATURES_LIST]])
+            predicted_low = models['btc_low_model'].predict(models['btc_low_scaler'].transform(features_df))[0]
+            predicted_high = models['btc_high_model'].predict(models['btc_high_scaler'].transform(features_df))[0]
+            if predicted_low > 0 and ((predicted_high / predicted_low) - 1) * 100 > entry_threshold_percent:
+                in_trade = True; entry_price = next_day['Open']
+                take_profit_target = predicted_high
+                stop_loss_target = predicted_low - (current_day['ATRr_14'] * sl_atr_multiplier)
+        portfolio_history.append(capital)
+    return capital, portfolio_history
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_simulate_trades_matches_reference_loop(monkeypatch, compiled):
+    monkeypatch.setattr(tree_engine, 'TREE_ENGINE_ENABLED', compiled)
+    data, models = _featured_series()
+    predicted_low, predicted_high = backtester.predict_price_levels(models, 'btc', data)
+    trades = 0
+    for entry_threshold in (1.0, 3.0, 5.0):
+        for sl_multiplier in (0.5, 1.5):
+            # Die langsame Referenz läuft einmal pro Parameterpaar und gilt für beide Engines
+            if (entry_threshold, sl_multiplier) not in _reference_results:
+                _reference_results[entry_threshold, sl_multiplier] = _reference_simulation(data, models, 100.0, entry_threshold, sl_multiplier)
+            expected_capital, expected_balances = _reference_results[entry_threshold, sl_multiplier]
+            capital, balances = backtester.simulate_trades(data['Open'], data['High'], data['Low'], data['ATRr_14'], predicted_low, predicted_high,
+                                                           100.0, entry_threshold, sl_multiplier)
+            assert capital == expected_capital
+            np.testing.assert_array_equal(balances, expected_balances)
+            trades += len(set(expected_balances)) > 1
+    # Die Parameter müssen tatsächlich Trades auslösen, sonst wäre der Vergleich trivial
+    assert trades >= 4
\ No newline at end of file
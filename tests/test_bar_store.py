@@ -0,0 +1,83 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BarRangeError, BarStore
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+def _fixture(name='BTC-USD_1d.csv'):
+    return pd.read_csv(os.path.join(FIXTURE_DIR, name), index_col=0, parse_dates=True)
+
+def _fixture_store(tmp_path):
+    return BarStore(str(tmp_path / 'bars'), fixture_dir=FIXTURE_DIR, offline=True)
+
+def test_initial_sync_from_fixture(tmp_path):
+    store = _fixture_store(tmp_path)
+    expected = _fixture()
+    assert store.sync('BTC-USD') == len(expected)
+    # Zweiter Sync offline: nichts Neues, nichts doppelt
+    assert store.sync('BTC-USD') == 0
+    stored = store.read_frame('BTC-USD')
+    pd.testing.assert_frame_equal(stored, expected[stored.columns], check_freq=False)
+
+def test_append_ignores_older_bars_and_overwrites_last(tmp_path):
+    store = BarStore(str(tmp_path / 'bars'), offline=True)
+    frame = _fixture().iloc[:100]
+    assert store.import_frame('BTC-USD', '1d', frame.iloc[:60]) == 60
+    # Überlappung: ältere Bars werden ignoriert, der letzte gespeicherte (laufende) Bar wird aktualisiert
+    update = frame.iloc[50:100].copy()
+    update.loc[frame.index[59], 'Close'] = -1.0
+    update.loc[frame.index[55], 'Close'] = -2.0
+    view = store.read_arrays('BTC-USD')['columns']['Close']
+    assert store.import_frame('BTC-USD', '1d', update) == 40
+    stored = store.read_frame('BTC-USD')
+    assert len(stored) == 100 and stored.index.is_monotonic_increasing
+    assert stored['Close'].iloc[59] == -1.0
+    assert stored['Close'].iloc[55] == frame['Close'].iloc[55]
+    # Bestehende memmap-Sicht sieht den überschriebenen Bar an Ort und Stelle
+    assert view[59] == -1.0 and len(view) == 60
+
+def test_period_and_range_slicing(tmp_path):
+    store = _fixture_store(tmp_path)
+    store.sync('BTC-USD')
+    expected = _fixture()
+    last = expected.index[-1]
+    recent = store.read_frame('BTC-USD', period='3mo')
+    assert recent.index[0] >= last - pd.DateOffset(months=3) and recent.index[-1] == last
+    assert len(recent) == int((expected.index >= last - pd.DateOffset(months=3)).sum())
+    window = store.read_frame('BTC-USD', start='2024-01-01', end='2024-01-31')
+    assert list(window.index) == list(expected.loc['2024-01-01':'2024-01-31'].index)
+    arrays = store.read_arrays('BTC-USD', start='2024-01-01', end='2024-01-31')
+    assert isinstance(arrays['columns']['Close'], np.memmap) and len(arrays['timestamps']) == 31
+    # Der ganze Fixture-Zeitraum ist abgedeckt
+    assert len(store.read_frame('BTC-USD', period='2y')) == len(expected)
+
+def test_period_beyond_stored_range_fails_offline(tmp_path):
+    store = _fixture_store(tmp_path)
+    store.sync('BTC-USD')
+    with pytest.raises(BarRangeError):
+        store.read_frame('BTC-USD', period='5y')
+
+def test_period_beyond_stored_range_is_backfilled(tmp_path, monkeypatch):
+    expected = _fixture()
+    calls = []
+    def download(ticker, start=None, end=None, **kwargs):
+        calls.append((start, end))
+        return expected.loc[start:end]
+    monkeypatch.setitem(sys.modules, 'yfinance', types.SimpleNamespace(download=download))
+    store = BarStore(str(tmp_path / 'bars'))
+    store.import_frame('BTC-USD', '1d', expected.loc['2024-07-01':])
+    old_view = store.read_arrays('BTC-USD')['timestamps']
+
+    backfilled = store.read_frame('BTC-USD', period='2y')
+    pd.testing.assert_frame_equal(backfilled, expected[backfilled.columns], check_freq=False)
+    assert len(calls) == 1
+    # Sichten von vor dem Backfill bleiben gültig, der abgedeckte Zeitraum wird nicht erneut geladen
+    assert pd.Timestamp(int(old_view[0]), unit='ns') == pd.Timestamp('2024-07-01')
+    store.read_frame('BTC-USD', period='2y')
+    assert len(calls) == 1
\ No newline at end of file
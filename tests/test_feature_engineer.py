@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineer import add_features_to_data, IncrementalFeatureState
+
+FEATURE_COLUMNS = ['daily_return', 'SMA_10', 'SMA_50', 'sma_signal', 'RSI_14', 'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9', 'ATRr_14',
+                   'daily_return_lag_1', 'RSI_14_lag_1', 'daily_return_lag_2', 'RSI_14_lag_2', 'daily_return_lag_3', 'RSI_14_lag_3']
+
+def _ohlcv(n_rows=300, flat_bars=0, seed=0):
+    # Zufallspfad; die ersten flat_bars Bars haben einen konstanten Kurs (RSI-Nenner 0)
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    if flat_bars: close[:flat_bars] = close[flat_bars]
+    spread = np.abs(rng.normal(0, 0.01, n_rows)) * close
+    return pd.DataFrame({'Open': close, 'High': close + spread, 'Low': close - spread, 'Close': close, 'Adj Close': close,
+                         'Volume': rng.integers(1, 1000, n_rows).astype(float)},
+                        index=pd.date_range('2022-01-01', periods=n_rows, freq='D'))
+
+def _incremental(data):
+    state, rows = IncrementalFeatureState(), {}
+    for timestamp, row in zip(data.index, data.to_dict(orient='records')):
+        features = state.update(row, timestamp)
+        if features is not None: rows[timestamp] = features
+    return state, pd.DataFrame.from_dict(rows, orient='index')
+
+@pytest.mark.parametrize('flat_bars', [0, 40])
+def test_incremental_features_match_batch(flat_bars):
+    data = _ohlcv(flat_bars=flat_bars)
+    batch = add_features_to_data(data)
+    _, incremental = _incremental(data)
+    assert list(incremental.index) == list(batch.index)
+    np.testing.assert_allclose(incremental[FEATURE_COLUMNS].to_numpy(dtype=float), batch[FEATURE_COLUMNS].to_numpy(dtype=float), rtol=1e-9, atol=1e-12)
+
+def test_flat_prices_yield_no_features():
+    data = _ohlcv(n_rows=120, flat_bars=119)
+    assert add_features_to_data(data).empty
+    _, incremental = _incremental(data)
+    assert incremental.empty
+
+def test_update_of_running_bar_rolls_back_previous_state():
+    data = _ohlcv()
+    rows = data.to_dict(orient='records')
+    state = IncrementalFeatureState.from_data(data.iloc[:-1])
+    # Laufender Bar wird mehrfach aktualisiert, erst der letzte Stand zählt
+    for factor in (0.97, 1.05, 1.0):
+        provisional = dict(rows[-1], **{column: rows[-1][column] * factor for column in ('High', 'Low', 'Close', 'Adj Close')})
+        features = state.update(provisional, data.index[-1])
+    expected = add_features_to_data(data).iloc[-1]
+    np.testing.assert_allclose([features[column] for column in FEATURE_COLUMNS], expected[FEATURE_COLUMNS].to_numpy(dtype=float), rtol=1e-9, atol=1e-12)
+    assert state.bars_seen == len(data)
\ No newline at end of file
@@ -0,0 +1,45 @@
+import time
+import threading
+
+from model_registry import ArtifactRegistry
+
+class _BlockingRegistry(ArtifactRegistry):
+    def __init__(self, fail=False):
+        super().__init__(app=None, db=None, model_class=None, poll_seconds=0)
+        self.release = threading.Event()
+        self.calls = 0
+        self.fail = fail
+
+    def refresh(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail: raise RuntimeError("DB nicht erreichbar")
+        return []
+
+def _wait_until_idle(registry):
+    deadline = time.monotonic() + 5
+    while registry._once_running and time.monotonic() < deadline: time.sleep(0.01)
+    assert not registry._once_running
+
+def _reload_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'artifact-registry-once']
+
+def test_reload_requests_during_a_refresh_fold_into_one_more_pass():
+    registry = _BlockingRegistry()
+    registry.request_refresh()
+    while registry.calls == 0: time.sleep(0.01)
+    for _ in range(50): registry.request_refresh()
+    assert len(_reload_threads()) == 1
+    registry.release.set()
+    _wait_until_idle(registry)
+    assert registry.calls == 2
+
+def test_refresh_errors_are_logged_and_do_not_block_later_reloads(capsys):
+    registry = _BlockingRegistry(fail=True)
+    registry.release.set()
+    registry.request_refresh()
+    _wait_until_idle(registry)
+    assert "DB nicht erreichbar" in capsys.readouterr().out
+    registry.request_refresh()
+    _wait_until_idle(registry)
+    assert registry.calls == 2
\ No newline at end of file
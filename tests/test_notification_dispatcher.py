@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from notification_dispatcher import (FirebaseMessagingBackend, FakeMessagingBackend, NotificationDispatcher,
+                                     TOKEN_OK, TOKEN_INVALID, TOKEN_RETRY, TOKEN_FAILED)
+
+class _FirebaseError(Exception):
+    pass
+
+# Stellvertreter für firebase_admin.messaging / firebase_admin.exceptions
+messaging = SimpleNamespace(UnregisteredError=type('UnregisteredError', (_FirebaseError,), {}),
+                            SenderIdMismatchError=type('SenderIdMismatchError', (_FirebaseError,), {}))
+exceptions = SimpleNamespace(InvalidArgumentError=type('InvalidArgumentError', (_FirebaseError,), {}),
+                             UnavailableError=type('UnavailableError', (_FirebaseError,), {}))
+
+def _classify(error):
+    return FirebaseMessagingBackend._classify(error, messaging, exceptions)
+
+def test_only_token_errors_mark_tokens_invalid():
+    assert _classify(messaging.UnregisteredError("Requested entity was not found.")) == TOKEN_INVALID
+    assert _classify(messaging.SenderIdMismatchError("SenderId mismatch")) == TOKEN_INVALID
+    assert _classify(exceptions.InvalidArgumentError("The registration token is not a valid FCM registration token")) == TOKEN_INVALID
+    assert _classify(exceptions.InvalidArgumentError("Message payload exceeds the 4096 bytes limit")) == TOKEN_FAILED
+    assert _classify(exceptions.UnavailableError("Service unavailable")) == TOKEN_RETRY
+
+def test_message_errors_are_neither_pruned_nor_retried():
+    class RejectingBackend:
+        calls = 0
+        def send_batch(self, title, body, tokens):
+            self.calls += 1
+            return [TOKEN_FAILED if token.startswith('x') else TOKEN_OK for token in tokens]
+    backend = RejectingBackend()
+    stats = NotificationDispatcher(backend, max_workers=1, backoff_seconds=0).dispatch("t", "b", [['a', 'x1', 'x2']])
+    assert (stats["sent"], stats["failed"], stats["invalid_tokens"], backend.calls) == (1, 2, [], 1)
+
+def test_invalid_and_flaky_tokens():
+    backend = FakeMessagingBackend(invalid_tokens={'bad'}, flaky_tokens={'flaky'})
+    stats = NotificationDispatcher(backend, max_workers=2, backoff_seconds=0).dispatch("t", "b", [['a', 'bad'], ['flaky']])
+    assert (stats["sent"], stats["failed"], stats["invalid_tokens"]) == (2, 0, ['bad'])
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# backtester richtet beim Import eine Flask-App mit DATABASE_URL ein
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+import backtester
+import portfolio_backtester
+
+def _asset_inputs(n_rows=300, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    opens = close * (1 + rng.normal(0, 0.005, n_rows))
+    highs = np.maximum(opens, close) * (1 + np.abs(rng.normal(0, 0.015, n_rows)))
+    lows = np.minimum(opens, close) * (1 - np.abs(rng.normal(0, 0.015, n_rows)))
+    atr = close * np.abs(rng.normal(0.02, 0.005, n_rows))
+    pred_low = close * (1 - np.abs(rng.normal(0.03, 0.02, n_rows)))
+    pred_high = close * (1 + np.abs(rng.normal(0.03, 0.02, n_rows)))
+    # Am Ende ein Signal mit unerreichbaren Zielen: die letzte Position bleibt offen
+    pred_low[-6:], pred_high[-6:] = close[-6:] * 0.5, close[-6:] * 5
+    return {'index': pd.date_range('2022-01-01', periods=n_rows, freq='D'), 'close': close,
+            'arrays': (opens, highs, lows, atr, pred_low, pred_high)}
+
+@pytest.mark.parametrize('entry_threshold,sl_multiplier', [(3.0, 0.5), (3.0, 1.5), (5.0, 1.5)])
+def test_single_asset_matches_simulate_trades(entry_threshold, sl_multiplier):
+    inputs = _asset_inputs()
+    opens, closes = inputs['arrays'][0], inputs['close']
+    capital, balances = backtester.simulate_trades(*inputs['arrays'], 100.0, entry_threshold, sl_multiplier)
+    result = portfolio_backtester.simulate_portfolio(portfolio_backtester.align_assets({'BTC': inputs}),
+                                                     entry_threshold, sl_multiplier, initial_capital=100.0, position_fraction=1.0)
+    equity = result['equity']
+    assert len(equity) == len(balances)
+
+    # equity[k] gehört zu Bar k+1; ohne Position ist sie der realisierte Kontostand, mit Position Stückzahl * Schlusskurs
+    units, entry_price, flat_steps, held_steps = None, None, 0, 0
+    for k in range(len(equity)):
+        t = k + 1
+        if np.isclose(equity[k], balances[k], rtol=1e-9, atol=0):
+            units, flat_steps = None, flat_steps + 1
+            continue
+        held_steps += 1
+        if units is not None and np.isclose(equity[k], units * closes[t], rtol=1e-9, atol=0):
+            assert balances[k] == balances[k - 1]
+        else:
+            # Neuer Einstieg zum Eröffnungskurs von Bar t mit dem gesamten realisierten Kapital
+            units, entry_price = balances[k] / opens[t], opens[t]
+            assert equity[k] == pytest.approx(units * closes[t], rel=1e-9)
+    assert flat_steps > 0 and held_steps > 0
+
+    # Einzige Abweichung am Ende: die offene Position wird zum letzten Schlusskurs bewertet
+    assert result['open_positions'] == ['BTC']
+    assert units is not None
+    assert result['cash'] == pytest.approx(0.0, abs=1e-9)
+    assert capital == balances[-1]
+    assert result['final_value'] - capital == pytest.approx(capital * (closes[-1] / entry_price - 1), rel=1e-9)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import time
+import threading
+
+import pytest
+
+from quote_client import CircuitBreaker, QuoteClient, QuoteUnavailable, TokenBucket, start_stub_quote_server
+
+@pytest.fixture
+def stub():
+    server, url = start_stub_quote_server({'BTCUSDT': 100.0, 'ETHUSDT': 10.0, 'GCUSD': 2000.0}, latency_seconds=0.05)
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+def _client(url, **kwargs):
+    return QuoteClient(base_urls={'binance': url, 'fmp': url}, timeout=2.0, **kwargs)
+
+def test_concurrent_requests_for_one_symbol_share_one_upstream_call(stub):
+    server, url = stub
+    client = _client(url, coalesce_seconds=2.0)
+    barrier, prices = threading.Barrier(16), []
+    def fetch():
+        barrier.wait()
+        prices.append(client.get_price('binance', 'BTCUSDT'))
+    threads = [threading.Thread(target=fetch) for _ in range(16)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert prices == [100.0] * 16
+    assert server.requests == 1
+    assert client.get_price('fmp', 'GCUSD') == 2000.0 and server.requests == 2
+
+def test_token_bucket_throttles_at_its_rate():
+    bucket = TokenBucket(rate_per_second=20.0, capacity=1)
+    assert bucket.try_acquire() and not bucket.try_acquire()
+    start = time.monotonic()
+    for _ in range(5): assert bucket.try_acquire(max_wait_seconds=1.0)
+    assert 0.2 <= time.monotonic() - start < 0.6
+
+def test_rate_limited_source_does_not_call_upstream(stub):
+    server, url = stub
+    client = _client(url, coalesce_seconds=0, rates={'binance': 1.0}, max_wait_seconds=0)
+    assert client.get_price('binance', 'BTCUSDT') == 100.0
+    with pytest.raises(QuoteUnavailable):
+        client.get_price('binance', 'ETHUSDT')
+    assert server.requests == 1
+
+def test_breaker_opens_serves_last_known_and_probes_once(stub):
+    server, url = stub
+    client = _client(url, coalesce_seconds=0, failure_threshold=2, reset_seconds=0.3)
+    breaker = client.breakers['binance']
+    assert client.get_price('binance', 'BTCUSDT') == 100.0
+    server.failing = True
+    # Fehler werden mit dem letzten bekannten Kurs überbrückt, bis der Breaker öffnet
+    assert [client.get_price('binance', 'BTCUSDT') for _ in range(2)] == [100.0, 100.0]
+    assert breaker.state == 'open' and server.requests == 3
+    assert client.get_price('binance', 'BTCUSDT') == 100.0
+    assert server.requests == 3
+    with pytest.raises(QuoteUnavailable):
+        client.get_price('binance', 'ETHUSDT')
+    time.sleep(0.35)
+    assert breaker.state == 'half_open'
+    # Halb offen: genau eine Probe darf durch, weitere Aufrufe warten auf ihr Ergebnis
+    assert breaker.allow() and not breaker.allow()
+    breaker.release()
+    server.failing = False
+    assert client.get_price('binance', 'BTCUSDT') == 100.0
+    assert breaker.state == 'closed' and server.requests == 4
+
+def test_failed_half_open_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
\ No newline at end of file
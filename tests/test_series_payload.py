@@ -0,0 +1,41 @@
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+from series_payload import SeriesQueryError, parse_series_query, format_dates, encode_series
+
+def test_daily_dates_keep_day_precision():
+    dates = pd.date_range('2024-01-01', periods=3, freq='D', tz='UTC')
+    assert format_dates(dates).tolist() == ['2024-01-01', '2024-01-02', '2024-01-03']
+
+def test_intraday_dates_keep_time_of_day():
+    dates = pd.date_range('2024-01-01 22:00', periods=4, freq='h')
+    assert format_dates(dates, 'm').tolist() == ['2024-01-01T22:00', '2024-01-01T23:00', '2024-01-02T00:00', '2024-01-02T01:00']
+
+def test_date_range_filter_covers_whole_days_for_intraday_rows():
+    dates = pd.date_range('2024-01-01 00:00', periods=72, freq='h')
+    query = parse_series_query({'format': 'columns', 'start': '2024-01-02', 'end': '2024-01-02'})
+    document = json.loads(encode_series('Date', format_dates(dates, 'm'), {'price': range(72)}, query)['body'])
+    assert document['price'] == list(range(24, 48))
+    assert document['Date'][0] == '2024-01-02T00:00' and document['Date'][-1] == '2024-01-02T23:00'
+
+@pytest.mark.parametrize('args', [{'format': 'xml'}, {'start': 'gestern'}, {'offset': 'a'}, {'limit': '-1'}])
+def test_invalid_queries_are_rejected(args):
+    with pytest.raises(SeriesQueryError):
+        parse_series_query(args)
+
+def test_records_and_columns_carry_the_same_rows():
+    dates = format_dates(pd.date_range('2024-01-01', periods=200, freq='D'))
+    columns = {'price': [float(i) for i in range(200)], 'rsi': [i / 2 for i in range(200)]}
+    query = {'start': '2024-02-01', 'end': None, 'offset': 5, 'limit': 40}
+    records = encode_series('Date', dates, columns, dict(query, format='records'))
+    columnar = encode_series('Date', dates, columns, dict(query, format='columns'))
+    rows, table = json.loads(records['body']), json.loads(columnar['body'])
+    assert records['rows'] == columnar['rows'] == 40
+    assert [row['Date'] for row in rows] == table['Date'] and table['Date'][0] == '2024-02-06'
+    assert [row['rsi'] for row in rows] == table['rsi']
+    # Große Bodies werden einmal gzip-komprimiert mitgeliefert, die ETag hängt nur vom Inhalt ab
+    assert len(records['body']) >= 1024 and gzip.decompress(records['gzip']) == records['body']
+    assert encode_series('Date', dates, columns, dict(query, format='records'))['etag'] == records['etag']
\ No newline at end of file
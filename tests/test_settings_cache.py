@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import MetaData, Table, Column, Integer, Float, String
+
+from settings_cache import SettingsValidationError, validate_settings_update
+
+# Gleiche Spalten wie das Settings-Modell in app.py
+settings_table = Table('settings', MetaData(),
+                       Column('id', Integer, primary_key=True), Column('update_interval_minutes', Integer),
+                       Column('last_btc_signal', String(100)), Column('btc_entry_threshold', Float), Column('btc_sl_multiplier', Float),
+                       Column('version', Integer))
+
+def test_valid_update_is_coerced():
+    assert validate_settings_update(settings_table, {'update_interval_minutes': 5.0, 'btc_entry_threshold': 3}) == \
+        {'update_interval_minutes': 5, 'btc_entry_threshold': 3.0}
+
+@pytest.mark.parametrize('data', [
+    {}, [], {'unknown': 1}, {'version': 7}, {'id': 2},
+    {'update_interval_minutes': 'x'}, {'update_interval_minutes': 1.5}, {'btc_entry_threshold': True},
+    {'btc_entry_threshold': float('nan')}, {'last_btc_signal': 'x' * 101},
+])
+def test_malformed_updates_are_rejected(data):
+    with pytest.raises(SettingsValidationError):
+        validate_settings_update(settings_table, data)
+
+@pytest.mark.parametrize('data', [
+    {'update_interval_minutes': 0}, {'update_interval_minutes': -5},
+    {'btc_entry_threshold': 0}, {'btc_entry_threshold': -1.0}, {'btc_sl_multiplier': 0.0}, {'btc_sl_multiplier': -0.5},
+])
+def test_out_of_range_values_are_rejected(data):
+    with pytest.raises(SettingsValidationError):
+        validate_settings_update(settings_table, data)
+
+def test_lower_bounds_are_accepted():
+    assert validate_settings_update(settings_table, {'update_interval_minutes': 1, 'btc_sl_multiplier': 0.01}) == \
+        {'update_interval_minutes': 1, 'btc_sl_multiplier': 0.01}
\ No newline at end of file
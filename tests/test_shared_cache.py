@@ -0,0 +1,44 @@
+import os
+import stat
+
+import numpy as np
+
+from shared_cache import SharedArrayCache, create_shared_cache_from_env
+
+def _publish(cache, key, value):
+    return cache.get_or_build(key, lambda: ({'values': np.full(4, value)}, {'value': value}))
+
+def test_get_or_build_builds_once(tmp_path):
+    cache = SharedArrayCache(str(tmp_path))
+    first = _publish(cache, 'model-a-1', 1.0)
+    second = SharedArrayCache(str(tmp_path)).get_or_build('model-a-1', lambda: None)
+    np.testing.assert_array_equal(second['arrays']['values'], first['arrays']['values'])
+    assert cache.builds == 1
+
+def test_discard_stale_keeps_recent_versions_and_locks(tmp_path):
+    cache = SharedArrayCache(str(tmp_path), keep_versions=2)
+    for i, key in enumerate(['model-a-1', 'model-a-2', 'model-a-3']):
+        _publish(cache, key, float(i))
+        os.utime(os.path.join(tmp_path, f"{key}.json"), ns=(i, i))
+    _publish(cache, 'model-ab-1', 9.0)
+    assert cache.discard_stale('model-a-') == ['model-a-1']
+    assert cache.load('model-a-1') is None
+    # Ein Worker mit älterem Stand liest model-a-2 weiter, ohne neu zu bauen
+    assert SharedArrayCache(str(tmp_path)).get_or_build('model-a-2', lambda: None)['meta']['value'] == 1.0
+    assert cache.load('model-ab-1') is not None
+    assert {'model-a-1.lock', 'model-a-2.lock', 'model-a-3.lock'} <= set(os.listdir(tmp_path))
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('model-a-1.') and not name.endswith('.lock')]
+
+def test_cache_root_is_private(tmp_path):
+    root = tmp_path / 'shared'
+    root.mkdir(mode=0o777)
+    os.chmod(root, 0o777)
+    SharedArrayCache(str(root))
+    assert stat.S_IMODE(os.stat(root).st_mode) == 0o700
+
+def test_foreign_or_linked_root_disables_the_cache(tmp_path):
+    target = tmp_path / 'elsewhere'
+    target.mkdir()
+    link = tmp_path / 'shared'
+    link.symlink_to(target)
+    assert create_shared_cache_from_env({'SHARED_CACHE_DIR': str(link)}) is None
\ No newline at end of file
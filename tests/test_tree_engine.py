@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from tree_engine import CompiledForest, SharedForest, predict_forest
+
+def _fitted_forest(n_outputs=1, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(400, 6)) * [1.0, 50.0, 1e-3, 2e4, 3.0, 0.1] + [0.0, 100.0, 0.0, 6e4, -5.0, 1.0]
+    y = X[:, :n_outputs] * 2 + rng.normal(size=(400, n_outputs))
+    scaler = StandardScaler().fit(X)
+    forest = RandomForestRegressor(n_estimators=8, random_state=seed).fit(scaler.transform(X), y.ravel() if n_outputs == 1 else y)
+    return forest, scaler, X
+
+def _boundary_probes(forest, scaler, X):
+    # Für jede Split-Schwelle Roh-Eingaben direkt an, knapp unter und knapp über der Grenze (nach float32-Rundung)
+    rows = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != -1):
+            feature, threshold = tree.feature[node], tree.threshold[node]
+            raw = threshold * scaler.scale_[feature] + scaler.mean_[feature]
+            for value in (raw, np.nextafter(raw, -np.inf), np.nextafter(raw, np.inf), np.float32(raw), np.float64(np.float32(threshold)) * scaler.scale_[feature] + scaler.mean_[feature]):
+                row = X[node % len(X)].copy()
+                row[feature] = value
+                rows.append(row)
+    return np.array(rows)
+
+@pytest.mark.parametrize('n_outputs', [1, 2])
+def test_compiled_forest_matches_sklearn_at_split_boundaries(n_outputs):
+    forest, scaler, X = _fitted_forest(n_outputs)
+    probes = _boundary_probes(forest, scaler, X)
+    compiled = CompiledForest.from_sklearn(forest, scaler)
+    # Dieselben Blätter und bitgleiche Mittelwerte wie sklearn
+    np.testing.assert_array_equal(compiled.leaves((probes - compiled.mean) / compiled.scale) - compiled.roots, forest.apply(scaler.transform(probes)))
+    expected = forest.predict(scaler.transform(probes))
+    np.testing.assert_array_equal(compiled.predict(probes), expected)
+    np.testing.assert_array_equal(predict_forest(forest, scaler, probes), expected)
+
+def test_compiled_forest_without_scaler_matches_sklearn():
+    forest, scaler, X = _fitted_forest()
+    probes = scaler.transform(_boundary_probes(forest, scaler, X))
+    compiled = CompiledForest.from_sklearn(forest)
+    np.testing.assert_array_equal(compiled.leaves(probes) - compiled.roots, forest.apply(probes))
+    np.testing.assert_array_equal(compiled.predict(probes), forest.predict(probes))
+
+def test_shared_arrays_round_trip():
+    forest, scaler, X = _fitted_forest(2)
+    arrays, meta = CompiledForest.from_sklearn(forest, scaler).to_arrays()
+    shared = SharedForest(CompiledForest.from_arrays(arrays, meta))
+    np.testing.assert_array_equal(shared.predict(X), forest.predict(scaler.transform(X)))
\ No newline at end of file
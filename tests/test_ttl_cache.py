@@ -0,0 +1,57 @@
+import time
+import types
+import threading
+
+import pytest
+
+import data_manager
+from data_manager import TTLCache
+
+def test_concurrent_misses_run_the_loader_once():
+    cache = TTLCache(ttl_seconds=60)
+    release = threading.Event()
+    calls = []
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 'bars'
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('BTC-USD', loader))) for _ in range(16)]
+    for thread in threads: thread.start()
+    # Alle Threads warten auf den ersten Ladevorgang, bevor er freigegeben wird
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 15 and time.monotonic() < deadline: time.sleep(0.01)
+    release.set()
+    for thread in threads: thread.join(5)
+    assert results == ['bars'] * 16 and len(calls) == 1
+    assert cache.stats()['misses'] == 1 and cache.stats()['coalesced'] == 15
+
+def test_failed_load_is_not_cached():
+    cache = TTLCache(ttl_seconds=60)
+    def failing_loader(): raise RuntimeError("yfinance nicht erreichbar")
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('BTC-USD', failing_loader)
+    assert cache.get_or_load('BTC-USD', lambda: None) is None
+    assert cache.get_or_load('BTC-USD', lambda: 'bars') == 'bars'
+
+def test_entry_reloads_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(data_manager, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    cache = TTLCache(ttl_seconds=10)
+    assert cache.get_or_load('BTC-USD', lambda: 'old') == 'old'
+    now[0] += 9.9
+    assert cache.get_or_load('BTC-USD', lambda: 'new') == 'old'
+    now[0] += 0.2
+    assert cache.get_or_load('BTC-USD', lambda: 'new') == 'new'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+def test_lru_eviction_at_capacity():
+    cache = TTLCache(ttl_seconds=60, max_entries=2)
+    cache.get_or_load('a', lambda: 1)
+    cache.get_or_load('b', lambda: 2)
+    # Zugriff auf 'a' macht 'b' zum ältesten Eintrag
+    cache.get_or_load('a', lambda: None)
+    cache.get_or_load('c', lambda: 3)
+    assert cache.stats()['entries'] == 2 and cache.evictions == 1
+    assert cache.get_or_load('a', lambda: 'reloaded') == 1
+    assert cache.get_or_load('b', lambda: 'reloaded') == 'reloaded'
\ No newline at end of file
@@ -0,0 +1,56 @@
+import os
+import stat
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineer import create_regression_targets, target_lookahead_bars
+from walk_forward import make_folds, run_walk_forward
+
+def _bar_index_frame(n_rows):
+    # Low/High = Position der Bar: das Ziel verrät direkt, welche Bars es verwendet
+    positions = np.arange(n_rows, dtype=float)
+    return pd.DataFrame({'Low': positions, 'High': positions}, index=pd.date_range('2020-01-01', periods=n_rows, freq='D'))
+
+@pytest.mark.parametrize('horizon_bars', [None, 24])
+def test_target_lookahead_matches_target_definition(horizon_bars):
+    targets = create_regression_targets(_bar_index_frame(200), horizon_bars=horizon_bars)
+    positions = np.arange(len(targets))
+    window = horizon_bars or 7
+    np.testing.assert_array_equal(targets['future_7d_low'].to_numpy(), positions + window)
+    np.testing.assert_array_equal(targets['future_7d_high'].to_numpy(), positions + target_lookahead_bars(horizon_bars=horizon_bars))
+    assert target_lookahead_bars() == 13
+
+@pytest.mark.parametrize('mode,horizon_bars', [('expanding', None), ('rolling', None), ('expanding', 24)])
+def test_folds_purge_training_targets_overlapping_the_test_window(mode, horizon_bars):
+    n_rows = 600
+    targets = create_regression_targets(_bar_index_frame(n_rows + 2 * (horizon_bars or 7)), horizon_bars=horizon_bars)
+    last_bar_used = targets['future_7d_high'].to_numpy()
+    folds = make_folds(n_rows, min_train_size=200, test_size=40, mode=mode, train_window=150, gap=target_lookahead_bars(horizon_bars=horizon_bars))
+    assert folds
+    for train_start, train_end, test_start, test_end in folds:
+        assert last_bar_used[train_start:train_end].max() < test_start
+        # Ohne Lücke hätte die letzte Trainingszeile Bars des Testfensters im Ziel
+        assert last_bar_used[test_start - 1] >= test_start
+
+def test_gap_below_target_lookahead_is_rejected():
+    matrix = {'X': np.zeros((400, 2)), 'y': np.zeros((400, 2)), 'index': pd.RangeIndex(400), 'lookahead': target_lookahead_bars()}
+    with pytest.raises(ValueError):
+        run_walk_forward(matrix, gap=7)
+
+def test_fold_cache_lives_in_a_private_directory(tmp_path):
+    rng = np.random.default_rng(0)
+    matrix = {'X': rng.normal(size=(300, 15)), 'y': rng.normal(size=(300, 2)), 'index': pd.date_range('2020-01-01', periods=300, freq='D'),
+              'lookahead': target_lookahead_bars()}
+    cache_dir = tmp_path / 'folds'
+    options = dict(min_train_size=200, test_size=40, max_workers=1, cache_dir=str(cache_dir), n_estimators=5)
+    first = run_walk_forward(matrix, **options)
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    second = run_walk_forward(matrix, **options)
+    assert first['cache_hits'] == 0 and second['cache_hits'] == len(second['folds'])
+    np.testing.assert_array_equal(first['predictions'].to_numpy(), second['predictions'].to_numpy())
+    # Andere Wald-Parameter (Intraday-Profil) ergeben andere Modelle und eigene Cache-Einträge
+    shallow = run_walk_forward(matrix, forest_params={'max_depth': 1}, **options)
+    assert shallow['cache_hits'] == 0
+    assert not np.allclose(shallow['predictions'].to_numpy(), first['predictions'].to_numpy())
\ No newline at end of file
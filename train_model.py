@@ -3,6 +3,12 @@ import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 
+from feature_engineer import add_features_to_data, create_regression_targets
+from artifact_store import pack_artifact
+from metrics import timed
+from tree_engine import predict_forest
+from intervals import DEFAULT_INTERVAL, get_interval_profile, interval_prefix
+
 FEATURES_LIST = [
     'daily_return', 'SMA_10', 'SMA_50', 'sma_signal', 'RSI_14',
     'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9', 'ATRr_14',
@@ -11,7 +17,7 @@ FEATURES_LIST = [
     'daily_return_lag_3', 'RSI_14_lag_3'
 ]
 
-def train_regression_model(data, target_column_name):
+def train_regression_model(data, target_column_name, n_jobs=-1, **forest_params):
     if data is None or data.empty: return None, None
     if not all(col in data.columns for col in FEATURES_LIST + [target_column_name]):
         print(f"FEHLER: Notwendige Spalten für Ziel '{target_column_name}' nicht gefunden.")
@@ -29,7 +35,113 @@ def train_regression_model(data, target_column_name):
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     
-    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs, **forest_params)
     model.fit(X_train_scaled, y_train)
+    print(f"Test-Fehler '{target_column_name}': {format_errors(regression_errors(y_test.to_numpy(), predict_forest(model, scaler, X_test)))}")
     
-    return model, scaler
\ No newline at end of file
+    return model, scaler
+
+def regression_errors(y_true, y_pred):
+    y_true, y_pred = np.asarray(y_true, dtype=float), np.asarray(y_pred, dtype=float)
+    errors = y_pred - y_true
+    return {"mae": float(np.mean(np.abs(errors))), "rmse": float(np.sqrt(np.mean(errors ** 2))),
+            "mape": float(np.mean(np.abs(errors) / np.abs(y_true)) * 100)}
+
+def format_errors(errors):
+    return f"MAE {errors['mae']:.2f}, RMSE {errors['rmse']:.2f}, MAPE {errors['mape']:.2f}%"
+
+# --- Multi-Target-Modus: ein Scaler + ein Forest sagt Low und High gemeinsam voraus ---
+REGRESSION_TARGETS = ['future_7d_low', 'future_7d_high']
+
+class MultiTargetLevelModel:
+    def __init__(self, model, scaler, targets):
+        self.model = model
+        self.scaler = scaler
+        self.targets = list(targets)
+
+    def predict(self, X):
+        # Der kompilierte Wald wendet den Scaler selbst an (siehe tree_engine)
+        with timed('forest_predict'): predictions = predict_forest(self.model, self.scaler, X)
+        return predictions.reshape(len(predictions), -1)
+
+    def predict_levels(self, X):
+        predictions = self.predict(X)
+        return predictions[:, self.targets.index('future_7d_low')], predictions[:, self.targets.index('future_7d_high')]
+
+def train_multi_target_model(data, target_columns=REGRESSION_TARGETS, n_jobs=-1, **forest_params):
+    if data is None or data.empty: return None
+    if not all(col in data.columns for col in FEATURES_LIST + list(target_columns)):
+        print(f"FEHLER: Notwendige Spalten für Ziele {list(target_columns)} nicht gefunden.")
+        return None
+
+    X = data[FEATURES_LIST]
+    y = data[list(target_columns)]
+
+    split_index = int(len(X) * 0.8)
+    X_train, X_test = X[:split_index], X[split_index:]
+    y_train, y_test = y[:split_index], y[split_index:]
+
+    if len(X_test) == 0: return None
+
+    level_model = fit_level_model(X_train, y_train.to_numpy(), target_columns, n_jobs=n_jobs, **forest_params)
+    test_predictions = level_model.predict(X_test)
+    for i, target in enumerate(target_columns):
+        print(f"Test-Fehler '{target}': {format_errors(regression_errors(y_test[target].to_numpy(), test_predictions[:, i]))}")
+    return level_model
+
+def fit_level_model(X_train, y_train, target_columns=REGRESSION_TARGETS, n_jobs=-1, n_estimators=100, random_state=42, **forest_params):
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs, **forest_params)
+    model.fit(X_train_scaled, y_train)
+
+    return MultiTargetLevelModel(model, scaler, target_columns)
+
+def level_model_keys(prefix):
+    return [f"{prefix}_low_model", f"{prefix}_low_scaler", f"{prefix}_high_model", f"{prefix}_high_scaler"]
+
+def combined_model_key(prefix):
+    return f"{prefix}_levels_model"
+
+def has_level_models(artifacts, prefix):
+    return combined_model_key(prefix) in artifacts or all(k in artifacts for k in level_model_keys(prefix))
+
+def predict_price_levels(artifacts, prefix, features):
+    # Bevorzugt das kombinierte Artefakt, fällt auf die vier getrennten Low/High-Artefakte zurück
+    if combined_model_key(prefix) in artifacts:
+        return artifacts[combined_model_key(prefix)].predict_levels(features)
+    with timed('forest_predict'):
+        predicted_low = predict_forest(artifacts[f"{prefix}_low_model"], artifacts[f"{prefix}_low_scaler"], features)
+        predicted_high = predict_forest(artifacts[f"{prefix}_high_model"], artifacts[f"{prefix}_high_scaler"], features)
+    return predicted_low, predicted_high
+
+def train_asset(asset, raw_data, training_mode, n_jobs=1, interval=DEFAULT_INTERVAL):
+    # Läuft in einem Worker-Prozess der Trainings-Pipeline: Features, Ziele, Training und Serialisierung für ein Asset
+    # Intraday-Intervalle: float32-Features, Zielhorizont in Bars und begrenzte Baumgröße (siehe intervals.py)
+    profile = get_interval_profile(interval)
+    featured_data = add_features_to_data(raw_data, dtype=profile['feature_dtype'])
+    final_data = create_regression_targets(featured_data, horizon_bars=profile['target_horizon_bars'])
+    result = {"name": asset["name"], "artifacts": {}, "obsolete": [], "latest_features": None, "prediction": None}
+    if featured_data is not None and all(col in featured_data.columns for col in FEATURES_LIST):
+        # Der bereits geladene Frame liefert auch die Features für das Live-Signal nach dem Training
+        result["latest_features"] = featured_data[FEATURES_LIST].tail(1)
+    if final_data is None or final_data.empty: return result
+
+    training_window = (final_data.index.min(), final_data.index.max())
+    prefix = interval_prefix(asset["prefix"], interval)
+    forest_params = profile['forest_params']
+    if training_mode == 'multi':
+        level_model = train_multi_target_model(final_data, n_jobs=n_jobs, **forest_params)
+        if level_model: result["artifacts"][combined_model_key(prefix)] = level_model
+    else:
+        result["obsolete"].append(combined_model_key(prefix))
+        for target, kind in [('future_7d_low', 'low'), ('future_7d_high', 'high')]:
+            model, scaler = train_regression_model(final_data, target, n_jobs=n_jobs, **forest_params)
+            if model and scaler: result["artifacts"][f"{prefix}_{kind}_model"] = model; result["artifacts"][f"{prefix}_{kind}_scaler"] = scaler
+    if result["artifacts"]:
+        level_artifacts = dict(result["artifacts"])
+        if has_level_models(level_artifacts, prefix) and result["latest_features"] is not None:
+            result["prediction"] = tuple(float(values[0]) for values in predict_price_levels(level_artifacts, prefix, result["latest_features"]))
+        result["artifacts"] = {name: pack_artifact(name, artifact, features=FEATURES_LIST, training_window=training_window) for name, artifact in level_artifacts.items()}
+    return result
\ No newline at end of file
@@ -0,0 +1,151 @@
+import os
+import weakref
+import threading
+
+import numpy as np
+
+# Flache Array-Darstellung eines RandomForestRegressor: alle Bäume hintereinander in einem Knoten-Array
+# (Feature, Schwelle, linkes/rechtes Kind, Blattwert). Wie in sklearn wird ein vorgeschalteter StandardScaler
+# in float64 angewendet und das Ergebnis nach float32 gerundet, bevor es mit den unveränderten Schwellen
+# verglichen wird; in die Schwellen eingerechnet würde die Rundung an den Split-Grenzen andere Blätter treffen.
+# Traversiert wird vektorisiert über alle (Zeile, Baum)-Paare; Paare, die ein Blatt erreicht haben, fallen heraus.
+TREE_ENGINE_ENABLED = os.environ.get('TREE_ENGINE', 'compiled') != 'sklearn'
+BATCH_ROWS = 4096
+# Erhöhen, wenn sich die Array-Darstellung ändert (Schlüssel im Shared-Cache)
+COMPILED_FORMAT = 2
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, mean=None, scale=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.n_outputs = value.shape[1]
+        self.mean = mean
+        self.scale = scale
+        self.is_leaf = left == np.arange(len(left))
+        # Kinder verschränkt: children[2 * knoten] = links, children[2 * knoten + 1] = rechts
+        self.children = np.stack([left, right], axis=1).ravel()
+
+    @classmethod
+    def from_sklearn(cls, forest, scaler=None):
+        n_features = forest.n_features_in_
+        mean = scale = None
+        if scaler is not None:
+            # Wie StandardScaler.transform: ohne with_mean/with_std bleibt die Spalte unverändert (x - 0, x / 1 sind exakt)
+            mean = np.asarray(scaler.mean_, dtype=np.float64) if getattr(scaler, 'with_mean', True) and getattr(scaler, 'mean_', None) is not None else np.zeros(n_features)
+            scale = np.asarray(scaler.scale_, dtype=np.float64) if getattr(scaler, 'with_std', True) and getattr(scaler, 'scale_', None) is not None else np.ones(n_features)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int64)
+            features.append(feature)
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            values.append(tree.value.reshape(tree.node_count, -1))
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts), np.concatenate(rights),
+                   np.concatenate(values).astype(np.float64), np.asarray(roots, dtype=np.int64), max_depth, n_features, mean, scale)
+
+    def leaves(self, X):
+        # Knoten-Indizes der Blätter, Form (Zeilen, Bäume)
+        n_rows, n_trees = len(X), len(self.roots)
+        # sklearn vergleicht float32-Eingaben mit float64-Schwellen
+        X_flat = np.ascontiguousarray(X, dtype=np.float32).ravel()
+        nodes = np.tile(self.roots, n_rows)
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * self.n_features, n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        offsets = row_offsets[active]
+        step = 0
+        while len(active):
+            current = nodes[active]
+            go_right = X_flat[offsets + self.feature[current]] > self.threshold[current]
+            current = self.children[2 * current + go_right]
+            nodes[active] = current
+            # Blätter zeigen auf sich selbst; fertige Paare werden nur alle paar Schritte aussortiert
+            step += 1
+            if step % 4 == 0:
+                keep = ~self.is_leaf[current]
+                active, offsets = active[keep], offsets[keep]
+        return nodes.reshape(n_rows, n_trees)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1: X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Erwartet {self.n_features} Features, erhalten {X.shape[1]}.")
+        if self.mean is not None: X = (X - self.mean) / self.scale
+        predictions = np.empty((len(X), self.n_outputs))
+        for start in range(0, len(X), BATCH_ROWS):
+            leaves = self.leaves(X[start:start + BATCH_ROWS])
+            # Baum für Baum aufsummieren und dann teilen, in derselben Reihenfolge wie sklearn: bitgleiche Ergebnisse
+            total = np.zeros((len(leaves), self.n_outputs))
+            for tree in range(leaves.shape[1]): total += self.value[leaves[:, tree]]
+            predictions[start:start + BATCH_ROWS] = total / leaves.shape[1]
+        return predictions[:, 0] if self.n_outputs == 1 else predictions
+
+    # --- Ablage als flache Arrays (z. B. im Shared-Cache, siehe shared_cache.py) ---
+    SHARED_ARRAYS = ('feature', 'threshold', 'children', 'is_leaf', 'value', 'roots')
+
+    def to_arrays(self):
+        arrays = {name: getattr(self, name) for name in self.SHARED_ARRAYS}
+        if self.mean is not None: arrays.update(mean=self.mean, scale=self.scale)
+        return arrays, {'max_depth': int(self.max_depth), 'n_features': int(self.n_features)}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        # Ohne Kopie: die Arrays dürfen schreibgeschützte np.memmap-Sichten sein, die sich alle Worker teilen
+        compiled = cls.__new__(cls)
+        for name in cls.SHARED_ARRAYS: setattr(compiled, name, arrays[name])
+        compiled.left, compiled.right = compiled.children[0::2], compiled.children[1::2]
+        compiled.max_depth, compiled.n_features = meta['max_depth'], meta['n_features']
+        compiled.n_outputs = compiled.value.shape[1]
+        compiled.mean, compiled.scale = arrays.get('mean'), arrays.get('scale')
+        return compiled
+
+class SharedForest:
+    # Kompilierter Wald ohne sklearn-Objekt (aus dem Shared-Cache); ein separater Scaler wird vorher angewendet
+    def __init__(self, compiled):
+        self.compiled = compiled
+
+    def predict(self, X):
+        return self.compiled.predict(X)
+
+def is_compilable_forest(forest):
+    return hasattr(forest, 'estimators_') and hasattr(forest.estimators_[0], 'tree_')
+
+# Kompilierte Wälder werden pro (Forest, Scaler) einmal erzeugt und leben so lange wie das Modell-Objekt
+_compiled = weakref.WeakKeyDictionary()
+_compile_lock = threading.Lock()
+
+def compiled_forest_for(forest, scaler=None):
+    entry = _compiled.get(forest)
+    if entry is not None and entry[0]() is scaler: return entry[1]
+    with _compile_lock:
+        entry = _compiled.get(forest)
+        if entry is not None and entry[0]() is scaler: return entry[1]
+        compiled = CompiledForest.from_sklearn(forest, scaler)
+        _compiled[forest] = ((weakref.ref(scaler) if scaler is not None else (lambda: None)), compiled)
+        return compiled
+
+def predict_forest(forest, scaler, X):
+    # Kompilierter Pfad für RandomForestRegressor (TREE_ENGINE=sklearn schaltet auf sklearn zurück)
+    if isinstance(forest, SharedForest): return forest.predict(scaler.transform(X) if scaler is not None else X)
+    if TREE_ENGINE_ENABLED and is_compilable_forest(forest):
+        return compiled_forest_for(forest, scaler).predict(X)
+    # Auch der sklearn-Pfad rechnet in Blöcken von BATCH_ROWS Zeilen (lange Intraday-Historien im Backtest)
+    if len(X) <= BATCH_ROWS: return forest.predict(scaler.transform(X) if scaler is not None else X)
+    return np.concatenate([forest.predict(scaler.transform(X[start:start + BATCH_ROWS]) if scaler is not None else X[start:start + BATCH_ROWS])
+                           for start in range(0, len(X), BATCH_ROWS)])
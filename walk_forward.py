@@ -0,0 +1,163 @@
+# walk_forward.py - Walk-Forward-Training und Out-of-Sample-Auswertung der Level-Modelle
+
+import os
+import io
+import time
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import joblib
+import sklearn
+
+from feature_engineer import add_features_to_data, create_regression_targets, target_lookahead_bars
+from train_model import FEATURES_LIST, REGRESSION_TARGETS, fit_level_model, regression_errors, format_errors
+from intervals import DEFAULT_INTERVAL, get_interval_profile
+from artifact_store import ensure_private_dir
+
+# Pro Fold wird ein Modell nur auf Daten vor dem Testfenster trainiert. Zwischen Trainingsende und
+# Testbeginn liegt eine Lücke von mindestens target_lookahead_bars (13 bei 1d): so weit reicht das Ziel
+# der letzten Trainingszeile in die Zukunft, es darf keine Bar des Testfensters enthalten.
+WALK_FORWARD_CACHE_DIR = os.environ.get('WALK_FORWARD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'krypto-walk-forward'))
+
+def make_folds(n_rows, min_train_size=250, test_size=30, mode='expanding', train_window=None, gap=target_lookahead_bars(), max_folds=None):
+    # Fold-Grenzen sind vom Anfang der Daten verankert: neue Bars verlängern nur den letzten Fold
+    if mode not in ('expanding', 'rolling'): raise ValueError(f"Unbekannter Walk-Forward-Modus '{mode}'.")
+    folds = []
+    test_start = min_train_size + gap
+    while test_start < n_rows:
+        test_end = min(test_start + test_size, n_rows)
+        train_end = test_start - gap
+        train_start = max(0, train_end - (train_window or min_train_size)) if mode == 'rolling' else 0
+        folds.append((train_start, train_end, test_start, test_end))
+        test_start = test_end
+    return folds[-max_folds:] if max_folds else folds
+
+def build_feature_matrix(raw_data, future_days=7, horizon_bars=None, dtype=None):
+    # Einmal pro Asset: Feature-Matrix und Ziele für alle Folds (Intraday: float32 und Horizont in Bars)
+    featured_data = add_features_to_data(raw_data, dtype=dtype)
+    final_data = create_regression_targets(featured_data, future_days=future_days, horizon_bars=horizon_bars)
+    if final_data is None or final_data.empty: return None
+    return {'index': final_data.index, 'X': final_data[FEATURES_LIST].to_numpy(dtype=dtype or np.float64),
+            'y': final_data[REGRESSION_TARGETS].to_numpy(dtype=np.float64), 'featured': featured_data,
+            'lookahead': target_lookahead_bars(future_days, horizon_bars)}
+
+def fold_cache_key(X_train, y_train, n_estimators, random_state, forest_params=None):
+    digest = hashlib.sha256()
+    for array in (X_train, y_train): digest.update(np.ascontiguousarray(array).tobytes()); digest.update(str(array.shape).encode())
+    digest.update(f"{FEATURES_LIST}|{REGRESSION_TARGETS}|{n_estimators}|{random_state}|{sorted((forest_params or {}).items())}|{sklearn.__version__}".encode())
+    return digest.hexdigest()[:24]
+
+# --- Fold-Worker ---
+_fold_matrix = None
+
+def _init_fold_worker(X, y):
+    # Einmal pro Prozess: die Matrix wird nicht pro Fold übertragen
+    global _fold_matrix
+    _fold_matrix = (X, y)
+
+def _run_fold(fold, cache_dir=None, n_estimators=100, random_state=42, forest_params=None):
+    X, y = _fold_matrix
+    train_start, train_end, test_start, test_end = fold
+    X_train, y_train = X[train_start:train_end], y[train_start:train_end]
+    cache_path = os.path.join(cache_dir, f"fold-{fold_cache_key(X_train, y_train, n_estimators, random_state, forest_params)}.joblib") if cache_dir else None
+    cached = cache_path is not None and os.path.exists(cache_path)
+    start_time = time.perf_counter()
+    if cached:
+        level_model = joblib.load(cache_path)
+    else:
+        level_model = fit_level_model(X_train, y_train, REGRESSION_TARGETS, n_jobs=1, n_estimators=n_estimators, random_state=random_state, **(forest_params or {}))
+        if cache_path is not None:
+            buffer = io.BytesIO(); joblib.dump(level_model, buffer)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f: f.write(buffer.getvalue())
+            os.replace(tmp_path, cache_path)
+    fit_seconds = time.perf_counter() - start_time
+    predictions = level_model.predict(X[test_start:test_end])
+    return {'fold': fold, 'cached': cached, 'fit_seconds': fit_seconds, 'predictions': predictions}
+
+def run_walk_forward(matrix, min_train_size=250, test_size=30, mode='expanding', train_window=None, gap=None,
+                     max_folds=None, max_workers=None, cache_dir=WALK_FORWARD_CACHE_DIR, n_estimators=100, forest_params=None):
+    # forest_params: Intraday-Begrenzungen aus dem Intervall-Profil (min_samples_leaf, max_samples, ...)
+    X, y = matrix['X'], matrix['y']
+    gap = matrix['lookahead'] if gap is None else gap
+    if gap < matrix['lookahead']: raise ValueError(f"Lücke von {gap} Bars ist kleiner als der Zielhorizont ({matrix['lookahead']} Bars).")
+    if cache_dir:
+        # Fold-Modelle werden per joblib (pickle) geladen: nur aus einem Verzeichnis, in das niemand sonst schreiben kann
+        try: ensure_private_dir(cache_dir)
+        except OSError as e: print(f"Fold-Cache {cache_dir} nicht nutzbar, trainiere ohne Cache: {e}"); cache_dir = None
+    folds = make_folds(len(X), min_train_size, test_size, mode, train_window, gap, max_folds)
+    if not folds: return None
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(folds)))
+    start_time = time.perf_counter()
+    if max_workers <= 1:
+        _init_fold_worker(X, y)
+        fold_results = [_run_fold(fold, cache_dir, n_estimators, forest_params=forest_params) for fold in folds]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_fold_worker, initargs=(X, y)) as executor:
+            fold_results = list(executor.map(_run_fold, folds, [cache_dir] * len(folds), [n_estimators] * len(folds), [42] * len(folds), [forest_params] * len(folds)))
+    elapsed = time.perf_counter() - start_time
+
+    report_folds = []
+    for result in fold_results:
+        train_start, train_end, test_start, test_end = result['fold']
+        errors = {target: regression_errors(y[test_start:test_end, i], result['predictions'][:, i]) for i, target in enumerate(REGRESSION_TARGETS)}
+        report_folds.append({'train': (matrix['index'][train_start], matrix['index'][train_end - 1]), 'test': (matrix['index'][test_start], matrix['index'][test_end - 1]),
+                             'train_rows': train_end - train_start, 'test_rows': test_end - test_start, 'cached': result['cached'],
+                             'fit_seconds': result['fit_seconds'], 'errors': errors})
+
+    # Aneinandergehängte Out-of-Sample-Vorhersagen (für einen Backtest ohne Look-Ahead)
+    oos_start = folds[0][2]
+    oos_predictions = pd.DataFrame(np.concatenate([result['predictions'] for result in fold_results]),
+                                   index=matrix['index'][oos_start:folds[-1][3]], columns=REGRESSION_TARGETS)
+    summary = {target: regression_errors(y[oos_start:folds[-1][3], i], oos_predictions[target].to_numpy()) for i, target in enumerate(REGRESSION_TARGETS)}
+    return {'folds': report_folds, 'summary': summary, 'predictions': oos_predictions, 'elapsed': elapsed,
+            'cache_hits': sum(1 for fold in report_folds if fold['cached'])}
+
+def print_walk_forward_report(asset_name, report):
+    print(f"\n{asset_name}: {len(report['folds'])} Folds in {report['elapsed']:.2f}s ({report['cache_hits']} aus dem Cache)")
+    print(f"{'Fold':>4}  {'Training':>23}  {'Test':>23}  {'MAE Low':>10}  {'MAE High':>10}")
+    for i, fold in enumerate(report['folds'], start=1):
+        train = f"{fold['train'][0]:%Y-%m-%d}..{fold['train'][1]:%Y-%m-%d}"
+        test = f"{fold['test'][0]:%Y-%m-%d}..{fold['test'][1]:%Y-%m-%d}"
+        print(f"{i:>4}  {train:>23}  {test:>23}  {fold['errors']['future_7d_low']['mae']:>10.2f}  {fold['errors']['future_7d_high']['mae']:>10.2f}")
+    for target, errors in report['summary'].items():
+        print(f"Out-of-Sample '{target}': {format_errors(errors)}")
+
+def add_walk_forward_arguments(parser):
+    parser.add_argument('--wf-mode', choices=['expanding', 'rolling'], default='expanding')
+    parser.add_argument('--wf-min-train', type=int, default=250, help="Bars im ersten Trainingsfenster")
+    parser.add_argument('--wf-test-size', type=int, default=30, help="Bars pro Testfenster")
+    parser.add_argument('--wf-train-window', type=int, default=None, help="Fensterlänge im rolling-Modus")
+    parser.add_argument('--wf-max-folds', type=int, default=None)
+    parser.add_argument('--wf-workers', type=int, default=None)
+    parser.add_argument('--wf-no-cache', action='store_true')
+
+def walk_forward_options(args):
+    return {'min_train_size': args.wf_min_train, 'test_size': args.wf_test_size, 'mode': args.wf_mode,
+            'train_window': args.wf_train_window, 'max_folds': args.wf_max_folds, 'max_workers': args.wf_workers,
+            'cache_dir': None if args.wf_no_cache else WALK_FORWARD_CACHE_DIR}
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    from data_manager import download_historical_data
+    from asset_registry import load_assets
+
+    parser = argparse.ArgumentParser(description="Walk-Forward-Auswertung der Level-Modelle (Out-of-Sample-Fehler pro Fold)")
+    parser.add_argument('--period', default=None, help="Standard: Trainingszeitraum des Intervalls")
+    parser.add_argument('--interval', default=DEFAULT_INTERVAL)
+    add_walk_forward_arguments(parser)
+    args = parser.parse_args()
+    profile = get_interval_profile(args.interval)
+
+    for asset in load_assets():
+        raw_data = download_historical_data(asset["ticker"], period=args.period or profile['training_period'], interval=args.interval)
+        matrix = build_feature_matrix(raw_data, horizon_bars=profile['target_horizon_bars'], dtype=profile['feature_dtype']) if raw_data is not None else None
+        if matrix is None: print(f"FEHLER: Keine Daten für {asset['name']}."); continue
+        report = run_walk_forward(matrix, forest_params=profile['forest_params'], **walk_forward_options(args))
+        if report is None: print(f"FEHLER: Zu wenig Daten für Walk-Forward bei {asset['name']}."); continue
+        print_walk_forward_report(asset["name"], report)